@@ -1693,7 +1693,7 @@ class EEMSCmdRunnerBase(object):
 
     # def FuzzyWeightedUnion(...)
 
-    def FuzzyEMDSWeighteddAnd(
+    def FuzzyEMDSWeightedAnd(
         self,
         inFieldNames,
         weights,
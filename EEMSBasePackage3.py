@@ -41,6 +41,17 @@
 # I/O functionality. This is specific to the type of data file. Use this
 # as a parent class for the specific implementation
 #
+# class EEMSBufferCmdRunner
+#
+# An EEMSCmdRunnerBase that reads and writes fields held in memory-mapped
+# buffers. It is used to share fields among the worker processes of a
+# tiled run.
+#
+# class EEMSResultCache
+#
+# An on-disk store of command results, shared by any program or process
+# using the same cache directory.
+#
 # class EEMSInterpreterBase
 #
 # This class is designed to coordinate an EEMSProgram object and an
@@ -116,6 +127,14 @@
 ######################################################################
 
 import re
+from collections import deque
+import os
+import hashlib
+import shutil
+import tempfile
+import threading
+import weakref
+import concurrent.futures
 import numpy as np
 
 ######################################################################
@@ -945,16 +964,16 @@ class EEMSCmd(object):
         return self.parsedCmd['cmd'] in ['READ','READMULTI']
 
     def HasParam(self,paramNm):
-        return paramNm in list(self.parsedCmd['params'].keys())
+        return paramNm in self.parsedCmd['params']
 
     def HasResultName(self):
-        return 'rslt' in list(self.parsedCmd.keys())
+        return 'rslt' in self.parsedCmd
 
     def IsRequiredParam(self,paramNm):
-        return paramNm in list(self.cmdDesc['Required Params'].keys())
+        return paramNm in self.cmdDesc['Required Params']
 
     def IsOptionalParam(self,paramNm):
-        return paramNm in list(self.cmdDesc['Optional Params'].keys())
+        return paramNm in self.cmdDesc['Optional Params']
 
     def GetOptionalParamNames(self):
         return list(self.cmdDesc['Optional Params'].keys())
@@ -1139,10 +1158,28 @@ class EEMSCmd(object):
 # Rewrote __init__ to allow for EEMS commands to spread over more
 # than one line and to give explanatory error messages on exception
 #
+# 2026.10.16
+#
+# Commands that duplicate an earlier command apart from their result
+# name and output file are found, and their fields made aliases of the
+# earlier command's field (see GetAliasedFldNm()).
+#
+# The fields that are sure to be in fuzzy range (-1 to +1), given the
+# commands that define them, are found (see IsFuzzyFld()).
+#
 ######################################################################
 
 class EEMSProgram(object):
 
+    # Commands whose results are always clipped to fuzzy range
+    FuzzyCmdNms = [
+        'CVTTOFUZZY','CVTTOFUZZYCURVE','MEANTOMID','NOT','OR','AND',
+        'EMDSAND','ORNEG','XOR','UNION','SELECTEDUNION','WTDUNION',
+        'WTDEMDSAND'
+        ]
+    # Commands whose results are in fuzzy range if their inputs are
+    FuzzyPreservingCmdNms = ['COPYFIELD','MIN','MAX','MEAN']
+
     def __init__(self, fNm):
         # Parse the EEMS command file. Each command must start on a
         # new line.
@@ -1151,6 +1188,9 @@ class EEMSProgram(object):
         self.orderedCmds = [] # commands in order of execution
         self.crntCmdNdx = None # The index of the current command in orderedCmds
         self.allDefinedFieldNms = {} # unordered fields defined by by EEMS commands
+        self.aliasFldNms = {} # field each duplicate command's field is an alias of
+        self.fuzzyFldNms = set() # fields sure to be in fuzzy range
+        self.readSrcFldNms = {} # fields read that each field is computed from
         
         cmdLine = ''      # buffer to build command from lines of input file
         inParens = False  # whether or not parsing is within parentheses
@@ -1158,7 +1198,7 @@ class EEMSProgram(object):
         inLineCnt = 0     # line number of input file for error messages.
 
         if isinstance(fNm, str):
-            fObj = open(fNm, 'rU')
+            fObj = open(fNm, 'r')
         else:
             fObj = fNm
 
@@ -1226,6 +1266,9 @@ class EEMSProgram(object):
                 )
 
         self.__OrderCmds()
+        self.__FindAliases()
+        self.__FindFuzzyFlds()
+        self.__FindReadSrcFlds()
     # def GetNodesFromFile(self, fNm):
 
     def __enter__(self):
@@ -1275,7 +1318,7 @@ class EEMSProgram(object):
 
         if cmd.HasResultName():
             rsltNm = cmd.GetResultName()
-            if rsltNm in list(self.allDefinedFieldNms.keys()):
+            if rsltNm in self.allDefinedFieldNms:
                 raise Exception(
                     '\n********************ERROR********************\n'+
                     'A field is defined by two different commands.\n'+
@@ -1288,7 +1331,7 @@ class EEMSProgram(object):
         elif cmd.IsReadCmd():
 
             for fldNm in self.__GetReadFieldNms(cmd):
-                if fldNm in list(self.allDefinedFieldNms.keys()):
+                if fldNm in self.allDefinedFieldNms:
                     raise Exception(
                         '\n********************ERROR********************\n'+
                         'A field is defined more than once.\n'+
@@ -1316,7 +1359,7 @@ class EEMSProgram(object):
         # check for a missing dependency
         for cmd in self.unorderedCmds:
             for dependNm in self.__GetDependFieldNms(cmd):
-                if dependNm not in list(self.allDefinedFieldNms.keys()):
+                if dependNm not in self.allDefinedFieldNms:
                     raise Exception(
                         '\n********************ERROR********************\n'+
                         'Command depends on undefined field *%s*\n'%dependNm+
@@ -1326,66 +1369,186 @@ class EEMSProgram(object):
 
         # order the fields for execution
 
-        self.orderedCmds = [] # list of command ResultNames in execution order
-        dpndsInOrderedCmds = []
+        # Build the dependency graph: for each command (by index in
+        # unorderedCmds) the commands that depend on it, and the
+        # number of commands it depends on that are not yet ordered.
+
+        cmdNdxs = {} # index in unorderedCmds of each command
+        for ndx in range(len(self.unorderedCmds)):
+            cmdNdxs[id(self.unorderedCmds[ndx])] = ndx
+
+        dependentNdxs = [[] for cmd in self.unorderedCmds]
+        waitCnts = []
+        for ndx in range(len(self.unorderedCmds)):
+            dependNdxs = set()
+            for dependFldNm in self.__GetDependFieldNms(self.unorderedCmds[ndx]):
+                dependNdxs.add(cmdNdxs[id(self.allDefinedFieldNms[dependFldNm])])
+            waitCnts.append(len(dependNdxs))
+            for dependNdx in sorted(dependNdxs):
+                dependentNdxs[dependNdx].append(ndx)
+
+        # READs go first, then each command as soon as everything it
+        # depends on has been ordered.
+
+        readyNdxs = deque()
+        for ndx in range(len(self.unorderedCmds)):
+            if self.unorderedCmds[ndx].IsReadCmd():
+                readyNdxs.append(ndx)
+        for ndx in range(len(self.unorderedCmds)):
+            if waitCnts[ndx] == 0 and not self.unorderedCmds[ndx].IsReadCmd():
+                readyNdxs.append(ndx)
 
-        while len(self.unorderedCmds) > 0:
-            startingCmdsToBeOrderedLen = len(self.unorderedCmds)
+        self.orderedCmds = [] # list of command ResultNames in execution order
 
-            # Step backwards through cmdsToBeOrdered so that popping
-            # elements does not interfere with indexing
+        while len(readyNdxs) > 0:
+            ndx = readyNdxs.popleft()
+            self.orderedCmds.append(self.unorderedCmds[ndx])
 
-            ndxs = list(range(len(self.unorderedCmds)))
-            ndxs.reverse()
+            for dependentNdx in dependentNdxs[ndx]:
+                waitCnts[dependentNdx] -= 1
+                if waitCnts[dependentNdx] == 0:
+                    readyNdxs.append(dependentNdx)
 
-            for ndx in ndxs:
-                cmd = self.unorderedCmds[ndx]
+        # while len(readyNdxs) > 0:
 
-                if cmd.IsReadCmd(): # need InField(s) not ResultName
-                    # Move command from unordered to order, grab the
-                    # field(s) it defines and loop
-                    self.orderedCmds.append(cmd)
-                    self.unorderedCmds.pop(ndx)
-                    dpndsInOrderedCmds += self.__GetReadFieldNms(cmd)
-                    continue
+        # Commands that never became ready are in, or depend on, a
+        # dependency cycle in the structure of the commands
 
-                else:
-                
-                    # check if all the fields the current field depends on are
-                    # defined by commanes in the the orderedCmds list
-                    
-                    cmdHasAllDepends = True
-                    
-                    for dependFldNm in self.__GetDependFieldNms(cmd):
-                            if dependFldNm not in dpndsInOrderedCmds:
-                                cmdHasAllDepends = False
-                                break
-                    # for dependFldNm in self.__GetDependFieldNms(rsltFldNm):
-                # if rsltFldNm in ['READ']: # No dependency
-                    
-                if cmdHasAllDepends:
-                    self.orderedCmds.append(cmd)
-                    self.unorderedCmds.pop(ndx)
-                    dpndsInOrderedCmds.append(cmd.GetResultName())
-                # if fldIsIndependent:
-                
-            # for ndx in ndxs:
-            
-            # if no independent fields were found, then there is
-            # a dependency cycle in the structure of the commands
-            
-            if startingCmdsToBeOrderedLen == len(self.unorderedCmds):
-                cmdStrings = ''
-                for cmd in self.unorderedCmds:
-                    cmdStrings += '  '+cmd.GetCommandString()+'\n'
-                raise Exception(
-                    '\n********************ERROR********************\n'+
-                    'Circular logic in the dependencies for this subset of commands:'+
-                    cmdStrings)
+        if len(self.orderedCmds) < len(self.unorderedCmds):
+            cmdStrings = ''
+            for ndx in range(len(self.unorderedCmds)):
+                if waitCnts[ndx] > 0:
+                    cmdStrings += '  '+self.unorderedCmds[ndx].GetCommandString()+'\n'
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Circular logic in the dependencies for this subset of commands:'+
+                cmdStrings)
 
-        # while len(nodesToBeOrdered) > 0:
+        self.unorderedCmds = [] # all have been moved to orderedCmds
         self.crntCmdNdx = 0
     # def __OrderCmds(self):
+
+    def __GetCanonicalCmd(self,cmd):
+
+        # A form of cmd that is the same for all commands computing the
+        # same thing: parameters in order, without the result name and
+        # output file, with values in their parsed form (e.g. 80 and
+        # 80.0 match) and fields replaced by what they are aliases of.
+        # Inputs are kept in order: even MIN and MAX depend on the order
+        # of their inputs at cells holding NaN.
+
+        cmdNm = cmd.GetCommandName()
+        canonicalParams = []
+        for paramNm in sorted(cmd.GetParamNames()):
+            if paramNm == 'OutFileName':
+                continue
+
+            paramVal = cmd.GetParam(paramNm)
+            paramType = cmd.GetParamType(paramNm)
+            if paramType == 'Field Name':
+                paramVal = self.aliasFldNms.get(paramVal,paramVal)
+            elif paramType == 'Field Name List':
+                paramVal = [self.aliasFldNms.get(fldNm,fldNm) for fldNm in paramVal]
+
+            canonicalParams.append((paramNm,repr(paramVal)))
+
+        return (cmdNm,tuple(canonicalParams))
+
+    # def __GetCanonicalCmd(self,cmd):
+
+    def __FindAliases(self,uniqueFldNms=[]):
+
+        # Finds the commands that compute the same thing as an earlier
+        # command. Their fields are aliases of the earlier command's
+        # field and need not be computed. Fields in uniqueFldNms are
+        # neither aliases nor aliased.
+
+        self.aliasFldNms = {}
+        canonicalFldNms = {} # field first computed by each canonical command
+
+        for cmd in self.orderedCmds:
+            if cmd.IsReadCmd() or cmd.GetCommandName() == 'CALLEXTERN':
+                continue
+
+            rsltNm = cmd.GetResultName()
+            if rsltNm in uniqueFldNms:
+                continue
+
+            canonicalCmd = self.__GetCanonicalCmd(cmd)
+            if canonicalCmd in canonicalFldNms:
+                self.aliasFldNms[rsltNm] = canonicalFldNms[canonicalCmd]
+            else:
+                canonicalFldNms[canonicalCmd] = rsltNm
+
+        # for cmd in self.orderedCmds:
+
+    # def __FindAliases(self,uniqueFldNms=[]):
+
+    def __FindFuzzyFlds(self,variedFldNms=[]):
+
+        # Finds the fields that are sure to be in fuzzy range, going by
+        # the commands that define them. Fields in variedFldNms may be
+        # computed with other parameters than those in the program, so
+        # only their command is considered.
+
+        self.fuzzyFldNms = set()
+
+        for cmd in self.orderedCmds:
+            if cmd.IsReadCmd():
+                continue
+
+            cmdNm = cmd.GetCommandName()
+            rsltNm = cmd.GetResultName()
+
+            if cmdNm in self.FuzzyCmdNms:
+                isFuzzy = True
+
+            elif cmdNm == 'CVTTOFUZZYCAT':
+                # EEMSCmd has checked that its fuzzy values are in
+                # range, but not its default, which is not clamped
+                defaultVal = cmd.GetParam('DefaultFuzzyValue')
+                isFuzzy = rsltNm not in variedFldNms and -1 <= defaultVal <= 1
+
+            elif cmdNm in self.FuzzyPreservingCmdNms:
+                isFuzzy = True
+                for inFldNm in self.__GetDependFieldNms(cmd):
+                    if inFldNm not in self.fuzzyFldNms:
+                        isFuzzy = False
+
+            else:
+                isFuzzy = False
+
+            if isFuzzy:
+                self.fuzzyFldNms.add(rsltNm)
+
+        # for cmd in self.orderedCmds:
+
+    # def __FindFuzzyFlds(self,variedFldNms=[]):
+
+    def __FindReadSrcFlds(self):
+
+        # Finds, for each field, the fields read that it is computed
+        # from. A field read is its own source.
+
+        self.readSrcFldNms = {}
+
+        for cmd in self.orderedCmds:
+            if cmd.IsReadCmd():
+                for fldNm in self.__GetReadFieldNms(cmd):
+                    self.readSrcFldNms[fldNm] = (fldNm,)
+                continue
+
+            if cmd.GetCommandName() == 'CALLEXTERN':
+                continue
+
+            srcFldNms = set()
+            for inFldNm in self.__GetDependFieldNms(cmd):
+                srcFldNms.update(self.readSrcFldNms.get(inFldNm,()))
+            self.readSrcFldNms[cmd.GetResultName()] = tuple(sorted(srcFldNms))
+
+        # for cmd in self.orderedCmds:
+
+    # def __FindReadSrcFlds(self):
         
     def __ParseDict(self,nodeFld,treeImage, lvl):
     # parses the dictionary into a dependency tree
@@ -1499,6 +1662,65 @@ class EEMSProgram(object):
 
     # def GetCmdTreeAsString(self);
 
+    def GetDependFieldNms(self,cmd):
+        # The fields cmd needs when run. An alias needs only the field
+        # it is an alias of.
+        if self.GetAliasedFldNm(cmd) is not None:
+            return [self.GetAliasedFldNm(cmd)]
+        return self.__GetDependFieldNms(cmd)
+
+    def GetAliasedFldNm(self,cmd):
+        # The field that cmd's field is an alias of, or None
+        if cmd.IsReadCmd():
+            return None
+        return self.aliasFldNms.get(cmd.GetResultName())
+
+    def SetUniqueFlds(self,fldNms):
+        # Keeps the fields in fldNms from being aliases or being
+        # aliased, e.g. because their parameters are to be changed.
+        # Nor are their parameters relied on to put them in fuzzy range.
+        self.__FindAliases(fldNms)
+        self.__FindFuzzyFlds(fldNms)
+
+    def IsFuzzyFld(self,fldNm):
+        # Whether field fldNm is sure to be in fuzzy range
+        return fldNm in self.fuzzyFldNms
+
+    def GetFuzzyFldNms(self):
+        return sorted(self.fuzzyFldNms)
+
+    def GetReadSrcFldNms(self):
+        # The fields read that each field is computed from, by field
+        return dict(self.readSrcFldNms)
+
+    def GetDefinedFieldNms(self,cmd):
+        if cmd.IsReadCmd():
+            return self.__GetReadFieldNms(cmd)
+        else:
+            return [cmd.GetResultName()]
+
+    def GetCmdDependencies(self):
+        # For each command in orderedCmds, the indices (in orderedCmds)
+        # of the commands that define the fields it needs when run (see
+        # GetDependFieldNms()).
+
+        cmdNdxs = {}
+        for ndx in range(len(self.orderedCmds)):
+            cmdNdxs[id(self.orderedCmds[ndx])] = ndx
+
+        rtrnLst = []
+        for cmd in self.orderedCmds:
+            dependNdxs = []
+            for dependFldNm in self.GetDependFieldNms(cmd):
+                dependNdx = cmdNdxs[id(self.allDefinedFieldNms[dependFldNm])]
+                if dependNdx not in dependNdxs:
+                    dependNdxs.append(dependNdx)
+            rtrnLst.append(dependNdxs)
+
+        return rtrnLst
+
+    # def GetCmdDependencies(self):
+
     def __exit__(self,exc_type,exc_value,traceback):
         if exc_type is not None:
             print(exc_type, exc_value, traceback)
@@ -1535,6 +1757,34 @@ class EEMSProgram(object):
 # 2014.02.10 - tjs
 #
 # Tested on CSV version of EEMS
+#
+# 2026.10.16
+#
+# Added scenario fields, which carry a leading scenario axis. See
+# EEMSInterpreter.SetScenarios().
+#
+# Added a dtype policy (see SetDtype()) for the floating point fields
+# read and computed.
+#
+# Operators now compute in place in buffers that, with SetBufferPool(),
+# are reused once the fields holding them are removed.
+#
+# Added compact fields (see SetCompact()), holding only the valid cells
+# of the grid.
+#
+# Field statistics (minimum, maximum, mean, count) are computed once per
+# field and shared by the operators using them (see _GetFldStat()).
+#
+# Fields known to be in fuzzy range are not checked (see SetFuzzyFlds()).
+#
+# Added shared masks (see SetSharedMask()): fields hold plain arrays and
+# one mask of the cells invalid in the fields read serves them all.
+#
+# Added a kernel backend (see SetKernelBackend()) running the per-cell
+# loops of some operators as compiled, parallel kernels.
+#
+# Added broadcast fields (see SetBroadcastFlds()), held at their own
+# shape when it broadcasts to the program's.
 ######################################################################
 
 class EEMSCmdRunnerBase(object):
@@ -1543,12 +1793,38 @@ class EEMSCmdRunnerBase(object):
 # for control, etc
     MinForFuzzyLimit = -9999
     MaxForFuzzyLimit = 9999
+# longest lookup table CvtToFuzzyCat builds for integer fields
+    MaxCatLUTLen = 65536
 ########################################################################
 
     def __init__(self):
         self.EEMSFlds = {}
         self.outFileDict = {}
         self.arrayShape = None
+        self.fldLock = threading.Lock() # EEMSFlds may be added to from several threads
+        self.window = None # (row slice, column slice) being worked on, see SetWindow()
+        self.fldStats = {} # whole-extent statistics of fields, see SetFldStats()
+        self.fldStatCache = {} # statistics of the fields held, see _GetFldStat()
+        self.fuzzyFldNms = set() # fields known to be in fuzzy range, see SetFuzzyFlds()
+        self.scenarioFldNms = set() # fields with a leading scenario axis
+        self.dtype = np.dtype(np.float64) # type of floating point fields, see SetDtype()
+        self.useBufferPool = False # see SetBufferPool()
+        self.freeBuffers = {} # unused buffers by (shape,dtype)
+        self.freeBufferIds = set()
+        self.poolBuffers = weakref.WeakValueDictionary() # buffers made by the pool, by id
+        self.bufferFldCnts = {} # number of fields holding each pool buffer, by id
+        self.compact = False # see SetCompact()
+        self.validMask = None # valid cells of the grid once fields are compacted
+        self.gridShape = None # shape of the grid once fields are compacted
+        self.validMaskSig = None # hash of validMask
+        self.sharedMask = False # see SetSharedMask()
+        self.invalidMask = None # cells masked in any field, with shared masks
+        self.invalidMaskSig = None # hash of invalidMask
+        self.readSrcFldNms = {} # fields read that each field comes from, see SetReadSrcFlds()
+        self.readMasks = {} # masks of the fields read, with shared masks
+        self.kernelBackend = 'numpy' # see SetKernelBackend()
+        self.kernels = None # module of loop kernels, None for NumPy
+        self.broadcastFlds = False # see SetBroadcastFlds()
     # def __init__(self):
 
     def __enter__(self):
@@ -1559,6 +1835,12 @@ class EEMSCmdRunnerBase(object):
         pass
     # def _WriteFldsToFile(self):
 
+    def _WriteWindowToFiles(self):
+        # Writes the current window of the output fields. Must be
+        # overridden to support tiled execution.
+        pass
+    # def _WriteWindowToFiles(self):
+
     def _CreateOutFileMap(self):
         # Create a map of files and fields
         outFileMap = {}
@@ -1580,9 +1862,23 @@ class EEMSCmdRunnerBase(object):
             raise Exception(
                 '\n********************ERROR********************\n'+
                 'Duplicated field name: *s*\n'%fldNm)
+
+        # Fields on the grid, e.g. read after CompactFlds(), are compacted
+        if self.validMask is not None and self._IsGridShape(fldArray.shape):
+            fldArray = self._CompactArray(self._BroadcastArray(fldArray,self.gridShape))
         
         if self.arrayShape == None:
             self.arrayShape = fldArray.shape
+        elif self.broadcastFlds:
+            # The program's shape grows to take in the field's
+            try:
+                self.arrayShape = np.broadcast_shapes(self.arrayShape,fldArray.shape)
+            except ValueError:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Data Shape mismatch:\n'+
+                    '  Field *%s* has shape %s, does not broadcast to %s.\n'%
+                    (fldNm,fldArray.shape,self.arrayShape))
         else:
             if fldArray.shape != self.arrayShape:
                 raise Exception(
@@ -1593,21 +1889,335 @@ class EEMSCmdRunnerBase(object):
 
         if not isinstance(fldArray,np.ma.masked_array):
             fldArray = np.ma.masked_array(fldArray,mask=False)
-            
-        self.EEMSFlds[fldNm] = {'outFNm':outFNm,'data':fldArray}
+
+        fldArray = self._CastToDtype(fldArray)
+
+        with self.fldLock:
+            fldArray = self._ShareMask(fldNm,fldArray)
+            self.EEMSFlds[fldNm] = {'outFNm':outFNm,'data':fldArray}
+            self.fldStatCache.pop(fldNm,None)
+            self.__HoldBuffers(fldArray)
     # def _AddFieldToEEMSFlds(self,outFNm,fldNm,fldArray):
 
+    def _AddScenarioFieldToEEMSFlds(self,outFNm,fldNm,fldArray):
+        # Adds a field whose first axis is the scenario. The rest of its
+        # shape must match the other fields or, with broadcast fields,
+        # broadcast to the program's shape; it is then padded to the
+        # program's number of dimensions, so that the scenario axis
+        # lines up with other scenario fields.
+        if fldNm in self.EEMSFlds:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Duplicated field name: *%s*\n'%fldNm)
+
+        if self.validMask is not None and self._IsGridShape(fldArray.shape[1:]):
+            fldArray = self._CompactArray(self._BroadcastArray(fldArray,fldArray.shape[:1]+self.gridShape))
+
+        if self.arrayShape is not None and not self._FitsArrayShape(fldArray.shape[1:]):
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Data Shape mismatch:\n'+
+                '  Scenario field *%s* has shape %s, does not match %s.\n'%
+                (fldNm,fldArray.shape[1:],self.arrayShape))
+
+        if self.arrayShape is not None and fldArray.ndim - 1 < len(self.arrayShape):
+            fldArray = fldArray.reshape(
+                fldArray.shape[:1] + (1,) * (len(self.arrayShape) - fldArray.ndim + 1) + fldArray.shape[1:])
+
+        fldArray = self._CastToDtype(fldArray)
+
+        with self.fldLock:
+            fldArray = self._ShareMask(fldNm,fldArray)
+            self.EEMSFlds[fldNm] = {'outFNm':outFNm,'data':fldArray}
+            self.fldStatCache.pop(fldNm,None)
+            self.__HoldBuffers(fldArray)
+            self.scenarioFldNms.add(fldNm)
+
+    # def _AddScenarioFieldToEEMSFlds(self,outFNm,fldNm,fldArray):
+
+    def _IsGridShape(self,shape):
+        # Whether a field of shape is on the grid CompactFlds() took the
+        # fields from (or, with broadcast fields, broadcasts to it)
+        if shape == self.gridShape:
+            return True
+        if not self.broadcastFlds or len(shape) > len(self.gridShape):
+            return False
+        try:
+            return np.broadcast_shapes(shape,self.gridShape) == self.gridShape
+        except ValueError:
+            return False
+    # def _IsGridShape(self,shape):
+
+    def _FitsArrayShape(self,shape):
+        # Whether a field of shape fits the program's shape: matches it
+        # or, with broadcast fields, broadcasts to it
+        if shape == self.arrayShape:
+            return True
+        if not self.broadcastFlds:
+            return False
+        try:
+            np.broadcast_shapes(shape,self.arrayShape)
+        except ValueError:
+            return False
+        return True
+    # def _FitsArrayShape(self,shape):
+
+    def _GetBroadcastShape(self,arrs):
+        # The shape arrs broadcast to. Fields of the same shape, as
+        # they are without broadcast fields, keep it.
+        return np.broadcast_shapes(*[arr.shape for arr in arrs])
+    # def _GetBroadcastShape(self,arrs):
+
+    def _BroadcastArray(self,arr,shape):
+        # arr, a field or part of one, as a read-only view of shape, its
+        # mask too, without copying (see SetBroadcastFlds())
+        if arr.shape == shape:
+            return arr
+        if not isinstance(arr,np.ma.masked_array):
+            return np.broadcast_to(arr,shape)
+        arrMask = np.ma.getmask(arr)
+        if arrMask is not np.ma.nomask:
+            arrMask = np.broadcast_to(arrMask,shape)
+        return np.ma.masked_array(np.broadcast_to(np.ma.getdata(arr),shape),mask=arrMask,copy=False)
+    # def _BroadcastArray(self,arr,shape):
+
+    def _ShareMask(self,fldNm,fldArray):
+        # With shared masks, the cells masked in a field read are added
+        # to the shared invalidMask, its mask is kept in readMasks for
+        # the statistics of the fields computed from it, and the field
+        # is held as its data, with NaN in the masked cells of floating
+        # point fields. A field computed is held as its data too unless
+        # it has masked cells of its own (e.g. results that are not
+        # finite): it then stays a masked array, and its mask is not
+        # shared. With broadcast fields, invalidMask takes the shape of
+        # the masks added to it. Call with fldLock held.
+
+        if not self.sharedMask:
+            return fldArray
+
+        fldData = np.ma.getdata(fldArray)
+        fldMask = np.ma.getmask(fldArray)
+        if fldMask is not np.ma.nomask and not fldMask.any():
+            self.__FreeTempBuffer(fldMask)
+            fldMask = np.ma.nomask
+        if fldMask is np.ma.nomask:
+            return fldData
+
+        if self.readSrcFldNms.get(fldNm) != (fldNm,):
+            return fldArray
+
+        if fldData.dtype.kind == 'f':
+            np.copyto(fldData,np.nan,where=fldMask)
+
+        self.readMasks[fldNm] = fldMask
+
+        if self.invalidMask is None:
+            self.invalidMask = fldMask.copy()
+        elif np.greater(fldMask,self.invalidMask).any():
+            # A new array rather than in place, as scratch cmdRunners
+            # may share the old one
+            self.invalidMask = self.invalidMask | fldMask
+        else:
+            return fldData
+
+        self.invalidMaskSig = hashlib.sha1(np.packbits(self.invalidMask).tobytes()).hexdigest()
+
+        return fldData
+
+    # def _ShareMask(self,fldNm,fldArray):
+
+    def _GetMaskedView(self,fldData):
+        # fldData as a masked array, for writing. With shared masks,
+        # fields hold just their data, or their data and the cells
+        # masked in them alone; this puts the shared mask over it too.
+        # A field of lower rank is seen at the program's shape.
+
+        if not self.sharedMask:
+            return fldData
+
+        fldMask = np.ma.getmask(fldData)
+        fldData = np.ma.getdata(fldData)
+        if self.invalidMask is None:
+            return np.ma.masked_array(fldData,mask=fldMask,copy=False)
+
+        invalidMask = self.invalidMask
+        if invalidMask.shape != fldData.shape:
+            viewShape = np.broadcast_shapes(fldData.shape,invalidMask.shape)
+            fldData = self._BroadcastArray(fldData,viewShape)
+            invalidMask = np.broadcast_to(invalidMask,viewShape)
+        if fldMask is not np.ma.nomask:
+            invalidMask = invalidMask | fldMask
+
+        return np.ma.masked_array(fldData,mask=invalidMask,copy=False)
+
+    # def _GetMaskedView(self,fldData):
+
+    def _GetOwnMask(self,fldNm,fldData,ndx=None):
+        # The mask field fldNm would have as a masked array of its own,
+        # for fldData, the field or, with ndx, the ndx part of it seen at
+        # the program's shape (e.g. a block of rows). With shared masks
+        # this is the cells masked in any of the fields read that it is
+        # computed from (see SetReadSrcFlds()) and those masked in
+        # fldData itself.
+
+        fldMask = np.ma.getmask(fldData)
+        if not self.sharedMask:
+            return fldMask
+
+        for srcFldNm in self.readSrcFldNms.get(fldNm,()):
+            if srcFldNm not in self.readMasks:
+                continue
+            srcMask = self.readMasks[srcFldNm]
+            if ndx is not None:
+                srcMask = self._BroadcastArray(srcMask,self.arrayShape)[ndx]
+            if fldMask is np.ma.nomask:
+                fldMask = srcMask
+            else:
+                fldMask = fldMask | srcMask
+
+        if fldMask is not np.ma.nomask and fldMask.shape != fldData.shape:
+            fldMask = np.broadcast_to(fldMask,fldData.shape)
+
+        return fldMask
+
+    # def _GetOwnMask(self,fldNm,fldData,ndx=None):
+
+    def _GetFldView(self,fldNm):
+        # A field as a masked array over its own valid cells, for its
+        # statistics: with shared masks, its data under the mask it
+        # would have as a masked array of its own (see _GetOwnMask()).
+        fldData = self.EEMSFlds[fldNm]['data']
+        if not self.sharedMask:
+            return fldData
+        return np.ma.masked_array(
+            np.ma.getdata(fldData),
+            mask=self._GetOwnMask(fldNm,fldData),
+            copy=False
+            )
+    # def _GetFldView(self,fldNm):
+
+    def _GetValidMask(self):
+        # The cells of the grid kept by CompactFlds(): those not masked
+        # in any field. Override to use the format's own notion of valid
+        # cells.
+        if self.sharedMask:
+            if self.invalidMask is None:
+                return np.ones(self.arrayShape,dtype=bool)
+            return ~self._BroadcastArray(self.invalidMask,self.arrayShape)
+
+        validMask = np.ones(self.arrayShape,dtype=bool)
+        for fldNm,fld in self.EEMSFlds.items():
+            if fldNm not in self.scenarioFldNms:
+                validMask &= ~np.ma.getmaskarray(fld['data'])
+        return validMask
+    # def _GetValidMask(self):
+
+    def _CompactArray(self,fldArray):
+        # The valid cells of fldArray, which is on the grid
+        if not isinstance(fldArray,np.ma.masked_array):
+            return fldArray[...,self.validMask]
+        return np.ma.masked_array(
+            np.ma.getdata(fldArray)[...,self.validMask],
+            mask=np.ma.getmaskarray(fldArray)[...,self.validMask]
+            )
+    # def _CompactArray(self,fldArray):
+
+    def _GetGridData(self,fldNm,ownMask=False):
+        # A field's data on the grid, for writing. Cells dropped by
+        # CompactFlds() are masked, as are, with shared masks, the
+        # invalid cells, or with ownMask those of the field's own mask
+        # (see _GetFldView()), e.g. to stage a field read for another
+        # cmdRunner. Broadcast fields are written at the program's
+        # shape.
+        if ownMask:
+            fldData = self._GetFldView(fldNm)
+        else:
+            fldData = self._GetMaskedView(self.EEMSFlds[fldNm]['data'])
+        if self.validMask is None:
+            if fldNm in self.scenarioFldNms:
+                return self._BroadcastArray(fldData,fldData.shape[:1]+self.arrayShape)
+            return self._BroadcastArray(fldData,self.arrayShape)
+
+        gridData = np.ma.masked_all(fldData.shape[:-1] + self.gridShape,dtype=fldData.dtype)
+        gridData[...,self.validMask] = fldData
+        return gridData
+    # def _GetGridData(self,fldNm):
+
+    def _GetFldDtype(self,dtype):
+        # The type a field of dtype is kept as. Floating point fields
+        # follow the dtype policy, others (e.g. categories read in as
+        # integers) keep their type.
+        if np.dtype(dtype).kind == 'f':
+            return self.dtype
+        return np.dtype(dtype)
+    # def _GetFldDtype(self,dtype):
+
+    def _CastToDtype(self,fldArray):
+        fldDtype = self._GetFldDtype(fldArray.dtype)
+        if fldArray.dtype != fldDtype:
+            fldArray = fldArray.astype(fldDtype)
+        return fldArray
+    # def _CastToDtype(self,fldArray):
+
     def _VerifyFuzzyField(self,inFldNm):
-        if (self.EEMSFlds[inFldNm]['data'].min() < -1.0 or
-            self.EEMSFlds[inFldNm]['data'].max() > 1.0):
+        if inFldNm in self.fuzzyFldNms:
+            return
+        self._VerifyFuzzyRange(
+            inFldNm,
+            self._GetFldStat(inFldNm,'min'),
+            self._GetFldStat(inFldNm,'max'))
+    # def _VerifyFuzzyField(self,inFldNm):
+
+    def _VerifyFuzzyRange(self,inFldNm,fldMin,fldMax):
+        if fldMin < -1.0 or fldMax > 1.0:
             raise Exception(
                 '\n********************ERROR********************\n'+
                 'Field in fuzzy operation has range outside of fuzzy limits (-1,+1):\n'
                 '  Field *%s* has range (%f,%f).\n'%
-                (inFldNm,
-                 self.EEMSFlds[inFldNm]['data'].min(),
-                 self.EEMSFlds[inFldNm]['data'].max()))
-    # def _VerifyFuzzyField(self,inFldNm):
+                (inFldNm,fldMin,fldMax))
+    # def _VerifyFuzzyRange(self,inFldNm,fldMin,fldMax):
+
+    def _GetFldStat(self,fldNm,statNm):
+        # A statistic of a field as held: 'min', 'max', 'mean' or 'cnt'
+        # (the number of unmasked cells). Statistics are computed when
+        # first asked for, min and max together and mean and cnt
+        # together, and kept until the field is replaced or removed.
+
+        fldStatCache = self.fldStatCache.setdefault(fldNm,{})
+
+        if statNm not in fldStatCache:
+            fldData = self._GetFldView(fldNm)
+            if statNm in ['min','max']:
+                fldStatCache['min'] = fldData.min()
+                fldStatCache['max'] = fldData.max()
+            elif statNm in ['mean','cnt']:
+                fldStatCache['mean'] = fldData.mean()
+                fldStatCache['cnt'] = fldData.count()
+            else:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Unknown field statistic: *%s*\n'%statNm)
+
+        return fldStatCache[statNm]
+
+    # def _GetFldStat(self,fldNm,statNm):
+
+    def _SetFldStat(self,fldNm,statNm,statVal):
+        # Records a statistic of a field that is already known, e.g.
+        # found while computing the field
+        self.fldStatCache.setdefault(fldNm,{})[statNm] = statVal
+
+    def _GetFldMin(self,fldNm):
+        if fldNm in self.fldStats:
+            return self.fldStats[fldNm]['min']
+        else:
+            return self._GetFldStat(fldNm,'min')
+
+    def _GetFldMax(self,fldNm):
+        if fldNm in self.fldStats:
+            return self.fldStats[fldNm]['max']
+        else:
+            return self._GetFldStat(fldNm,'max')
 
     def _LinearCvtArray(
         self,
@@ -1627,144 +2237,903 @@ class EEMSCmdRunnerBase(object):
         m = (y2 - y1) / (x2 - x1)
         b = -m * x1 + y1
 
-        return srcArr *m + b
+        return srcArr *self.dtype.type(m) + self.dtype.type(b)
 
     # def _LinearCvtArray(
 
-########################################################################
-# Public methods
-########################################################################
-
-    def Read(
-        self,
-        inFileName,
-        inFieldName,
-        outFileName,
-        newFieldName
-        ):
-        if newFieldName is not 'NONE':
-            newFieldName = [newFieldName]
-
-        self.ReadMulti(inFileName,[inFieldName],outFileName,newFieldName)
-    # def Read(
+    # Buffers for results and temporaries. With the buffer pool on (see
+    # SetBufferPool()) a buffer goes back to the pool when the last field
+    # holding it is removed, or when it is released as a temporary, and
+    # is handed out again for the next array of the same shape and type.
+
+    def __GetBufferOwner(self,arr):
+        # The array that owns arr's memory
+        while isinstance(arr.base,np.ndarray):
+            arr = arr.base
+        return arr
+
+    def __HoldBuffers(self,fldArray):
+        # Counts a new field holding fldArray. Call with fldLock held.
+        if not self.useBufferPool:
+            return
+        for arr in [np.ma.getdata(fldArray),np.ma.getmask(fldArray)]:
+            if arr is np.ma.nomask:
+                continue
+            owner = self.__GetBufferOwner(arr)
+            if id(owner) in self.poolBuffers and self.poolBuffers[id(owner)] is owner:
+                self.bufferFldCnts[id(owner)] = self.bufferFldCnts.get(id(owner),0) + 1
+
+    # def __HoldBuffers(self,fldArray):
+
+    def __ReleaseBuffers(self,fldArray):
+        # Counts a field holding fldArray as removed, returning buffers
+        # no field holds to the pool. Call with fldLock held.
+        if not self.useBufferPool:
+            return
+        for arr in [np.ma.getdata(fldArray),np.ma.getmask(fldArray)]:
+            if arr is np.ma.nomask:
+                continue
+            owner = self.__GetBufferOwner(arr)
+            if id(owner) in self.bufferFldCnts:
+                self.bufferFldCnts[id(owner)] -= 1
+                if self.bufferFldCnts[id(owner)] == 0:
+                    del self.bufferFldCnts[id(owner)]
+                    self.__FreeBuffer(owner)
+
+    # def __ReleaseBuffers(self,fldArray):
+
+    def __FreeBuffer(self,owner):
+        # Call with fldLock held
+        if id(owner) not in self.freeBufferIds:
+            self.freeBuffers.setdefault((owner.shape,owner.dtype.str),[]).append(owner)
+            self.freeBufferIds.add(id(owner))
+
+    def _GetBuffer(self,shape,dtype):
+        # An uninitialized array
+        dtype = np.dtype(dtype)
+        if not self.useBufferPool:
+            return np.empty(shape,dtype=dtype)
+
+        with self.fldLock:
+            freeBuffers = self.freeBuffers.get((tuple(shape),dtype.str))
+            if freeBuffers:
+                buffer = freeBuffers.pop()
+                self.freeBufferIds.discard(id(buffer))
+            else:
+                buffer = np.empty(shape,dtype=dtype)
+                self.poolBuffers[id(buffer)] = buffer
+
+        return buffer
+
+    # def _GetBuffer(self,shape,dtype):
+
+    def _GetMaskedBuffer(self,shape,dtype=None):
+        # An uninitialized masked array with a full mask, of the
+        # dtype policy's type unless dtype is given. With shared masks
+        # the mask collects the cells the operator masks itself, and is
+        # dropped if there are none (see _ShareMask()).
+        if dtype is None:
+            dtype = self.dtype
+        return np.ma.masked_array(
+            self._GetBuffer(shape,dtype),
+            mask=self._GetBuffer(shape,bool),
+            copy=False
+            )
 
-    def ReadMulti(
-        self,
-        inFileName,
-        inFieldNames,
-        outFileName,
-        newFieldName
-        ):
+    # def _GetMaskedBuffer(self,shape,dtype=None):
+
+    def _ReleaseBuffer(self,arr):
+        # Returns a temporary from _GetBuffer() or _GetMaskedBuffer() to
+        # the pool. Buffers held by fields are left alone.
+        if not self.useBufferPool:
+            return
+        with self.fldLock:
+            for bufferArr in [np.ma.getdata(arr),np.ma.getmask(arr)]:
+                if bufferArr is not np.ma.nomask:
+                    self.__FreeTempBuffer(bufferArr)
+
+    # def _ReleaseBuffer(self,arr):
+
+    def __FreeTempBuffer(self,arr):
+        # _ReleaseBuffer() for one array. Call with fldLock held.
+        if not self.useBufferPool:
+            return
+        owner = self.__GetBufferOwner(arr)
+        if (id(owner) in self.poolBuffers and
+            self.poolBuffers[id(owner)] is owner and
+            id(owner) not in self.bufferFldCnts):
+            self.__FreeBuffer(owner)
+
+    # def __FreeTempBuffer(self,arr):
+
+    # In place building blocks of the operators. newData is a buffer
+    # from _GetMaskedBuffer(). Values under the mask are not kept up,
+    # only the mask is, if newData has one.
+
+    def _GetKernelArrays(self,arrs,dtype=None):
+        # The data and the masks of arrs, flat, for the loop kernels of
+        # the kernel backend (see SetKernelBackend()). An array without
+        # a mask gets an empty one. None if the backend is NumPy, or if
+        # the kernels cannot take arrs: they must be C-contiguous, of one
+        # shape (broadcast fields are not), and of dtype or, without
+        # dtype, of a numeric type.
+
+        if self.kernels is None:
+            return None
+        if len(set([arr.shape for arr in arrs])) > 1:
+            return None
 
-        ##### This method should be overridden by a method in the
-        ##### specific version of EEMS.
+        flatDatas = []
+        flatMasks = []
+        for arr in arrs:
+            arrData = np.ma.getdata(arr)
+            arrMask = np.ma.getmask(arr)
+            if dtype is None:
+                if arrData.dtype.kind not in 'iuf':
+                    return None
+            elif arrData.dtype != dtype:
+                return None
+            if not arrData.flags.c_contiguous:
+                return None
+            flatDatas.append(arrData.reshape(-1))
 
-        pass
+            if arrMask is np.ma.nomask:
+                flatMasks.append(np.zeros(0,dtype=bool))
+            elif arrMask.shape == arrData.shape and arrMask.flags.c_contiguous:
+                flatMasks.append(arrMask.reshape(-1))
+            else:
+                return None
 
-        # Confirm all inFieldNames in input file
-            
-        # determine inFieldNames col ndxs in input file
+        return flatDatas,flatMasks
 
-        # Add fields to EEMSFlds
+    # def _GetKernelArrays(self,arrs,dtype=None):
 
-    # def ReadMulti(...)
-                                            
-    def CvtToFuzzy(
-        self,
-        inFieldName,
-        trueThreshold,
-        falseThreshold,
-        outFileName,
-        rsltName
-        ):
+    def _GetOutArray(self,out,shape,dtype=None):
+        # out if it was given, otherwise a new buffer
+        if out is None:
+            out = self._GetMaskedBuffer(shape,dtype)
+        return out
 
-        if falseThreshold == self.MinForFuzzyLimit:
-            falseThresh = self.EEMSFlds[inFieldName]['data'].min()
-        elif falseThreshold == self.MaxForFuzzyLimit:
-            falseThresh = self.EEMSFlds[inFieldName]['data'].max()
-        else:
-            falseThresh = falseThreshold
+    def _CopyArrayInto(self,newData,inData):
+        np.copyto(np.ma.getdata(newData),np.ma.getdata(inData))
+        self._CopyMaskInto(newData,inData)
 
-        if trueThreshold == self.MinForFuzzyLimit:
-            trueThresh = self.EEMSFlds[inFieldName]['data'].min()
-        elif trueThreshold == self.MaxForFuzzyLimit:
-            trueThresh = self.EEMSFlds[inFieldName]['data'].max()
+    def _CopyMaskInto(self,newData,inData):
+        newMask = np.ma.getmask(newData)
+        if newMask is np.ma.nomask:
+            return
+        inMask = np.ma.getmask(inData)
+        if inMask is np.ma.nomask:
+            newMask[...] = False
         else:
-            trueThresh = trueThreshold
-
-        if trueThresh == falseThresh:
+            np.copyto(newMask,inMask)
+
+    def _MaskCellsInto(self,newData,cellMask):
+        # Masks the cells of cellMask in newData, e.g. cells np.ma
+        # arithmetic would mask as out of its domain
+        newMask = np.ma.getmask(newData)
+        if newMask is not np.ma.nomask:
+            np.logical_or(newMask,cellMask,out=newMask)
+
+    def _OrMaskInto(self,newData,inData):
+        newMask = np.ma.getmask(newData)
+        inMask = np.ma.getmask(inData)
+        if newMask is not np.ma.nomask and inMask is not np.ma.nomask:
+            np.logical_or(newMask,inMask,out=newMask)
+
+    def _ReduceArrays(self,reduceNm,inDatas,out=None,dtype=None,weights=None,clampFuzzy=False,blockCellCnt=65536):
+
+        # Reduces inDatas, arrays of the same shape (or, with broadcast
+        # fields, shapes broadcasting to one), cell by cell into one
+        # array (out if it is given). reduceNm is one of:
+        #   'min', 'max'  smallest (largest) value
+        #   'sum', 'mean' sum or mean, weighted by weights if given
+        #   'emdsand'     EMDS and of the min and the (weighted) mean:
+        #                 min + (mean - min) * (min + 1) / 2
+        # The inputs are taken in order, a block of about blockCellCnt
+        # cells at a time, so the result is the only full size array
+        # and its blocks stay in cache while all the inputs are folded
+        # in; the temporaries (e.g. weighted products) are block sized.
+        # Each block's mask is combined once from all the input masks.
+        # Cells np.ma arithmetic would mask are masked too: infinite
+        # means (np.ma's in place division) and, for emdsand, cells
+        # where (mean - min) * (min + 1) / 2 is not finite (np.ma's
+        # division). With clampFuzzy, the result is clamped to the fuzzy
+        # range block by block. With a kernel backend, one kernel does
+        # it all.
+
+        if reduceNm not in ['min','max','sum','mean','emdsand']:
             raise Exception(
                 '\n********************ERROR********************\n'+
-                'CvtToFuzzy(): trueThresh cannot equal falseThresh.\n'+
-                '  trueThresh == falshThresh == *%f*'%trueThresh +
-                'Arguments to this method call were:\n'+
-                '  inFieldName:    %s\n'%inFieldName+
-                '  trueThreshold:  %f\n'%trueThreshold+
-                '  falseThreshold: %f\n'%falseThreshold+
-                '  outFileName:    %s\n'%outFileName+
-                '  rsltName:       %s\n\n'%rsltName+
-                'Note that this can happen when using default values for\n'+
-                'for true and false thresholds with an field that has a \n'+
-                'uniform value\n')
+                'Unknown reduction: *%s*\n'%reduceNm)
 
-        m = (-1 - 1) / (falseThresh - trueThresh)
-        b = 1 -m * trueThresh
+        newData = self._GetOutArray(out,self._GetBroadcastShape(inDatas),dtype)
+        newDataData = np.ma.getdata(newData)
+        newMask = np.ma.getmask(newData)
+        inDatas = [self._BroadcastArray(inData,newData.shape) for inData in inDatas]
 
-        newData = self.EEMSFlds[inFieldName]['data'] * m + b
+        # the divisor for means, in float64 as np.ma division has it
+        if weights is None:
+            meanDivisor = np.float64(len(inDatas))
+        else:
+            meanDivisor = np.float64(sum(weights))
+
+        if newDataData.dtype.kind == 'f':
+            kernelArrs = self._GetKernelArrays(list(inDatas) + [newData],newDataData.dtype)
+            if kernelArrs is not None:
+                self.kernels.ReduceArrays(
+                    reduceNm,
+                    kernelArrs[0][:-1],
+                    kernelArrs[1][:-1],
+                    np.array([] if weights is None else weights,dtype=newDataData.dtype),
+                    meanDivisor,
+                    clampFuzzy,
+                    kernelArrs[0][-1],
+                    kernelArrs[1][-1]
+                    )
+                return newData
 
-        # take care of values outside of thresholds
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        inDataDatas = [np.ma.getdata(inData) for inData in inDatas]
+        inMasks = [np.ma.getmask(inData) for inData in inDatas if np.ma.getmask(inData) is not np.ma.nomask]
 
-        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
+        blockRowCnt = max(1,blockCellCnt // max(1,int(np.prod(newDataData.shape[1:]))))
+        blockShape = (min(blockRowCnt,newDataData.shape[0]),) + newDataData.shape[1:]
 
-    # def CvtToFuzzy(...)
+        if reduceNm in ['min','max','emdsand']:
+            # newData = np.ma.minimum(newData,inData) and the like:
+            # take the input unless newData is strictly less (greater)
+            useIn = self._GetBuffer(blockShape,bool)
+            if reduceNm == 'max':
+                keepNew = np.greater
+            else:
+                keepNew = np.less
+        if reduceNm == 'emdsand':
+            meanBuffer = self._GetBuffer(blockShape,newDataData.dtype)
+        if weights is not None or reduceNm == 'emdsand':
+            tmpBuffer = self._GetBuffer(blockShape,newDataData.dtype)
+        if reduceNm in ['mean','emdsand']:
+            domainBuffer = self._GetBuffer(blockShape,bool)
+
+        for startRow in range(0,newDataData.shape[0],blockRowCnt):
+            block = slice(startRow,startRow + blockRowCnt)
+            newBlock = newDataData[block]
+            blockRowsCnt = len(newBlock)
+
+            if reduceNm in ['min','max','emdsand']:
+                blockUseIn = useIn[:blockRowsCnt]
+                np.copyto(newBlock,inDataDatas[0][block],casting='unsafe')
+                for inDataData in inDataDatas[1:]:
+                    inBlock = inDataData[block]
+                    keepNew(newBlock,inBlock,out=blockUseIn)
+                    np.logical_not(blockUseIn,out=blockUseIn)
+                    np.copyto(newBlock,inBlock,where=blockUseIn,casting='unsafe')
+
+            if reduceNm in ['sum','mean','emdsand']:
+                if reduceNm == 'emdsand':
+                    sumBlock = meanBuffer[:blockRowsCnt]
+                else:
+                    sumBlock = newBlock
+                if weights is None:
+                    np.copyto(sumBlock,inDataDatas[0][block],casting='unsafe')
+                    for inDataData in inDataDatas[1:]:
+                        np.add(sumBlock,inDataData[block],out=sumBlock,casting='unsafe')
+                else:
+                    tmpBlock = tmpBuffer[:blockRowsCnt]
+                    np.multiply(inDataDatas[0][block],weights[0],out=sumBlock,casting='unsafe')
+                    for ndx in range(1,len(inDataDatas)):
+                        np.multiply(inDataDatas[ndx][block],weights[ndx],out=tmpBlock,casting='unsafe')
+                        np.add(sumBlock,tmpBlock,out=sumBlock)
+                if reduceNm != 'sum':
+                    sumBlock /= meanDivisor
+
+            if reduceNm == 'mean':
+                domainBlock = domainBuffer[:blockRowsCnt]
+                np.isinf(sumBlock,out=domainBlock)
+
+            if reduceNm == 'emdsand':
+                tmpBlock = tmpBuffer[:blockRowsCnt]
+                np.subtract(sumBlock,newBlock,out=sumBlock)
+                np.add(newBlock,1,out=tmpBlock)
+                np.multiply(sumBlock,tmpBlock,out=sumBlock)
+                sumBlock /= 2
+                domainBlock = domainBuffer[:blockRowsCnt]
+                np.isfinite(sumBlock,out=domainBlock)
+                np.logical_not(domainBlock,out=domainBlock)
+                np.add(newBlock,sumBlock,out=newBlock)
+
+            if clampFuzzy:
+                np.clip(newBlock,-1.0,1.0,out=newBlock)
+
+            if newMask is np.ma.nomask:
+                continue
+            maskBlock = newMask[block]
+            if len(inMasks) == 0:
+                maskBlock[...] = False
+            else:
+                np.copyto(maskBlock,inMasks[0][block])
+                for inMask in inMasks[1:]:
+                    np.logical_or(maskBlock,inMask[block],out=maskBlock)
+            if reduceNm in ['mean','emdsand']:
+                np.logical_or(maskBlock,domainBlock,out=maskBlock)
 
-    def CvtToFuzzyCurve(
-        self,
-        inFieldName,
-        rawValues,
-        fuzzyValues,
-        outFileName,
-        rsltName
-        ):
+        # for startRow in range(0,newDataData.shape[0],blockRowCnt):
 
-        # have to go in segments and apply linear to segment.
-        # beyond x vals gets boundary y val
-        # assumes sorted Raw and Fuzzy values
+        if reduceNm in ['min','max','emdsand']:
+            self._ReleaseBuffer(useIn)
+        if reduceNm == 'emdsand':
+            self._ReleaseBuffer(meanBuffer)
+        if weights is not None or reduceNm == 'emdsand':
+            self._ReleaseBuffer(tmpBuffer)
+        if reduceNm in ['mean','emdsand']:
+            self._ReleaseBuffer(domainBuffer)
 
-        newData = np.ma.where(
-            self.EEMSFlds[inFieldName]['data'] != self.EEMSFlds[inFieldName]['data'],
-            float('nan'),
-            -9999
-            )
+        return newData
 
-        # values lower than lowest raw value
-        newData = np.ma.where(self.EEMSFlds[inFieldName]['data'] <= rawValues[0], fuzzyValues[0], newData)
+    # def _ReduceArrays(self,reduceNm,inDatas,out=None,dtype=None,weights=None,clampFuzzy=False,blockCellCnt=65536):
 
-        for ndx in range(1,len(rawValues)):
+    # Array versions of the elementwise fuzzy operators. These work on
+    # whole fields or on blocks of fields (see RunFusedCmds()) and give
+    # the same values either way. The result goes in out if it is given.
 
-            m = (fuzzyValues[ndx] - fuzzyValues[ndx-1]) / (rawValues[ndx] - rawValues[ndx-1])
-            b = fuzzyValues[ndx-1] -m * rawValues[ndx-1] 
-            
-            newData = np.ma.where(
-                self.EEMSFlds[inFieldName]['data'] <= rawValues[ndx-1],
-                newData,
-                np.ma.where(
-                    self.EEMSFlds[inFieldName]['data'] <= rawValues[ndx],
-                    self.EEMSFlds[inFieldName]['data'] * m + b,
-                    newData
-                    )
+    def _ClampFuzzyArray(self,newData):
+        # insure that rounding errors don't accumulate
+        np.clip(np.ma.getdata(newData),-1.0,1.0,out=np.ma.getdata(newData))
+        return newData
+
+    def _CvtToFuzzyArray(self,inData,trueThresh,falseThresh,out=None):
+
+        m = (-1 - 1) / (falseThresh - trueThresh)
+        b = 1 -m * trueThresh
+
+        newData = self._GetOutArray(out,inData.shape)
+        np.multiply(np.ma.getdata(inData),self.dtype.type(m),out=np.ma.getdata(newData))
+        np.add(np.ma.getdata(newData),self.dtype.type(b),out=np.ma.getdata(newData))
+        self._CopyMaskInto(newData,inData)
+
+        # take care of values outside of thresholds
+        return self._ClampFuzzyArray(newData)
+
+    # def _CvtToFuzzyArray(self,inData,trueThresh,falseThresh,out=None):
+
+    def _CvtToFuzzyCurveArray(self,inData,rawValues,fuzzyValues,out=None):
+
+        # Piecewise linear through the points (rawValues,fuzzyValues),
+        # taken in order of raw value, in one pass whatever the number
+        # of points. Each cell's segment, (rawVals[ndx-1],rawVals[ndx]],
+        # is found by binary search and the segment's line applied.
+        # Values at or below the lowest raw value get the first fuzzy
+        # value, those above the highest the last. NaNs stay NaN.
+
+        pointNdxs = sorted(range(len(rawValues)),key=lambda ndx:rawValues[ndx])
+        rawVals = [rawValues[ndx] for ndx in pointNdxs]
+        fuzzyVals = [fuzzyValues[ndx] for ndx in pointNdxs]
+
+        # Slope and intercept by segment. The segments beyond the ends
+        # are flat. Whatever the type of the field, the raw values are
+        # compared, and the lines applied, in float64.
+        segSlopes = np.zeros(len(rawVals)+1,dtype=np.float64)
+        segIntercepts = np.empty(len(rawVals)+1,dtype=np.float64)
+        segIntercepts[0] = fuzzyVals[0]
+        segIntercepts[-1] = fuzzyVals[-1]
+        for ndx in range(1,len(rawVals)):
+            if rawVals[ndx] == rawVals[ndx-1]:
+                # empty segment
+                segIntercepts[ndx] = fuzzyVals[ndx]
+                continue
+            m = (fuzzyVals[ndx] - fuzzyVals[ndx-1]) / (rawVals[ndx] - rawVals[ndx-1])
+            segSlopes[ndx] = m
+            segIntercepts[ndx] = fuzzyVals[ndx-1] -m * rawVals[ndx-1]
+
+        rawArr = np.array(rawVals,dtype=np.float64)
+
+        newData = self._GetOutArray(out,inData.shape)
+
+        kernelArrs = self._GetKernelArrays([inData,newData])
+        if kernelArrs is not None:
+            self.kernels.CvtToFuzzyCurve(
+                kernelArrs[0][0],
+                kernelArrs[1][0],
+                rawArr,
+                segSlopes,
+                segIntercepts,
+                kernelArrs[0][1],
+                kernelArrs[1][1]
                 )
+            return newData
+
+        newDataData = np.ma.getdata(newData)
+        if newDataData.dtype == np.float64:
+            lineData = newDataData
+        else:
+            lineData = self._GetBuffer(inData.shape,np.float64)
+        np.copyto(lineData,np.ma.getdata(inData),casting='unsafe')
 
-        # for ndx in range(1,len(rawValues)):
+        # NaNs sort last, into the flat segment after the end
+        segNdxs = np.searchsorted(rawArr,lineData,side='left')
+
+        # Only the flat segments see values outside of the raw values,
+        # so clipping leaves the result alone, except that infinities
+        # no longer give 0 * inf
+        np.clip(lineData,rawArr[0],rawArr[-1],out=lineData)
+
+        tmpData = self._GetBuffer(inData.shape,np.float64)
+        np.take(segSlopes,segNdxs,out=tmpData,mode='clip')
+        np.multiply(lineData,tmpData,out=lineData)
+        np.take(segIntercepts,segNdxs,out=tmpData,mode='clip')
+        np.add(lineData,tmpData,out=lineData)
+        self._ReleaseBuffer(tmpData)
+        if lineData is not newDataData:
+            np.copyto(newDataData,lineData,casting='same_kind')
+            self._ReleaseBuffer(lineData)
+
+        self._CopyMaskInto(newData,inData)
 
-        # values greater than greatest raw value
-        newData = np.ma.where(self.EEMSFlds[inFieldName]['data'] > rawValues[-1], fuzzyValues[-1], newData)
-        
         # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        return self._ClampFuzzyArray(newData)
+
+    # def _CvtToFuzzyCurveArray(self,inData,rawValues,fuzzyValues,out=None):
+
+    def _CvtToFuzzyCatArray(self,inData,rawValues,fuzzyValues,defaultFuzzyValue,inRange=None,out=None):
+
+        # Maps each cell's category to its fuzzy value in one pass
+        # whatever the number of categories. Cells matching none of the
+        # raw values get defaultFuzzyValue, NaNs stay NaN. As before,
+        # a later raw value takes precedence over an equal earlier one.
+        #
+        # An integer field whose range, inRange, is known and spans at
+        # most MaxCatLUTLen values is looked up in a table over that
+        # range. Otherwise each cell is found among the sorted raw
+        # values by binary search and compared in float64.
+
+        catFuzzyVals = {}
+        for ndx in range(len(rawValues)):
+            catFuzzyVals[rawValues[ndx]] = fuzzyValues[ndx]
+        catRawVals = sorted(catFuzzyVals)
+
+        newData = self._GetOutArray(out,inData.shape)
+        newDataData = np.ma.getdata(newData)
+        inDataData = np.ma.getdata(inData)
+
+        if (inRange is not None and
+            inRange[0] is not np.ma.masked and
+            int(inRange[1]) - int(inRange[0]) < self.MaxCatLUTLen):
+
+            lutMin = int(inRange[0])
+            catLUT = np.full(int(inRange[1]) - lutMin + 1,defaultFuzzyValue,dtype=newDataData.dtype)
+            for rawVal in catRawVals:
+                if float(rawVal).is_integer() and 0 <= int(rawVal) - lutMin < len(catLUT):
+                    catLUT[int(rawVal) - lutMin] = catFuzzyVals[rawVal]
+
+            # masked cells may hold values outside of the range; they
+            # are clipped to the ends of the table
+            catNdxs = self._GetBuffer(inData.shape,np.intp)
+            np.subtract(inDataData,lutMin,out=catNdxs,casting='unsafe')
+            np.take(catLUT,catNdxs,out=newDataData,mode='clip')
+            self._ReleaseBuffer(catNdxs)
+
+        else:
+
+            # the last entry of the table is for cells in no category
+            rawArr = np.array(catRawVals,dtype=np.float64)
+            catLUT = np.array(
+                [catFuzzyVals[rawVal] for rawVal in catRawVals] + [defaultFuzzyValue],
+                dtype=newDataData.dtype)
+
+            catNdxs = np.searchsorted(rawArr,inDataData,side='left')
+            np.minimum(catNdxs,len(rawArr)-1,out=catNdxs)
+            inCat = self._GetBuffer(inData.shape,bool)
+            np.equal(np.take(rawArr,catNdxs,mode='clip'),inDataData,out=inCat)
+            np.logical_not(inCat,out=inCat)
+            np.copyto(catNdxs,len(rawArr),where=inCat)
+            self._ReleaseBuffer(inCat)
+            np.take(catLUT,catNdxs,out=newDataData,mode='clip')
+
+            if inDataData.dtype.kind == 'f':
+                np.copyto(newDataData,np.nan,where=np.isnan(inDataData))
+
+        self._CopyMaskInto(newData,inData)
+
+        return newData
+
+    # def _CvtToFuzzyCatArray(self,inData,rawValues,fuzzyValues,defaultFuzzyValue,inRange=None,out=None):
+
+    def _FuzzyNotArray(self,inData,out=None):
+        newData = self._GetOutArray(out,inData.shape)
+        np.negative(np.ma.getdata(inData),out=np.ma.getdata(newData))
+        self._CopyMaskInto(newData,inData)
+        return self._ClampFuzzyArray(newData)
+
+    def _FuzzyUnionArray(self,inDatas,out=None):
+        return self._ReduceArrays('mean',inDatas,out,clampFuzzy=True)
+
+    # def _FuzzyUnionArray(self,inDatas,out=None):
+
+    def _FuzzyOrArray(self,inDatas,out=None):
+        return self._ReduceArrays('max',inDatas,out,clampFuzzy=True)
+
+    # def _FuzzyOrArray(self,inDatas,out=None):
+
+    def _FuzzyAndArray(self,inDatas,out=None):
+        return self._ReduceArrays('min',inDatas,out,clampFuzzy=True)
+
+    # def _FuzzyAndArray(self,inDatas,out=None):
+
+    def _FuzzyEMDSAndArray(self,inDatas,out=None,weights=None):
+        return self._ReduceArrays('emdsand',inDatas,out,weights=weights,clampFuzzy=True)
+
+    def _FuzzyWeightedUnionArray(self,inDatas,weights,out=None):
+        return self._ReduceArrays('mean',inDatas,out,weights=weights,clampFuzzy=True)
+
+    def _GetFuzzyThresholds(
+        self,
+        inFieldName,
+        trueThreshold,
+        falseThreshold,
+        outFileName,
+        rsltName
+        ):
+
+        # The thresholds CvtToFuzzy will use, with the min/max sentinel
+        # values replaced by the field's min/max
+
+        if falseThreshold == self.MinForFuzzyLimit:
+            falseThresh = self._GetFldMin(inFieldName)
+        elif falseThreshold == self.MaxForFuzzyLimit:
+            falseThresh = self._GetFldMax(inFieldName)
+        else:
+            falseThresh = falseThreshold
+
+        if trueThreshold == self.MinForFuzzyLimit:
+            trueThresh = self._GetFldMin(inFieldName)
+        elif trueThreshold == self.MaxForFuzzyLimit:
+            trueThresh = self._GetFldMax(inFieldName)
+        else:
+            trueThresh = trueThreshold
+
+        if trueThresh == falseThresh:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'CvtToFuzzy(): trueThresh cannot equal falseThresh.\n'+
+                '  trueThresh == falshThresh == *%f*'%trueThresh +
+                'Arguments to this method call were:\n'+
+                '  inFieldName:    %s\n'%inFieldName+
+                '  trueThreshold:  %f\n'%trueThreshold+
+                '  falseThreshold: %f\n'%falseThreshold+
+                '  outFileName:    %s\n'%outFileName+
+                '  rsltName:       %s\n\n'%rsltName+
+                'Note that this can happen when using default values for\n'+
+                'for true and false thresholds with an field that has a \n'+
+                'uniform value\n')
+
+        return trueThresh,falseThresh
+
+    # def _GetFuzzyThresholds(...)
+
+    def __FusedCmdArray(self,cmdNm,cmdParams,inDatas,fuzzyThreshs,out=None):
+
+        # Runs one command of RunFusedCmds() on arrays
+
+        if cmdNm == 'CVTTOFUZZY':
+            return self._CvtToFuzzyArray(inDatas[0],fuzzyThreshs[0],fuzzyThreshs[1],out)
+        elif cmdNm == 'CVTTOFUZZYCURVE':
+            return self._CvtToFuzzyCurveArray(inDatas[0],cmdParams['RawValues'],cmdParams['FuzzyValues'],out)
+        elif cmdNm == 'CVTTOFUZZYCAT':
+            return self._CvtToFuzzyCatArray(
+                inDatas[0],
+                cmdParams['RawValues'],
+                cmdParams['FuzzyValues'],
+                cmdParams['DefaultFuzzyValue'],
+                out=out)
+        elif cmdNm == 'NOT':
+            return self._FuzzyNotArray(inDatas[0],out)
+        elif cmdNm == 'UNION':
+            return self._FuzzyUnionArray(inDatas,out)
+        elif cmdNm == 'OR':
+            return self._FuzzyOrArray(inDatas,out)
+        elif cmdNm == 'AND':
+            return self._FuzzyAndArray(inDatas,out)
+        elif cmdNm == 'EMDSAND':
+            return self._FuzzyEMDSAndArray(inDatas,out)
+        elif cmdNm == 'WTDUNION':
+            return self._FuzzyWeightedUnionArray(inDatas,cmdParams['Weights'],out)
+        else:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Command *%s* cannot be fused.\n'%cmdNm)
+
+    # def __FusedCmdArray(self,cmdNm,cmdParams,inDatas,fuzzyThreshs,out=None):
+
+########################################################################
+# Public methods
+########################################################################
+
+    def GetFieldShape(self,inFileName,inFieldName):
+
+        ##### This method should be overridden by a method in the
+        ##### specific version of EEMS that supports tiled execution.
+
+        raise Exception(
+            '\n********************ERROR********************\n'+
+            'Tiled execution is not supported for this type of file.\n'+
+            '  File: %s\n'%inFileName)
+
+    # def GetFieldShape(self,inFileName,inFieldName):
+
+    def SetWindow(self,window):
+        # Restricts reading and writing to window, a tuple of (row slice,
+        # column slice) over the last two dimensions of the input fields,
+        # or None for the whole extent. The fields of the previous window
+        # are dropped.
+
+        self.window = window
+        with self.fldLock:
+            for fld in self.EEMSFlds.values():
+                self.__ReleaseBuffers(fld['data'])
+        self.EEMSFlds = {}
+        self.fldStatCache = {}
+        self.arrayShape = None
+        self.validMask = None
+        self.gridShape = None
+        self.validMaskSig = None
+        self.invalidMask = None
+        self.invalidMaskSig = None
+        self.readMasks = {}
+        self.scenarioFldNms = set()
+
+    # def SetWindow(self,window):
+
+    def SetDtype(self,dtype):
+        # Sets the type, float64 (the default) or float32, of the
+        # floating point fields read and computed. float32 halves the
+        # memory used, at the cost of precision.
+
+        if np.dtype(dtype) not in [np.dtype(np.float32),np.dtype(np.float64)]:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Field dtype must be either *float32* or *float64*.\n'+
+                '  Value was: *%s*\n'%dtype)
+
+        self.dtype = np.dtype(dtype)
+
+    # def SetDtype(self,dtype):
+
+    def SetBufferPool(self,TorF):
+        # Turns the buffer pool on or off. With it on, the buffers of
+        # removed fields (see RemoveField() and SetWindow()) are reused
+        # for new fields and temporaries, so a run works in a bounded
+        # set of buffers. A removed field's array must then not be used
+        # after it is removed.
+
+        self.useBufferPool = TorF
+        with self.fldLock:
+            self.freeBuffers = {}
+            self.freeBufferIds = set()
+            self.bufferFldCnts = {}
+
+    # def SetBufferPool(self,TorF):
+
+    def SetFuzzyFlds(self,fldNms):
+        # Fields known to be in fuzzy range, e.g. because of the command
+        # computing them (see EEMSProgram.IsFuzzyFld()). These are not
+        # checked when used in fuzzy operations.
+
+        self.fuzzyFldNms = set(fldNms)
+
+    # def SetFuzzyFlds(self,fldNms):
+
+    def SetReadSrcFlds(self,readSrcFldNms):
+        # The fields read that each field is computed from, by field
+        # (see EEMSProgram.GetReadSrcFldNms()). A field read is its own
+        # source. With shared masks, only the masks of fields read make
+        # up the shared mask, and a field's statistics are over the
+        # cells valid in all its sources (see _GetOwnMask()).
+
+        self.readSrcFldNms = dict(readSrcFldNms)
+
+    # def SetReadSrcFlds(self,readSrcFldNms):
+
+    def SetCompact(self,TorF):
+        # Turns compact fields on or off. With them on, CompactFlds()
+        # reduces the fields to a vector of the grid's valid cells (see
+        # _GetValidMask()) so that computation and memory scale with the
+        # cells that count rather than the whole grid. Fields are put
+        # back on the grid for writing (see _GetGridData()). Statistics
+        # such as a field's minimum are then over the valid cells only,
+        # unless set with SetFldStats(), as EEMSInterpreter does for the
+        # commands needing them from before the fields are compacted.
+
+        self.compact = TorF
+
+    # def SetCompact(self,TorF):
+
+    def SetSharedMask(self,TorF):
+        # Turns shared masks on or off. With them on, fields are plain
+        # arrays rather than masked arrays, and a cell masked in any
+        # field read is invalid in every field: one mask (invalidMask)
+        # stands for the masks of all of them, which saves a mask per
+        # field. Masked cells of floating point fields read hold NaN.
+        # Cells a computed field masks itself (e.g. results that are not
+        # finite) stay masked in that field alone. Statistics such as a
+        # field's minimum are still over the field's own valid cells
+        # (see SetReadSrcFlds()), and fields are written with the
+        # invalid cells masked (see _GetGridData()). Set this before
+        # any fields are added.
+
+        self.sharedMask = TorF
+
+    # def SetSharedMask(self,TorF):
+
+    def SetKernelBackend(self,backendNm):
+        # Sets how the per-cell loops of CVTTOFUZZYCURVE, SELECTEDUNION,
+        # XOR, EMDSAND, the weighted operators and the other reductions
+        # (see _ReduceArrays()) are run: 'numpy' (the default), with
+        # NumPy array operations, or 'numba', with the kernels of
+        # EEMSKernels, compiled by Numba and run in parallel. A kernel
+        # computes each cell in one pass, clamping and masking along the
+        # way, and gives the same values as NumPy. Fields the kernels
+        # cannot take (e.g. of mixed types) are still done with NumPy.
+
+        if backendNm == 'numpy':
+            self.kernels = None
+
+        elif backendNm == 'numba':
+            try:
+                import EEMSKernels
+            except ModuleNotFoundError as importError:
+                # only a missing numba; other import errors are raised
+                if importError.name != 'numba':
+                    raise
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Kernel backend *numba* requires the numba package, which could not be imported.\n')
+            self.kernels = EEMSKernels
+
+        else:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Kernel backend must be either *numpy* or *numba*.\n'+
+                '  Value was: *%s*\n'%backendNm)
+
+        self.kernelBackend = backendNm
+
+    # def SetKernelBackend(self,backendNm):
+
+    def SetBroadcastFlds(self,TorF):
+        # Turns broadcast fields on or off. With them on, a field need
+        # not match the other fields' shape, only broadcast (as NumPy
+        # arrays do) with it: e.g. a time-invariant (y,x) layer, or a
+        # per-row (y,1) attribute, used with (time,y,x) fields. The
+        # program's shape (arrayShape) is the shape all fields broadcast
+        # to. Fields are held at their own shape, and operators give
+        # results of the shape their inputs broadcast to, so a chain of
+        # commands on a static layer stays the size of the layer.
+        # Fields are written at the program's shape (see
+        # _GetGridData()). Statistics are those of the field as held,
+        # which, with shared masks, is seen at the program's shape.
+        # In a tiled run, fields are read whole along their length 1
+        # dimensions, so a (y,1) field is read as (rows of window,1).
+
+        self.broadcastFlds = TorF
+
+    # def SetBroadcastFlds(self,TorF):
+
+    def CompactFlds(self):
+        # Compacts the fields read so far, if compact fields are on and
+        # that has not been done already. Fields added later are
+        # compacted as they are added.
+
+        if not self.compact or self.validMask is not None or self.arrayShape is None:
+            return
+
+        validMask = self._GetValidMask()
+        if validMask is None:
+            return
+
+        with self.fldLock:
+            self.validMask = validMask
+            self.gridShape = self.arrayShape
+            self.arrayShape = (int(validMask.sum()),)
+            self.validMaskSig = hashlib.sha1(np.packbits(validMask).tobytes()).hexdigest()
+
+            for fldNm,fld in self.EEMSFlds.items():
+                # Broadcast fields are compacted at the grid's shape
+                if fldNm in self.scenarioFldNms:
+                    fldShape = fld['data'].shape[:1] + self.gridShape
+                else:
+                    fldShape = self.gridShape
+                compactData = self._CompactArray(self._BroadcastArray(fld['data'],fldShape))
+                self.__ReleaseBuffers(fld['data'])
+                fld['data'] = compactData
+
+            # The compacted cells are the valid ones
+            self.invalidMask = None
+            self.invalidMaskSig = None
+            self.readMasks = {}
+
+            # Statistics are now over the valid cells
+            self.fldStatCache = {}
+
+    # def CompactFlds(self):
+
+    def SetFldStats(self,fldNm,stats):
+        # Statistics of a field over the whole extent (min, max, and
+        # for MeanToMid the means). These are used in place of the
+        # statistics of the data at hand when the data is just a window.
+
+        self.fldStats[fldNm] = stats
+
+    # def SetFldStats(self,fldNm,stats):
+
+    def Read(
+        self,
+        inFileName,
+        inFieldName,
+        outFileName,
+        newFieldName
+        ):
+        if newFieldName != 'NONE':
+            newFieldName = [newFieldName]
+
+        self.ReadMulti(inFileName,[inFieldName],outFileName,newFieldName)
+    # def Read(
+
+    def ReadMulti(
+        self,
+        inFileName,
+        inFieldNames,
+        outFileName,
+        newFieldName
+        ):
+
+        ##### This method should be overridden by a method in the
+        ##### specific version of EEMS.
+
+        pass
+
+        # Confirm all inFieldNames in input file
+            
+        # determine inFieldNames col ndxs in input file
+
+        # Add fields to EEMSFlds
+
+    # def ReadMulti(...)
+                                            
+    def CvtToFuzzy(
+        self,
+        inFieldName,
+        trueThreshold,
+        falseThreshold,
+        outFileName,
+        rsltName
+        ):
+
+        trueThresh,falseThresh = self._GetFuzzyThresholds(
+            inFieldName,
+            trueThreshold,
+            falseThreshold,
+            outFileName,
+            rsltName
+            )
+
+        newData = self._CvtToFuzzyArray(self.EEMSFlds[inFieldName]['data'],trueThresh,falseThresh)
+
+        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
+
+    # def CvtToFuzzy(...)
+
+    def CvtToFuzzyCurve(
+        self,
+        inFieldName,
+        rawValues,
+        fuzzyValues,
+        outFileName,
+        rsltName
+        ):
+
+        # have to go in segments and apply linear to segment.
+        # beyond x vals gets boundary y val
+
+        newData = self._CvtToFuzzyCurveArray(self.EEMSFlds[inFieldName]['data'],rawValues,fuzzyValues)
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1780,20 +3149,15 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = np.ma.zeros(self.EEMSFlds[inFieldName]['data'].shape)
-        newData[:] = np.ma.where(
-            self.EEMSFlds[inFieldName]['data'] != self.EEMSFlds[inFieldName]['data'], # nan check
-            float('nan'),
-            defaultFuzzyValue
-            )
+        inData = self.EEMSFlds[inFieldName]['data']
 
-        for ndx in range(len(rawValues)):
-            newData = np.ma.where(
-                self.EEMSFlds[inFieldName]['data'] == rawValues[ndx], 
-                fuzzyValues[ndx],
-                newData)
+        # integer fields can be looked up directly by value over their range
+        if inData.dtype.kind in 'iu':
+            inRange = (self._GetFldMin(inFieldName),self._GetFldMax(inFieldName))
+        else:
+            inRange = None
 
-        # for ndx in range(len(rawValues)):
+        newData = self._CvtToFuzzyCatArray(inData,rawValues,fuzzyValues,defaultFuzzyValue,inRange)
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1805,7 +3169,10 @@ class EEMSCmdRunnerBase(object):
         outFileName,
         rsltName
         ):
-        self._AddFieldToEEMSFlds(outFileName,rsltName,self.EEMSFlds[inFieldName]['data'].copy())
+        inData = self.EEMSFlds[inFieldName]['data']
+        newData = self._GetMaskedBuffer(inData.shape,self._GetFldDtype(inData.dtype))
+        self._CopyArrayInto(newData,inData)
+        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def CopyField(...)
 
@@ -1817,8 +3184,17 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = (self.EEMSFlds[startingFieldName]['data'].copy() - 
-                   self.EEMSFlds[toSubtractFieldName]['data'].copy())
+        startingData = self.EEMSFlds[startingFieldName]['data']
+        toSubtractData = self.EEMSFlds[toSubtractFieldName]['data']
+
+        newData = self._GetMaskedBuffer(
+            self._GetBroadcastShape([startingData,toSubtractData]),
+            self._GetFldDtype(np.result_type(startingData,toSubtractData))
+            )
+        np.subtract(np.ma.getdata(startingData),np.ma.getdata(toSubtractData),out=np.ma.getdata(newData))
+        self._CopyMaskInto(newData,startingData)
+        self._OrMaskInto(newData,toSubtractData)
+
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def DifFlds(...)
@@ -1830,9 +3206,9 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
         
-        newData = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        for ndx in range(1,len(inFieldNames)):
-            newData = np.ma.minimum(newData,self.EEMSFlds[inFieldNames[ndx]]['data'])
+        inDatas = [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames]
+
+        newData = self._ReduceArrays('min',inDatas,dtype=self._GetFldDtype(np.result_type(*inDatas)))
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1845,9 +3221,9 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        for ndx in range(1,len(inFieldNames)):
-            newData = np.ma.maximum(newData,self.EEMSFlds[inFieldNames[ndx]]['data'])
+        inDatas = [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames]
+
+        newData = self._ReduceArrays('max',inDatas,dtype=self._GetFldDtype(np.result_type(*inDatas)))
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1860,9 +3236,7 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = np.ma.zeros(self.arrayShape)
-        for inFldNm in inFieldNames:
-            newData += self.EEMSFlds[inFldNm]['data']
+        newData = self._ReduceArrays('sum',[self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def SumFlds(...)
@@ -1874,10 +3248,7 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = np.ma.zeros(self.arrayShape)
-        for inFldNm in inFieldNames:
-            newData += self.EEMSFlds[inFldNm]['data']
-        newData /= len(inFieldNames)
+        newData = self._ReduceArrays('mean',[self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def MeanFlds(...)
@@ -1892,11 +3263,7 @@ class EEMSCmdRunnerBase(object):
         ):
 
         self._VerifyFuzzyField(inFieldName)
-        newData = -1.0*(self.EEMSFlds[inFieldName]['data'].copy())
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyNotArray(self.EEMSFlds[inFieldName]['data'])
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1912,14 +3279,7 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        newData = np.ma.zeros(self.arrayShape)
-        for inFldNm in inFieldNames:
-            newData += self.EEMSFlds[inFldNm]['data']
-        newData /= float(len(inFieldNames))
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyUnionArray([self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1935,13 +3295,7 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        newData = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        for ndx in range(1,len(inFieldNames)):
-            newData = np.ma.maximum(newData,self.EEMSFlds[inFieldNames[ndx]]['data'])
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyOrArray([self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1957,13 +3311,7 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        newData = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        for ndx in range(1,len(inFieldNames)):
-            newData = np.ma.minimum(newData,self.EEMSFlds[inFieldNames[ndx]]['data'])
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyAndArray([self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -1979,20 +3327,7 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        minVals = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        meanVals = self.EEMSFlds[inFieldNames[0]]['data'].copy()
- 
-        for ndx in range(1,len(inFieldNames)):
-            minVals = np.ma.minimum(minVals,self.EEMSFlds[inFieldNames[ndx]]['data'])
-            meanVals += self.EEMSFlds[inFieldNames[ndx]]['data']
-
-        meanVals /= len(inFieldNames)
-
-        newData = minVals + (meanVals - minVals) * (minVals + 1) / 2
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyEMDSAndArray([self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -2026,21 +3361,16 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        newData = np.ma.zeros(self.arrayShape)
-
-        for ndx in range(len(inFieldNames)):
-            newData += self.EEMSFlds[inFieldNames[ndx]]['data'] * weights[ndx]
-        newData /= sum(weights)
-
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+        newData = self._FuzzyWeightedUnionArray(
+            [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames],
+            weights
+            )
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def FuzzyWeightedUnion(...)
 
-    def FuzzyEMDSWeighteddAnd(
+    def FuzzyEMDSWeightedAnd(
         self,
         inFieldNames,
         weights,
@@ -2051,24 +3381,33 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        minVals = self.EEMSFlds[inFieldNames[0]]['data'].copy()
-        meanVals = self.EEMSFlds[inFieldNames[0]]['data'].copy() * weights[0]
- 
-        for ndx in range(1,len(inFieldNames)):
-            minVals = np.ma.minimum(minVals,self.EEMSFlds[inFieldNames[ndx]]['data'])
-            meanVals += self.EEMSFlds[inFieldNames[ndx]]['data'] * weights[ndx]
+        newData = self._FuzzyEMDSAndArray(
+            [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames],
+            weights=weights
+            )
 
-        meanVals /= sum(weights)
+        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
-        newData = minVals + (meanVals - minVals) * (minVals + 1) / 2
+    # def FuzzyEMDSWeightedAnd(...)
 
-        # insure that rounding errors don't accumulate
-        newData = np.ma.where(newData > 1.0, 1.0, newData)
-        newData = np.ma.where(newData < -1.0, -1.0, newData)
+    def FuzzyEMDSWeighteddAnd(
+        self,
+        inFieldNames,
+        weights,
+        outFileName,
+        rsltName
+        ):
 
-        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
+        # Misspelled name kept for callers of the old name
 
-    # def FuzzyEMDSWeightedAnd(...)
+        self.FuzzyEMDSWeightedAnd(
+            inFieldNames,
+            weights,
+            outFileName,
+            rsltName
+            )
+
+    # def FuzzyEMDSWeighteddAnd(...)
     
     def WeightedMean(
         self,
@@ -2078,11 +3417,11 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = np.ma.zeros(self.arrayShape)
-
-        for ndx in range(len(inFieldNames)):
-            newData += self.EEMSFlds[inFieldNames[ndx]]['data'] * weights[ndx]
-        newData /= sum(weights)
+        newData = self._ReduceArrays(
+            'mean',
+            [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames],
+            weights=weights
+            )
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -2096,15 +3435,42 @@ class EEMSCmdRunnerBase(object):
         rsltName
         ):
 
-        newData = np.ma.zeros(self.arrayShape)
-
-        for ndx in range(len(inFieldNames)):
-            newData += self.EEMSFlds[inFieldNames[ndx]]['data'] * weights[ndx]
+        newData = self._ReduceArrays(
+            'sum',
+            [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames],
+            weights=weights
+            )
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
     # def WeightedSum(...)
 
+    def _GetSelectedArrays(self,inFieldNames,selectNdxs):
+        # The values at sorted positions selectNdxs (in increasing order)
+        # of the stacked input fields, as a stack of masked arrays, as if
+        # the whole stack had been sorted along its first axis. As with
+        # np.ma sorting, masked values sort after all others (but before
+        # NaNs). The stack is only partitioned around the ends of
+        # selectNdxs, and only the selected values are then sorted.
+
+        stackShape = (len(inFieldNames),) + self._GetBroadcastShape(
+            [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames])
+        stackedArrs = self._GetBuffer(stackShape,self.dtype)
+        for ndx in range(len(inFieldNames)):
+            inData = self.EEMSFlds[inFieldNames[ndx]]['data']
+            np.copyto(stackedArrs[ndx],np.ma.getdata(inData))
+            inMask = np.ma.getmask(inData)
+            if inMask is not np.ma.nomask:
+                np.copyto(stackedArrs[ndx],np.inf,where=inMask)
+
+        stackedArrs.partition(sorted(set([selectNdxs[0],selectNdxs[-1]])),axis=0)
+        selectedArrs = np.sort(stackedArrs[selectNdxs[0]:selectNdxs[-1]+1],axis=0)
+        self._ReleaseBuffer(stackedArrs)
+
+        return np.ma.masked_array(selectedArrs,mask=np.isposinf(selectedArrs))
+
+    # def _GetSelectedArrays(self,inFieldNames,selectNdxs):
+
     def FuzzySelectedUnion(
         self,
         inFieldNames,
@@ -2121,13 +3487,12 @@ class EEMSCmdRunnerBase(object):
         if len(inFieldNames) == 1:
             self.CopyField(inFieldNames[0],outFileName,rsltName)
         else:
-            
-            # combine and sort data for inFieldNames
-            exec('stackedArrs = np.ma.concatenate(([self.EEMSFlds[\''+ \
-                '\'][\'data\']],[self.EEMSFlds[\''.join(inFieldNames)+ \
-                '\'][\'data\']]))')
 
-            stackedArrs.sort(axis=0, kind='heapsort')
+            if numberToConsider < 1 or numberToConsider > len(inFieldNames):
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Selected Union numberToConsider must be from 1 to the number of inFieldNames.\n'+
+                    '  Value was: *%s*, number of inFieldNames: %d\n'%(numberToConsider,len(inFieldNames)))
 
             # range to consider
             if re.match(r'^[Tt][Rr][Uu][Ee][Ss][Tt]$',truestOrFalsest):
@@ -2142,12 +3507,24 @@ class EEMSCmdRunnerBase(object):
                     'Selected Union truestOrFalsest must be either *Truest* or *Falsest*.\n'+
                     '  Value was: *%s*\n'%truestOrFalsest)
 
-            newData = stackedArrs[myRange].mean(axis=0)
-            del(stackedArrs)
+            inDatas = [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames]
+            kernelArrs = self._GetKernelArrays(inDatas,self.dtype)
+            if kernelArrs is not None:
+                newData = self._GetMaskedBuffer(self._GetBroadcastShape(inDatas))
+                outArrs = self._GetKernelArrays([newData])
+                self.kernels.SelectedMean(
+                    kernelArrs[0],
+                    kernelArrs[1],
+                    myRange[0],
+                    myRange[-1],
+                    outArrs[0][0],
+                    outArrs[1][0]
+                    )
+            else:
+                newData = self._GetSelectedArrays(inFieldNames,myRange).mean(axis=0)
 
-            # insure that rounding errors don't accumulate
-            newData = np.ma.where(newData > 1.0, 1.0, newData)
-            newData = np.ma.where(newData < -1.0, -1.0, newData)
+                # insure that rounding errors don't accumulate
+                newData = self._ClampFuzzyArray(newData)
 
             self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -2176,20 +3553,26 @@ class EEMSCmdRunnerBase(object):
         for inFldNm in inFieldNames:
             self._VerifyFuzzyField(inFldNm)
 
-        # combine and sort data for inFieldNames
-        exec('stackedArrs = np.ma.concatenate(([self.EEMSFlds[\''+ '\'][\'data\']],[self.EEMSFlds[\''.join(inFieldNames)+'\'][\'data\']]))')
+        inDatas = [self.EEMSFlds[inFldNm]['data'] for inFldNm in inFieldNames]
+        kernelArrs = self._GetKernelArrays(inDatas,self.dtype)
+        if kernelArrs is not None:
+            newData = self._GetMaskedBuffer(self._GetBroadcastShape(inDatas))
+            outArrs = self._GetKernelArrays([newData])
+            self.kernels.XOr(kernelArrs[0],kernelArrs[1],outArrs[0][0],outArrs[1][0])
+            self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
+            return
 
-        stackedArrs.sort(axis=0, kind='heapsort')
+        truestArrs = self._GetSelectedArrays(inFieldNames,[len(inFieldNames)-2,len(inFieldNames)-1])
 
         newData = np.ma.where(
-            stackedArrs[-1] != -1,
-            stackedArrs[-1] - \
-                (stackedArrs[-1] - stackedArrs[-2]) * \
-                (stackedArrs[-2] - -1) / \
-                (stackedArrs[-1] - -1),
+            truestArrs[-1] != -1,
+            truestArrs[-1] - \
+                (truestArrs[-1] - truestArrs[-2]) * \
+                (truestArrs[-2] - -1) / \
+                (truestArrs[-1] - -1),
             -1)
 
-        del(stackedArrs)
+        del(truestArrs)
 
         # insure that rounding errors don't accumulate
         newData = np.ma.where(newData > 1.0, 1.0, newData)
@@ -2209,10 +3592,18 @@ class EEMSCmdRunnerBase(object):
             rsltName
             ):
 
-        minValue=np.amin(self.EEMSFlds[inFieldName]['data'])
-        maxValue=np.amax(self.EEMSFlds[inFieldName]['data'])
+        minValue=self._GetFldMin(inFieldName)
+        maxValue=self._GetFldMax(inFieldName)
 
-        newData = (self.EEMSFlds[inFieldName]['data'] - minValue) / (maxValue - minValue)
+        inData = self.EEMSFlds[inFieldName]['data']
+        newData = self._GetMaskedBuffer(inData.shape)
+        self._CopyArrayInto(newData,inData)
+        np.subtract(np.ma.getdata(newData),minValue,out=np.ma.getdata(newData))
+        with np.errstate(divide='ignore',invalid='ignore'):
+            np.divide(np.ma.getdata(newData),maxValue - minValue,out=np.ma.getdata(newData))
+
+        # np.ma division masks the results that are not finite
+        self._MaskCellsInto(newData,~np.isfinite(np.ma.getdata(newData)))
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -2226,10 +3617,18 @@ class EEMSCmdRunnerBase(object):
             rsltName
             ):
 
-        minValue=np.amin(self.EEMSFlds[inFieldName]['data'])
-        maxValue=np.amax(self.EEMSFlds[inFieldName]['data'])
+        minValue=self._GetFldMin(inFieldName)
+        maxValue=self._GetFldMax(inFieldName)
+
+        inData = self.EEMSFlds[inFieldName]['data']
+        newData = self._GetMaskedBuffer(inData.shape)
+        self._CopyArrayInto(newData,inData)
+        np.subtract(maxValue,np.ma.getdata(newData),out=np.ma.getdata(newData))
+        with np.errstate(divide='ignore',invalid='ignore'):
+            np.divide(np.ma.getdata(newData),maxValue - minValue,out=np.ma.getdata(newData))
 
-        newData = (maxValue - self.EEMSFlds[inFieldName]['data']) / (maxValue - minValue)
+        # np.ma division masks the results that are not finite
+        self._MaskCellsInto(newData,~np.isfinite(np.ma.getdata(newData)))
 
         self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
 
@@ -2248,46 +3647,250 @@ class EEMSCmdRunnerBase(object):
         #Step 1: Calculate the RawValues to pass in to the CvtToFuzzyCurve method.
         #RawValues needed: lowValue, lowMeanValue, meanValue, highMeanValue, highValue.
 
-        lowValue=np.amin(self.EEMSFlds[inFieldName]['data'])
-        highValue=np.amax(self.EEMSFlds[inFieldName]['data'])
+        lowValue=self._GetFldMin(inFieldName)
+        highValue=self._GetFldMax(inFieldName)
+
+        #In a tiled run the means come from the statistics over the whole extent.
+        if inFieldName in self.fldStats:
+            fldStats=self.fldStats[inFieldName]
+            if ignoreZeros:
+                meanValues=[fldStats['nonZeroLowMean'],fldStats['nonZeroMean'],fldStats['nonZeroHighMean']]
+            else:
+                meanValues=[fldStats['lowMean'],fldStats['mean'],fldStats['highMean']]
+            self.CvtToFuzzyCurve(inFieldName, [lowValue]+meanValues+[highValue],fuzzyValues,outFileName,rsltName)
+            return
+
+        inData=self._GetFldView(inFieldName)
 
-        #If the ignoreZeros flag is enabled, create an array from the input data without 0's for computing the 3 means.
+        #If the ignoreZeros flag is enabled, cells with the value 0 are left out of the 3 means.
+        #Masked cells are always left out.
 #        if (ignoreZeros=='1' or re.match(r'^[Tt][Rr][Uu][Ee]$',ignoreZeros)):
-        if ignoreZeros:
-            arrayToUse=np.delete(self.EEMSFlds[inFieldName]['data'],0)
         #If the ignoreZeros flag is disabled, use the full range of input values for computing the 3 means.
+        #The means are summed a block at a time, as in a tiled run (see _AddMeanToMidStats()).
+        if ignoreZeros:
+            prefix='nonZero'
         else:
-            arrayToUse=self.EEMSFlds[inFieldName]['data']
+            prefix=''
+        mtmStats={}
+        for inBlock in self._GetFlatBlocks(inData):
+            self._AddMeanToMidStats(mtmStats,inBlock,[prefix])
+        meanValue=self._GetMeanToMidMeans(mtmStats).get(prefix+'Mean' if prefix else 'mean',np.nan)
+
+        #Sum the values above the mean, and the values below the mean, one block at a time.
+        #These sums will be used for calculating the highMeanValue and the lowMeanValue.
+        mtmStats={}
+        for inBlock in self._GetFlatBlocks(inData):
+            self._AddMeanToMidStats(mtmStats,inBlock,[prefix],{prefix:meanValue})
+        meanValues=self._GetMeanToMidMeans(mtmStats)
 
-        meanValue=np.mean(arrayToUse)
+        #Calculate the mean of all values above the mean.
+        highMeanValue=meanValues.get(prefix+'HighMean' if prefix else 'highMean',np.nan)
 
-        belowMeanList=[]
-        aboveMeanList=[]
+        #Calculate the mean of all values below the mean.
+        lowMeanValue=meanValues.get(prefix+'LowMean' if prefix else 'lowMean',np.nan)
 
-        #Build a list of all values above the mean, and all values below the mean.
-        #These values will be used for calculating the highMeanValue and the lowMeanValue.
-        for value in arrayToUse:
+        #Step 2: Call the CvtToFuzzyCurve method to perform the interpolation.
+        self.CvtToFuzzyCurve(inFieldName, [lowValue, lowMeanValue, meanValue, highMeanValue, highValue],fuzzyValues,outFileName,rsltName)
 
-            if value > meanValue:
-                aboveMeanList.append(value)
+    # def MeanToMid(...)
 
+    def _GetFlatBlocks(self,inData,blockCellCnt=1048576):
+        # inData, flattened, as a sequence of blocks of at most
+        # blockCellCnt cells, so that reductions over it only need
+        # temporaries the size of a block. An array that cannot be
+        # flattened without a copy (e.g. a broadcast field seen at the
+        # program's shape) is flattened a block of rows at a time.
+        inArrs = [np.ma.getdata(inData),np.ma.getmask(inData)]
+        if inData.ndim < 2 or all([arr is np.ma.nomask or arr.flags.c_contiguous for arr in inArrs]):
+            flatData = inData.reshape(-1)
+            return [flatData[blockStart:blockStart+blockCellCnt]
+                    for blockStart in range(0,flatData.shape[0],blockCellCnt)]
+        blockRowCnt = max(1,blockCellCnt // max(1,int(np.prod(inData.shape[1:]))))
+        return (inData[startRow:startRow+blockRowCnt].reshape(-1)
+                for startRow in range(0,inData.shape[0],blockRowCnt))
+    # def _GetFlatBlocks(self,inData,blockCellCnt=1048576):
+
+    def _AddMeanToMidStats(self,mtmStats,inData,prefixes,meanVals=None):
+
+        # Adds the unmasked cells of inData, a block or window of a
+        # field, to the running MEANTOMID statistics in mtmStats, a dict
+        # of [count,sum] by (prefix,side). With prefix '' every value
+        # counts, with prefix 'nonZero' only those that are not 0.
+        # Without meanVals, the values themselves are summed (side '').
+        # With meanVals, the mean for each prefix, those above the mean
+        # (side 'High') and the others (side 'Low') are summed. Values
+        # are summed in float64, so that sums over blocks or windows
+        # differ from one over the whole field only by rounding.
+
+        vals = np.ma.getdata(inData)
+        validMask = ~np.ma.getmaskarray(inData)
+
+        for prefix in prefixes:
+            if prefix == 'nonZero':
+                prefixMask = validMask & (vals != 0)
             else:
-                belowMeanList.append(value)
+                prefixMask = validMask
+
+            if meanVals is None:
+                sideMasks = [('',prefixMask)]
+            elif prefix in meanVals:
+                sideMasks = [
+                    ('Low',prefixMask & (vals <= meanVals[prefix])),
+                    ('High',prefixMask & (vals > meanVals[prefix]))
+                    ]
+            else:
+                continue
 
-        #Convert the lists created above to numpy arrays in order to easily calculate the means.
-        aboveMeanArray=np.asarray(aboveMeanList)
-        belowMeanArray=np.asarray(belowMeanList)
+            for side,sideMask in sideMasks:
+                sideStats = mtmStats.setdefault((prefix,side),[0,0.0])
+                sideStats[0] += int(np.count_nonzero(sideMask))
+                sideStats[1] += float(np.sum(vals[sideMask],dtype=np.float64))
+
+    # def _AddMeanToMidStats(self,mtmStats,inData,prefixes,meanVals=None):
+
+    def _GetMeanToMidMeans(self,mtmStats):
+        # The means from statistics summed by _AddMeanToMidStats(), by
+        # name, e.g. 'mean', 'nonZeroMean', 'lowMean', 'nonZeroHighMean'.
+        # Means with no values are left out.
+        meanVals = {}
+        for (prefix,side),(cnt,valSum) in mtmStats.items():
+            if cnt > 0:
+                meanNm = prefix+side+'Mean'
+                meanVals[meanNm[0].lower()+meanNm[1:]] = valSum / cnt
+        return meanVals
+    # def _GetMeanToMidMeans(self,mtmStats):
+
+    def RunFusedCmds(self,fusedCmds,blockCellCnt):
+
+        # Runs a chain of elementwise fuzzy commands in one pass over
+        # blocks of about blockCellCnt cells. fusedCmds is a list of
+        # (command name, command parameters, result name) in dependency
+        # order. Only the field of the last command is kept; the others
+        # exist one block at a time. Results are the same as running the
+        # commands one at a time. With broadcast fields, the chain is
+        # run at the shape its inputs broadcast to (the program's shape,
+        # with shared masks, so that the masks of the fields read can be
+        # taken a block at a time).
+
+        fusedFldNms = [rsltNm for cmdNm,cmdParams,rsltNm in fusedCmds]
+        outFileName,rsltName = fusedCmds[-1][1]['OutFileName'],fusedCmds[-1][2]
+
+        # Fields from outside the chain are checked, and thresholds
+        # found, before the pass.
+        cmdInFldNms = []
+        cmdFuzzyThreshs = []
+        for cmdNm,cmdParams,cmdRsltNm in fusedCmds:
+
+            if 'InFieldName' in cmdParams:
+                inFldNms = [cmdParams['InFieldName']]
+            else:
+                inFldNms = cmdParams['InFieldNames']
+            cmdInFldNms.append(inFldNms)
 
-        #Calculate the mean of all values above the mean.
-        highMeanValue=np.mean(aboveMeanArray)
+            if cmdNm == 'CVTTOFUZZY':
+                cmdFuzzyThreshs.append(self._GetFuzzyThresholds(
+                    cmdParams['InFieldName'],
+                    cmdParams['TrueThreshold'],
+                    cmdParams['FalseThreshold'],
+                    cmdParams['OutFileName'],
+                    cmdRsltNm
+                    ))
+            else:
+                cmdFuzzyThreshs.append(None)
 
-        #Calculate the mean of all values below the mean.
-        lowMeanValue=np.mean(belowMeanArray)
+            # the conversions take any numeric field
+            if cmdNm not in ['CVTTOFUZZY','CVTTOFUZZYCURVE','CVTTOFUZZYCAT']:
+                for inFldNm in inFldNms:
+                    if inFldNm not in fusedFldNms:
+                        self._VerifyFuzzyField(inFldNm)
 
-        #Step 2: Call the CvtToFuzzyCurve method to perform the interpolation.
-        self.CvtToFuzzyCurve(inFieldName, [lowValue, lowMeanValue, meanValue, highMeanValue, highValue],fuzzyValues,outFileName,rsltName)
+        # for cmdNm,cmdParams,cmdRsltNm in fusedCmds:
 
-    # def MeanToMid(...)
+        if self.sharedMask:
+            chainShape = self.arrayShape
+        else:
+            chainShape = self._GetBroadcastShape([self.EEMSFlds[inFldNm]['data']
+                for inFldNms in cmdInFldNms for inFldNm in inFldNms if inFldNm not in fusedFldNms])
+        chainInDatas = {} # fields from outside the chain, at chainShape
+        for inFldNms in cmdInFldNms:
+            for inFldNm in inFldNms:
+                if inFldNm not in fusedFldNms:
+                    chainInDatas[inFldNm] = self._BroadcastArray(self.EEMSFlds[inFldNm]['data'],chainShape)
+
+        blockRowCnt = max(1,blockCellCnt // max(1,int(np.prod(chainShape[1:]))))
+
+        fldRanges = {} # range of the fields within the chain
+        newData = self._GetMaskedBuffer(chainShape)
+        for startRow in range(0,chainShape[0],blockRowCnt):
+            block = slice(startRow,startRow + blockRowCnt)
+
+            blockFlds = {}
+            for cmdNdx in range(len(fusedCmds)):
+                cmdNm,cmdParams,cmdRsltNm = fusedCmds[cmdNdx]
+
+                inDatas = []
+                for inFldNm in cmdInFldNms[cmdNdx]:
+                    if inFldNm in blockFlds:
+                        inDatas.append(blockFlds[inFldNm])
+                    else:
+                        inDatas.append(chainInDatas[inFldNm][block])
+
+                # The last command writes straight into the result
+                if cmdRsltNm == rsltName:
+                    out = newData[block]
+                else:
+                    out = None
+
+                blockFlds[cmdRsltNm] = self.__FusedCmdArray(
+                    cmdNm,
+                    cmdParams,
+                    inDatas,
+                    cmdFuzzyThreshs[cmdNdx],
+                    out
+                    )
+
+                # Ranges are needed to check the fields within the
+                # chain, and are kept for the result.
+                # np.minimum()/np.maximum() carry NaNs through, as
+                # min()/max() of the whole field would
+                if cmdRsltNm != rsltName and cmdRsltNm in self.fuzzyFldNms:
+                    continue
+                blockData = blockFlds[cmdRsltNm]
+                if self.sharedMask:
+                    blockData = np.ma.masked_array(
+                        np.ma.getdata(blockData),
+                        mask=self._GetOwnMask(cmdRsltNm,blockData,block),
+                        copy=False)
+                blockMin = blockData.min()
+                if blockMin is not np.ma.masked:
+                    blockMax = blockData.max()
+                    if cmdRsltNm in fldRanges:
+                        blockMin = np.minimum(blockMin,fldRanges[cmdRsltNm][0])
+                        blockMax = np.maximum(blockMax,fldRanges[cmdRsltNm][1])
+                    fldRanges[cmdRsltNm] = (blockMin,blockMax)
+
+            # for cmdNdx in range(len(fusedCmds)):
+
+            for blockFldNm in fusedFldNms[:-1]:
+                self._ReleaseBuffer(blockFlds[blockFldNm])
+
+        # for startRow in range(0,chainShape[0],blockRowCnt):
+
+        for fldNm in fusedFldNms[:-1]:
+            if fldNm in fldRanges:
+                self._VerifyFuzzyRange(fldNm,fldRanges[fldNm][0],fldRanges[fldNm][1])
+
+        self._AddFieldToEEMSFlds(outFileName,rsltName,newData)
+
+        # The range of the result was found along the way
+        if rsltName in fldRanges:
+            self._SetFldStat(rsltName,'min',fldRanges[rsltName][0])
+            self._SetFldStat(rsltName,'max',fldRanges[rsltName][1])
+        else:
+            self._SetFldStat(rsltName,'min',np.ma.masked)
+            self._SetFldStat(rsltName,'max',np.ma.masked)
+
+    # def RunFusedCmds(self,fusedCmds,blockCellCnt):
 
     def CallExtern(self):
         raise Exception(
@@ -2297,6 +3900,35 @@ class EEMSCmdRunnerBase(object):
 
     # def CallExtern(self):
 
+    def RemoveField(self,fldNm):
+        # Drops a field that is no longer needed, freeing its memory
+        with self.fldLock:
+            self.__ReleaseBuffers(self.EEMSFlds.pop(fldNm)['data'])
+            self.fldStatCache.pop(fldNm,None)
+            self.scenarioFldNms.discard(fldNm)
+
+    # def RemoveField(self,fldNm):
+
+    def SplitScenarioFlds(self,scenarioNms):
+        # Replaces each scenario field bound for an output file with
+        # one field per scenario, named <field>_<scenario>, so that
+        # they can be written like any other field.
+
+        for fldNm in sorted(self.scenarioFldNms):
+            fld = self.EEMSFlds[fldNm]
+            if fld['outFNm'] == 'NONE':
+                continue
+
+            self.RemoveField(fldNm)
+            for scenarioNdx in range(len(scenarioNms)):
+                self._AddFieldToEEMSFlds(
+                    fld['outFNm'],
+                    '%s_%s'%(fldNm,scenarioNms[scenarioNdx]),
+                    fld['data'][scenarioNdx]
+                    )
+
+    # def SplitScenarioFlds(self,scenarioNms):
+
     def Finish(self):
         # self._WriteFldsToFiles()
         pass
@@ -2311,6 +3943,235 @@ class EEMSCmdRunnerBase(object):
 # class EEMSCmdRunnerBase(object):
 ######################################################################
 
+######################################################################
+# EEMSBufferCmdRunner class
+######################################################################
+# A cmdRunner whose input and output fields are memory-mapped buffer
+# files covering the whole extent. Reading and writing are of the
+# current window (see EEMSCmdRunnerBase.SetWindow()).
+#
+# This is used by EEMSInterpreter to spread the windows of a tiled run
+# over worker processes. The parent process stages the input fields in
+# buffers, each worker attaches to the same buffers, and the workers'
+# output windows land in shared output buffers, so no field data is
+# pickled between processes.
+#
+# Buffers are described by dictionaries (file names, dtype and shape)
+# that are cheap to hand to another process.
+#
+# Revision History
+#
+# 2026.10.16
+#
+# Written for multi-process tiled execution.
+#
+######################################################################
+
+class EEMSBufferCmdRunner(EEMSCmdRunnerBase):
+
+    def __init__(self,bufferDir,inBuffers=None,outBuffers=None):
+        super(EEMSBufferCmdRunner,self).__init__()
+        self.bufferDir = bufferDir # directory holding the buffer files
+        self.inBuffers = {} # buffer descriptions by field name
+        self.outBuffers = {}
+        if inBuffers is not None:
+            self.inBuffers.update(inBuffers)
+        if outBuffers is not None:
+            self.outBuffers.update(outBuffers)
+    # def __init__(self,bufferDir,inBuffers=None,outBuffers=None):
+
+    def __CreateBuffer(self,fldNm,outFNm,fldData,rowCnt,colCnt):
+        # Buffer covering the whole extent for fields like fldData, a
+        # window of the field
+
+        bufferNm = os.path.join(self.bufferDir,'%s_%d'%(fldNm,len(self.inBuffers)+len(self.outBuffers)))
+        buffer = {
+            'outFNm':outFNm,
+            'dataFNm':bufferNm+'.data',
+            'maskFNm':bufferNm+'.mask',
+            'dtype':fldData.dtype.str,
+            'shape':tuple(fldData.shape[:-2])+(rowCnt,colCnt)
+            }
+
+        np.memmap(buffer['dataFNm'],dtype=buffer['dtype'],mode='w+',shape=buffer['shape']).flush()
+        np.memmap(buffer['maskFNm'],dtype=bool,mode='w+',shape=buffer['shape']).flush()
+
+        return buffer
+
+    # def __CreateBuffer(self,fldNm,outFNm,fldData,rowCnt,colCnt):
+
+    def __GetWindowNdx(self,buffer):
+        return (slice(None),) * (len(buffer['shape']) - 2) + tuple(self.window)
+
+    def _ReadBufferWindow(self,buffer):
+        # The current window of a buffer, as a masked array
+        dataMap = np.memmap(buffer['dataFNm'],dtype=buffer['dtype'],mode='r',shape=buffer['shape'])
+        maskMap = np.memmap(buffer['maskFNm'],dtype=bool,mode='r',shape=buffer['shape'])
+        ndx = self.__GetWindowNdx(buffer)
+
+        return np.ma.masked_array(np.array(dataMap[ndx]),mask=np.array(maskMap[ndx]))
+
+    # def _ReadBufferWindow(self,buffer):
+
+    def _WriteBufferWindow(self,buffer,fldData):
+        dataMap = np.memmap(buffer['dataFNm'],dtype=buffer['dtype'],mode='r+',shape=buffer['shape'])
+        maskMap = np.memmap(buffer['maskFNm'],dtype=bool,mode='r+',shape=buffer['shape'])
+        ndx = self.__GetWindowNdx(buffer)
+
+        dataMap[ndx] = np.ma.getdata(fldData)
+        maskMap[ndx] = np.ma.getmaskarray(fldData)
+        dataMap.flush()
+        maskMap.flush()
+
+    # def _WriteBufferWindow(self,buffer,fldData):
+
+    def _WriteWindowToFiles(self):
+        for fldNm,buffer in self.outBuffers.items():
+            self._WriteBufferWindow(buffer,self._GetGridData(fldNm))
+    # def _WriteWindowToFiles(self):
+
+    def StoreInFld(self,fldNm,fldData,rowCnt,colCnt):
+        # Stores fldData as the current window of input field fldNm,
+        # creating its buffer if need be.
+        if fldNm not in self.inBuffers:
+            self.inBuffers[fldNm] = self.__CreateBuffer(fldNm,'NONE',fldData,rowCnt,colCnt)
+        self._WriteBufferWindow(self.inBuffers[fldNm],fldData)
+    # def StoreInFld(self,fldNm,fldData,rowCnt,colCnt):
+
+    def AddOutBuffer(self,fldNm,outFNm,fldData,rowCnt,colCnt):
+        # Creates the buffer for output field fldNm, typed like fldData
+        self.outBuffers[fldNm] = self.__CreateBuffer(fldNm,outFNm,fldData,rowCnt,colCnt)
+    # def AddOutBuffer(self,fldNm,outFNm,fldData,rowCnt,colCnt):
+
+########################################################################
+# Public methods
+########################################################################
+
+    def ReadMulti(
+        self,
+        inFileName,
+        inFieldNames,
+        outFileName,
+        newFieldNames
+        ):
+
+        if newFieldNames != 'NONE':
+            fldNms = newFieldNames
+        else:
+            fldNms = inFieldNames
+
+        for fldNm in fldNms:
+            if fldNm not in self.inBuffers:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'No buffer for field *%s* from file %s.\n'%(fldNm,inFileName))
+
+            self._AddFieldToEEMSFlds(outFileName,fldNm,self._ReadBufferWindow(self.inBuffers[fldNm]))
+
+    # def ReadMulti(...)
+
+# class EEMSBufferCmdRunner(EEMSCmdRunnerBase):
+######################################################################
+
+######################################################################
+# EEMSResultCache class
+######################################################################
+# Stores fields in a directory, one .npz file per field, under a key
+# that identifies the computation that produced the field (see
+# EEMSInterpreter.SetResultCache()). The directory may be shared by
+# any number of programs and processes. Files are written under a
+# temporary name and then renamed, so readers never see part of a
+# file.
+#
+# The total size of the directory is kept under maxBytes by deleting
+# the least recently used files. A cache hit updates the file's
+# modification time, which serves as its time of last use.
+#
+# Revision History
+#
+# 2026.10.16
+#
+# Written for caching results across programs and runs.
+#
+# Keys include a version (KeyVersion) of the results cached.
+#
+######################################################################
+
+class EEMSResultCache(object):
+
+########################################################################
+# version of the results cached, part of every key. Raise it when a
+# change alters the results of commands (their values, masks or format),
+# so that results cached by earlier versions are not used.
+    KeyVersion = 1
+########################################################################
+
+    def __init__(self,cacheDir,maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+    def __GetFNm(self,key):
+        return os.path.join(self.cacheDir,key+'.npz')
+
+    def __Evict(self):
+
+        cacheFiles = []
+        totalBytes = 0
+        for fNm in os.listdir(self.cacheDir):
+            if not fNm.endswith('.npz'):
+                continue
+            try:
+                fStat = os.stat(os.path.join(self.cacheDir,fNm))
+            except OSError: # removed by another process
+                continue
+            cacheFiles.append((fStat.st_mtime,fStat.st_size,fNm))
+            totalBytes += fStat.st_size
+
+        cacheFiles.sort()
+        for mTime,fSize,fNm in cacheFiles:
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.cacheDir,fNm))
+            except OSError:
+                pass
+            totalBytes -= fSize
+
+    # def __Evict(self):
+
+    def Has(self,key):
+        return os.path.exists(self.__GetFNm(key))
+
+    def Get(self,key):
+        # The field stored under key, or None if there is none
+        fNm = self.__GetFNm(key)
+        try:
+            with np.load(fNm) as npz:
+                fldData = np.ma.masked_array(npz['data'],mask=npz['mask'])
+            os.utime(fNm)
+        except (IOError,OSError):
+            return None
+
+        return fldData
+
+    # def Get(self,key):
+
+    def Put(self,key,fldData):
+        fd,tmpFNm = tempfile.mkstemp(suffix='.tmp',dir=self.cacheDir)
+        with os.fdopen(fd,'wb') as tmpF:
+            np.savez(tmpF,data=np.ma.getdata(fldData),mask=np.ma.getmaskarray(fldData))
+        os.replace(tmpFNm,self.__GetFNm(key))
+
+        self.__Evict()
+
+    # def Put(self,key,fldData):
+
+# class EEMSResultCache(object):
+######################################################################
+
 ######################################################################
 # EEMSInterpreter
 ######################################################################
@@ -2336,10 +4197,62 @@ class EEMSCmdRunnerBase(object):
 #
 # Completed writing of this class.
 #
+# 2026.10.16
+#
+# Added SetParallel() to run independent commands at the same time on
+# a pool of threads or processes. Sequential execution in orderedCmds
+# order remains the default.
+#
+# Added SetFreeIntermediateFlds() to drop fields not written to output
+# files once the last command using them has run.
+#
+# Added SetTileSize() to run the program one spatial window at a time,
+# with statistics passes for commands that need whole-extent statistics.
+#
+# Tiled runs with a process pool spread windows over the processes,
+# sharing fields through EEMSBufferCmdRunner buffers.
+#
+# Added RerunProgram() to run an edited program, recomputing only the
+# commands that changed and those downstream of them.
+#
+# Added SetResultCache() to reuse results from an EEMSResultCache.
+#
+# Added SetScenarios() to run several sets of parameter values in one
+# run, sharing the work the scenarios have in common.
+#
+# Added SetFuseFuzzyCmds() to run chains of elementwise fuzzy commands
+# as single passes over blocks of cells.
+#
+# Added SetTargetFlds() to run only the commands needed for some
+# fields, and write only those fields.
+#
+# Fields that EEMSProgram finds to be aliases are added by reference to
+# the field they are an alias of rather than computed.
+#
+# Added SetDtype() to run in float32.
+#
+# Added SetBufferPool() to reuse the buffers of freed fields.
+#
+# Added SetCompact() to run on the valid cells only.
+#
+# Inputs that EEMSProgram finds to be in fuzzy range are not checked
+# by fuzzy operations.
+#
+# Added SetSharedMask() to hold fields as plain arrays sharing one mask.
+#
+# Added SetKernelBackend() to run some operators with compiled kernels.
+#
+# Added SetBroadcastFlds() to hold fields of lower rank at their own size.
+#
 ######################################################################
 
 class EEMSInterpreter(object):
 
+########################################################################
+# commands that may be fused. See SetFuseFuzzyCmds()
+    FusibleCmdNms = ['CVTTOFUZZY','CVTTOFUZZYCURVE','CVTTOFUZZYCAT','NOT','UNION','OR','AND','EMDSAND','WTDUNION']
+########################################################################
+
     def __init__(self,EEMSProgFNm,cmdRunner,verbose=False):
         self.myProg = None # EEMSProgram object
         self.myCmdRunner = cmdRunner
@@ -2351,6 +4264,36 @@ class EEMSInterpreter(object):
         # values to override required params. Be careful!
         self.paramOverrideVals = {} 
 
+        # parallel execution of independent commands. See SetParallel()
+        self.workerCnt = 1
+        self.poolType = 'thread'
+
+        # dropping of intermediate fields. See SetFreeIntermediateFlds()
+        self.freeIntermediateFlds = False
+        self.fldConsumerCnts = None # commands yet to run that use each field
+
+        # window by window execution. See SetTileSize()
+        self.tileSize = None
+
+        # signature of each field from the last run. See RerunProgram()
+        self.fldSigs = None
+
+        # on-disk store of results. See SetResultCache()
+        self.resultCache = None
+        self.fldCacheKeys = {} # cache key of each field run so far
+
+        # parameter values for each scenario. See SetScenarios()
+        self.scenarios = None
+
+        # fields wanted from the run. See SetTargetFlds()
+        self.targetFldNms = None
+
+        # running chains of commands in one pass. See SetFuseFuzzyCmds()
+        self.fuseFuzzyCmds = False
+        self.fuseBlockCellCnt = None
+        self.fusedCmds = {} # commands fused into each root command, root last
+        self.fusedMemberNms = set() # fields of fused commands other than roots
+
         self.myProg = EEMSProgram(EEMSProgFNm)
         self.myProg.SetCrntCmdToFirst() # start at beginning
 
@@ -2367,263 +4310,1605 @@ class EEMSInterpreter(object):
     def SetOverrideParam(self,paramNm,paramVal):
             self.paramOverrideVals[paramNm] = paramVal
 
-    def RunProgram(self):
-        
-        if self.verbose: print('Running Commands:')
+    def SetParallel(self,workerCnt,poolType='thread'):
+        # Run independent commands at the same time on a pool of
+        # workerCnt threads or processes. With workerCnt of 1 (the
+        # default) commands are run one at a time in orderedCmds order.
+        #
+        # In a tiled run (see SetTileSize()) a process pool instead
+        # runs whole windows in each process, sharing fields through
+        # memory-mapped buffers.
 
-        while True: # work loop over all commands
-            
-            if self.verbose:
-                print('  '+self.myProg.GetCrntCmdString())
+        if poolType not in ['thread','process']:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Pool type must be either *thread* or *process*.\n'+
+                '  Value was: *%s*\n'%poolType)
 
-            cmdNm = self.myProg.GetCrntCmdName()
+        if workerCnt < 1:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Number of workers must be at least 1.\n'+
+                '  Value was: *%s*\n'%workerCnt)
+
+        self.workerCnt = workerCnt
+        self.poolType = poolType
+
+    # def SetParallel(self,workerCnt,poolType='thread'):
+
+    def SetDtype(self,dtype):
+        # Floating point fields are read and computed as dtype, float64
+        # (the default) or float32. See EEMSCmdRunnerBase.SetDtype().
+        self.myCmdRunner.SetDtype(dtype)
+    # def SetDtype(self,dtype):
+
+    def SetBufferPool(self,TorF):
+        # Reuse the buffers of fields that have been freed (see
+        # SetFreeIntermediateFlds()) or, in a tiled run, of the previous
+        # window. See EEMSCmdRunnerBase.SetBufferPool().
+        self.myCmdRunner.SetBufferPool(TorF)
+    # def SetBufferPool(self,TorF):
+
+    def SetCompact(self,TorF):
+        # Run on a vector of the valid cells rather than on the whole
+        # grid. The fields are compacted once the READs have been run.
+        # See EEMSCmdRunnerBase.SetCompact().
+        self.myCmdRunner.SetCompact(TorF)
+    # def SetCompact(self,TorF):
+
+    def SetSharedMask(self,TorF):
+        # Hold fields as plain arrays sharing one mask of the invalid
+        # cells. READs are then run before the other commands, so the
+        # mask is complete before it is used. See
+        # EEMSCmdRunnerBase.SetSharedMask().
+        self.myCmdRunner.SetSharedMask(TorF)
+    # def SetSharedMask(self,TorF):
+
+    def SetKernelBackend(self,backendNm):
+        # Run the per-cell loops of some operators as compiled kernels,
+        # 'numba', or with NumPy, 'numpy' (the default). See
+        # EEMSCmdRunnerBase.SetKernelBackend().
+        self.myCmdRunner.SetKernelBackend(backendNm)
+    # def SetKernelBackend(self,backendNm):
+
+    def SetBroadcastFlds(self,TorF):
+        # Accept fields whose shape broadcasts to the program's, holding
+        # them at their own size rather than replicating them. See
+        # EEMSCmdRunnerBase.SetBroadcastFlds().
+        self.myCmdRunner.SetBroadcastFlds(TorF)
+    # def SetBroadcastFlds(self,TorF):
+
+    def SetTileSize(self,tileRowCnt,tileColCnt):
+        # Run the whole program one window of tileRowCnt rows by
+        # tileColCnt columns at a time, so that only one window of each
+        # field is held in memory. The cmdRunner must support windowed
+        # reading and writing (see EEMSCmdRunnerBase.SetWindow()).
+
+        if tileRowCnt < 1 or tileColCnt < 1:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Tile size must be at least 1 row by 1 column.\n'+
+                '  Value was: *%s x %s*\n'%(tileRowCnt,tileColCnt))
+
+        self.tileSize = (tileRowCnt,tileColCnt)
+
+    # def SetTileSize(self,tileRowCnt,tileColCnt):
+
+    def SetResultCache(self,cacheDir,maxBytes):
+        # Look up the result of each command in an on-disk cache before
+        # running it, and add results to the cache. A result's key
+        # covers the command and its parameters (other than the names of
+        # the result and output file) and the keys of its input fields,
+        # so any program computing the same thing from the same inputs
+        # shares the cached result. Fields read by READs are keyed by
+        # input file, file modification time and variable name. READs
+        # themselves are always run. Keys also cover the version of the
+        # results (EEMSResultCache.KeyVersion), the dtype policy and the
+        # kernel backend.
+        #
+        # The cache holds at most maxBytes, dropping the least recently
+        # used results. Whole-extent runs, and tiled runs without a
+        # process pool, use the cache.
+
+        self.resultCache = EEMSResultCache(cacheDir,maxBytes)
+
+    # def SetResultCache(self,cacheDir,maxBytes):
+
+    def SetScenarios(self,scenarios):
+        # Run the program for several scenarios at once. scenarios is a
+        # dictionary of scenario name to parameter values to use in that
+        # scenario: {scenarioNm:{resultNm:{paramNm:paramVal,...},...},...},
+        # e.g. {'strict':{'fa':{'TrueThreshold':90}},'loose':{}}.
+        #
+        # Commands whose parameters vary, and the commands downstream of
+        # them, are run once per scenario, and their fields get a
+        # leading scenario axis. Everything else, including READs, is
+        # run once. Scenario fields bound for output files are written
+        # as one field per scenario, named <field>_<scenario>.
+
+        for scenarioNm,scenarioVals in scenarios.items():
+            for rsltNm,paramVals in scenarioVals.items():
+
+                if rsltNm not in self.myProg.allDefinedFieldNms:
+                    raise Exception(
+                        '\n********************ERROR********************\n'+
+                        'Scenario *%s* sets parameters of undefined field *%s*.\n'%(scenarioNm,rsltNm))
 
-            cmdParams = {} # parameters that will be used in command
-            
-            # Set values for optional parameters
-            for paramNm in self.myProg.GetOptionalParamNmsForCrntCmd():
-                if self.myProg.CrntHasParam(paramNm):
-                    cmdParams[paramNm] = self.myProg.GetParamFromCrntCmd(paramNm)
-                elif paramNm in list(self.dfltOptnlParamVals.keys()):
-                    cmdParams[paramNm] = self.dfltOptnlParamVals[paramNm]
-                    if self.verbose:
-                        print('    substituting %s into parameter %s'%(self.dfltOptnlParamVals[paramNm],paramNm))
-                else:
-                    cmdParams[paramNm] = 'NONE'
+                cmd = self.myProg.allDefinedFieldNms[rsltNm]
 
-            # Do overrides for required parameters
-            for paramNm in self.myProg.GetParamNmsFromCrntCmd():
+                if cmd.IsReadCmd():
+                    raise Exception(
+                        '\n********************ERROR********************\n'+
+                        'Scenario *%s* sets parameters of READ command:\n'%scenarioNm+
+                        '  %s\n'%cmd.GetCommandString())
 
-                if paramNm in list(self.paramOverrideVals.keys()):
-                    cmdParams[paramNm] = self.paramOverrideVals[paramNm]
-                    if self.verbose:
-                        print('    substituting %s into parameter %s'%(self.paramOverrideVals[paramNm],paramNm))
-                else:
-                    cmdParams[paramNm] = self.myProg.GetParamFromCrntCmd(paramNm)
+                for paramNm in paramVals.keys():
+                    if not cmd.IsRequiredParam(paramNm) and not cmd.IsOptionalParam(paramNm):
+                        raise Exception(
+                            '\n********************ERROR********************\n'+
+                            'Scenario *%s* sets unknown parameter *%s* of command:\n'%(scenarioNm,paramNm)+
+                            '  %s\n'%cmd.GetCommandString())
+
+            # for rsltNm,paramVals in scenarioVals.items():
+        # for scenarioNm,scenarioVals in scenarios.items():
+
+        self.scenarios = scenarios
+        self.myProg.SetUniqueFlds(self.__GetScenarioFldNms())
+
+    # def SetScenarios(self,scenarios):
+
+    def __GetScenarioFldNms(self):
+        # Fields whose parameters vary by scenario
+        fldNms = []
+        if self.scenarios is not None:
+            for scenarioVals in self.scenarios.values():
+                fldNms += list(scenarioVals.keys())
+        return fldNms
+
+    def SetFuseFuzzyCmds(self,TorF,blockCellCnt=65536):
+        # Run chains of elementwise fuzzy commands (see FusibleCmdNms)
+        # as one pass over blocks of about blockCellCnt cells, e.g.
+        # CVTTOFUZZY -> NOT -> UNION -> AND. A command joins the chain
+        # of the command that uses it if it is that command's only user
+        # and its field is not written to an output file. Such fields
+        # are never held whole, and the chain's intermediate arrays are
+        # block sized. Results are the same as running the commands
+        # one at a time.
+        #
+        # Fusion is not used with scenarios (see SetScenarios()).
+
+        self.fuseFuzzyCmds = TorF
+        self.fuseBlockCellCnt = blockCellCnt
+
+    # def SetFuseFuzzyCmds(self,TorF,blockCellCnt=65536):
+
+    def SetTargetFlds(self,fldNms):
+        # Run only the commands needed to compute the fields in fldNms
+        # (e.g. the top node, or one sub-indicator) and write only those
+        # fields to their output files. READs of fields they do not
+        # depend on are skipped. Fields without an output file are left
+        # in the cmdRunner. None runs the whole program again.
+
+        if fldNms is not None:
+            for fldNm in fldNms:
+                if fldNm not in self.myProg.allDefinedFieldNms:
+                    raise Exception(
+                        '\n********************ERROR********************\n'+
+                        'Target field *%s* is not defined by the program.\n'%fldNm)
 
-            if cmdNm == 'READ':
-                self.myCmdRunner.Read(
-                    cmdParams['InFileName'],
-                    cmdParams['InFieldName'],
-                    cmdParams['OutFileName'],
-                    cmdParams['NewFieldName'],
-                    )
+        self.targetFldNms = fldNms
 
-            elif cmdNm == 'READMULTI':
-                self.myCmdRunner.ReadMulti(
-                    cmdParams['InFileName'],
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    cmdParams['NewFieldNames'],
-                    )
+    # def SetTargetFlds(self,fldNms):
 
-            elif cmdNm == 'CVTTOFUZZY':
-                self.myCmdRunner.CvtToFuzzy(
-                    cmdParams['InFieldName'],
-                    cmdParams['TrueThreshold'],
-                    cmdParams['FalseThreshold'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-    
-            elif cmdNm == 'CVTTOFUZZYCURVE':
-                self.myCmdRunner.CvtToFuzzyCurve(
-                    cmdParams['InFieldName'],
-                    cmdParams['RawValues'],
-                    cmdParams['FuzzyValues'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+    def SetFreeIntermediateFlds(self,TorF):
+        # Drop each field from the cmdRunner once the last command that
+        # uses it has run, unless it is to be written to an output file.
+        # This bounds peak memory by the fields that are live at any
+        # point rather than by every field in the program.
+        self.freeIntermediateFlds = TorF
 
-            elif cmdNm == 'CVTTOFUZZYCAT':
-                self.myCmdRunner.CvtToFuzzyCat(
-                    cmdParams['InFieldName'],
-                    cmdParams['RawValues'],
-                    cmdParams['FuzzyValues'],
-                    cmdParams['DefaultFuzzyValue'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-    
-            elif cmdNm == 'COPYFIELD':
-                self.myCmdRunner.CopyField(
-                    cmdParams['InFieldName'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+    def __InitFldConsumerCnts(self,cmdNdxs,keepFldNms):
 
-            elif cmdNm == 'NOT':
-                self.myCmdRunner.FuzzyNot(
-                    cmdParams['InFieldName'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+        # The number of commands in cmdNdxs that use each field. A
+        # field's last consumer is the command that brings its count
+        # to zero. Fields in keepFldNms are never dropped.
 
-            elif cmdNm == 'OR':
-                self.myCmdRunner.FuzzyOr(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'AND':
-                self.myCmdRunner.FuzzyAnd(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'EMDSAND':
-                self.myCmdRunner.FuzzyEMDSAnd(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'ORNEG':
-                self.myCmdRunner.FuzzyOrNeg(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'XOR':
-                self.myCmdRunner.FuzzyXOr(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+        cmds = self.myProg.orderedCmds
 
-            elif cmdNm == 'SUM':
-                self.myCmdRunner.SumFlds(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'MIN':
-                self.myCmdRunner.MinFlds(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'MAX':
-                self.myCmdRunner.MaxFlds(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'MEAN':
-                self.myCmdRunner.MeanFlds(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+        self.fldConsumerCnts = {}
+        for ndx in cmdNdxs:
+            for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                self.fldConsumerCnts[fldNm] = 0
 
-            elif cmdNm == 'UNION':
-                self.myCmdRunner.FuzzyUnion(
-                    cmdParams['InFieldNames'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'DIF':
-                self.myCmdRunner.DifFlds(
-                    cmdParams['StartingFieldName'],
-                    cmdParams['ToSubtractFieldName'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'SELECTEDUNION':
-                self.myCmdRunner.FuzzySelectedUnion(
-                    cmdParams['InFieldNames'],
-                    cmdParams['TruestOrFalsest'],
-                    cmdParams['NumberToConsider'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'WTDUNION':
-                self.myCmdRunner.FuzzyWeightedUnion(
-                    cmdParams['InFieldNames'],
-                    cmdParams['Weights'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'WTDEMDSAND':
-                self.myCmdRunner.FuzzyEMDSWeightedAnd(
-                    cmdParams['InFieldNames'],
-                    cmdParams['Weights'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'WTDMEAN':
-                self.myCmdRunner.WeightedMean(
-                    cmdParams['InFieldNames'],
-                    cmdParams['Weights'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'WTDSUM':
-                self.myCmdRunner.WeightedSum(
-                    cmdParams['InFieldNames'],
-                    cmdParams['Weights'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
-                
-            elif cmdNm == 'CALLEXTERN':
-                self.myCmdRunner.CallExtern(
-                    self.myProg.GetCrntResultName()
-                    )
+        # Fields from outside cmdNdxs (e.g. kept from a previous run)
+        # are not counted and are never dropped.
+        for ndx in cmdNdxs:
+            for fldNm in set(self.myProg.GetDependFieldNms(cmds[ndx])):
+                if fldNm in self.fldConsumerCnts:
+                    self.fldConsumerCnts[fldNm] += 1
 
-            elif cmdNm == 'MEANTOMID':
-                self.myCmdRunner.MeanToMid(
-                    cmdParams['InFieldName'],
-                    cmdParams['IgnoreZeros'],
-                    cmdParams['FuzzyValues'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+        for fldNm in keepFldNms:
+            self.fldConsumerCnts[fldNm] += 1
 
-            elif cmdNm == 'SCORERANGEBENEFIT':
-                self.myCmdRunner.ScoreRangeBenefit(
-                    cmdParams['InFieldName'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                    )
+    # def __InitFldConsumerCnts(self,cmdNdxs,keepFldNms):
 
-            elif cmdNm == 'SCORERANGECOST':
-                self.myCmdRunner.ScoreRangeCost(
-                    cmdParams['InFieldName'],
-                    cmdParams['OutFileName'],
-                    self.myProg.GetCrntResultName()
-                )
+    def __FreeDeadFlds(self,cmd):
 
-            else:
-                raise Exception(
-                    'ERROR: Unable to interpret command:\n'+
-                    '  %s'%self.myProg.GetCrntCmdString()
-                    )
-            
-            # if cmdNm == 'READ'...elif...else:
-            
-            # exit work loop if there is not another command to process
-            if not self.myProg.NextCmd():
-                break;
-        
-        # while True
+        # Called once cmd has run. Drops the fields that no command yet
+        # to run will use and that are not destined for an output file.
+
+        if not self.freeIntermediateFlds:
+            return
+
+        # Fused commands really run with their root command
+        if self.__IsFusedMember(cmd):
+            return
+        elif not cmd.IsReadCmd() and cmd.GetResultName() in self.fusedCmds:
+            ranCmds = self.fusedCmds[cmd.GetResultName()]
+        else:
+            ranCmds = [cmd]
+
+        deadFldNms = []
+        for ranCmd in ranCmds:
+            for fldNm in set(self.myProg.GetDependFieldNms(ranCmd)):
+                if fldNm not in self.fldConsumerCnts:
+                    continue
+                self.fldConsumerCnts[fldNm] -= 1
+                if self.fldConsumerCnts[fldNm] == 0:
+                    deadFldNms.append(fldNm)
+
+            for fldNm in self.myProg.GetDefinedFieldNms(ranCmd):
+                if self.fldConsumerCnts[fldNm] == 0:
+                    deadFldNms.append(fldNm)
+
+        for fldNm in deadFldNms:
+            if (fldNm in self.myCmdRunner.EEMSFlds and
+                self.myCmdRunner.EEMSFlds[fldNm]['outFNm'] == 'NONE'):
+                if self.verbose:
+                    print('    freeing %s'%fldNm)
+                self.myCmdRunner.RemoveField(fldNm)
+
+    # def __FreeDeadFlds(self,cmd):
+
+    def __GetCmdParams(self,cmd,quiet=False):
+
+        cmdParams = {} # parameters that will be used in command
+
+        # Set values for optional parameters
+        for paramNm in cmd.GetOptionalParamNames():
+            if cmd.HasParam(paramNm):
+                cmdParams[paramNm] = cmd.GetParam(paramNm)
+            elif paramNm in list(self.dfltOptnlParamVals.keys()):
+                cmdParams[paramNm] = self.dfltOptnlParamVals[paramNm]
+                if self.verbose and not quiet:
+                    print('    substituting %s into parameter %s'%(self.dfltOptnlParamVals[paramNm],paramNm))
+            else:
+                cmdParams[paramNm] = 'NONE'
+
+        # Do overrides for required parameters
+        for paramNm in cmd.GetParamNames():
+
+            if paramNm in list(self.paramOverrideVals.keys()):
+                cmdParams[paramNm] = self.paramOverrideVals[paramNm]
+                if self.verbose and not quiet:
+                    print('    substituting %s into parameter %s'%(self.paramOverrideVals[paramNm],paramNm))
+            else:
+                cmdParams[paramNm] = cmd.GetParam(paramNm)
+
+        # With target fields, only they are written
+        if self.targetFldNms is not None and 'OutFileName' in cmdParams:
+            if len(set(self.myProg.GetDefinedFieldNms(cmd)).intersection(self.targetFldNms)) == 0:
+                cmdParams['OutFileName'] = 'NONE'
+
+        return cmdParams
+
+    # def __GetCmdParams(self,cmd,quiet=False):
+
+    def __SetReadCacheKeys(self,cmd,cmdParams):
+
+        # Cache keys for the fields read by cmd, from the input file,
+        # its modification time and the variable name.
+
+        if cmd.GetCommandName() == 'READ':
+            inFldNms = [cmdParams['InFieldName']]
+        else:
+            inFldNms = cmdParams['InFieldNames']
+
+        inFNm = os.path.abspath(cmdParams['InFileName'])
+        if os.path.exists(inFNm):
+            mTime = os.path.getmtime(inFNm)
+        else:
+            mTime = None
+
+        for inFldNm,fldNm in zip(inFldNms,self.myProg.GetDefinedFieldNms(cmd)):
+            self.fldCacheKeys[fldNm] = hashlib.sha1(repr(
+                [EEMSResultCache.KeyVersion,'READ',inFNm,mTime,inFldNm,self.myCmdRunner.window,self.myCmdRunner.dtype.str]
+                ).encode()).hexdigest()
+
+    # def __SetReadCacheKeys(self,cmd,cmdParams):
+
+    def __SetCacheKey(self,cmd,cmdParams):
+
+        # Sets the cache key of the field cmd defines
+
+        if self.resultCache is None:
+            return
+
+        # Field names are replaced by the fields' keys, so that the key
+        # does not depend on what the fields are called.
+        keyParams = []
+        for paramNm,paramVal in sorted(cmdParams.items()):
+            if paramNm == 'OutFileName':
+                continue
+            if isinstance(paramVal,list):
+                paramVal = [self.fldCacheKeys.get(val,val) for val in paramVal]
+            elif isinstance(paramVal,str):
+                paramVal = self.fldCacheKeys.get(paramVal,paramVal)
+            keyParams.append((paramNm,paramVal))
+
+        keyVals = [
+            EEMSResultCache.KeyVersion,
+            cmd.GetCommandName(),
+            keyParams,
+            self.myCmdRunner.dtype.str,
+            self.myCmdRunner.validMaskSig,
+            ('kernelBackend',self.myCmdRunner.kernelBackend)
+            ]
+        if self.myCmdRunner.sharedMask:
+            keyVals.append(('sharedMask',self.myCmdRunner.invalidMaskSig))
+
+        self.fldCacheKeys[cmd.GetResultName()] = hashlib.sha1(repr(keyVals).encode()).hexdigest()
+
+    # def __SetCacheKey(self,cmd,cmdParams):
+
+    def __GetCachedFld(self,cmd,cmdParams):
+
+        # Sets the cache key of the field cmd defines. If the cache has
+        # the field, it is added to the cmdRunner and True is returned.
+
+        if self.resultCache is None:
+            return False
+
+        self.__SetCacheKey(cmd,cmdParams)
+
+        rsltNm = cmd.GetResultName()
+        fldData = self.resultCache.Get(self.fldCacheKeys[rsltNm])
+        if fldData is None:
+            return False
+
+        if self.verbose:
+            print('    found %s in result cache'%rsltNm)
+        self.myCmdRunner._AddFieldToEEMSFlds(cmdParams['OutFileName'],rsltNm,fldData)
+
+        return True
+
+    # def __GetCachedFld(self,cmd,cmdParams):
+
+    def __PutCachedFld(self,cmd):
+
+        # Adds the field cmd defined to the cache
+
+        if self.resultCache is None or cmd.IsReadCmd():
+            return
+
+        if cmd.GetResultName() in self.myCmdRunner.scenarioFldNms:
+            return
+
+        if self.__IsFusedMember(cmd):
+            return
+
+        rsltNm = cmd.GetResultName()
+        if not self.resultCache.Has(self.fldCacheKeys[rsltNm]):
+            self.resultCache.Put(self.fldCacheKeys[rsltNm],self.myCmdRunner.EEMSFlds[rsltNm]['data'])
+
+    # def __PutCachedFld(self,cmd):
+
+    def __IsScenarioCmd(self,cmd):
+
+        # Whether cmd is to be run once per scenario: its parameters
+        # vary by scenario or it uses a scenario field.
+
+        if self.scenarios is None or cmd.IsReadCmd():
+            return False
+
+        for scenarioVals in self.scenarios.values():
+            if cmd.GetResultName() in scenarioVals:
+                return True
+
+        for fldNm in self.myProg.GetDependFieldNms(cmd):
+            if fldNm in self.myCmdRunner.scenarioFldNms:
+                return True
+
+        return False
+
+    # def __IsScenarioCmd(self,cmd):
+
+    def __RunScenarioCmd(self,cmd,cmdParams):
+
+        # Runs cmd once for each scenario on a scratch cmdRunner holding
+        # that scenario's slice of its inputs, then stacks the results
+        # into a scenario field.
+
+        rsltNm = cmd.GetResultName()
+        scenarioRunner = type(self.myCmdRunner)()
+        scenarioRunner.SetDtype(self.myCmdRunner.dtype)
+        scenarioRunner.SetFuzzyFlds(self.myCmdRunner.fuzzyFldNms)
+        scenarioRunner.SetReadSrcFlds(self.myCmdRunner.readSrcFldNms)
+        scenarioRunner.SetSharedMask(self.myCmdRunner.sharedMask)
+        scenarioRunner.SetKernelBackend(self.myCmdRunner.kernelBackend)
+        scenarioRunner.SetBroadcastFlds(self.myCmdRunner.broadcastFlds)
+        scenarioRunner.fldStats.update(self.myCmdRunner.fldStats)
+
+        scenarioFlds = []
+        for scenarioNdx,scenarioVals in enumerate(self.scenarios.values()):
+
+            scenarioRunner.SetWindow(None)
+            scenarioRunner.invalidMask = self.myCmdRunner.invalidMask
+            scenarioRunner.readMasks = dict(self.myCmdRunner.readMasks)
+            for fldNm in set(self.myProg.GetDependFieldNms(cmd)):
+                fld = self.myCmdRunner.EEMSFlds[fldNm]
+                if fldNm in self.myCmdRunner.scenarioFldNms:
+                    scenarioRunner._AddFieldToEEMSFlds(fld['outFNm'],fldNm,fld['data'][scenarioNdx])
+                else:
+                    scenarioRunner._AddFieldToEEMSFlds(fld['outFNm'],fldNm,fld['data'])
+
+            scenarioParams = dict(cmdParams)
+            if rsltNm in scenarioVals:
+                scenarioParams.update(scenarioVals[rsltNm])
+
+            self._DispatchCmd(scenarioRunner,cmd,scenarioParams)
+            scenarioFlds.append(scenarioRunner.EEMSFlds[rsltNm]['data'])
+
+        # for scenarioNdx,scenarioVals in enumerate(self.scenarios.values()):
+
+        self.myCmdRunner._AddScenarioFieldToEEMSFlds(
+            cmdParams['OutFileName'],
+            rsltNm,
+            np.ma.stack(scenarioFlds)
+            )
+
+    # def __RunScenarioCmd(self,cmd,cmdParams):
+
+    def __PlanFusedCmds(self,cmdNdxs,keepFldNms):
+
+        # Finds the chains of commands in cmdNdxs to fuse (see
+        # SetFuseFuzzyCmds()). Each chain is run by its root, the one
+        # command in it whose field is kept.
+
+        self.fusedCmds = {}
+        self.fusedMemberNms = set()
+
+        if not self.fuseFuzzyCmds or self.scenarios is not None:
+            return
+
+        cmds = self.myProg.orderedCmds
+
+        consumerNdxs = {} # commands in the program using each field
+        for ndx in range(len(cmds)):
+            for fldNm in set(self.myProg.GetDependFieldNms(cmds[ndx])):
+                consumerNdxs.setdefault(fldNm,[]).append(ndx)
+
+        # A command is fused into its only consumer if both can be
+        # fused. CVTTOFUZZY may need its input's range, so its input is
+        # always kept.
+        consumerNdxOf = {}
+        for ndx in cmdNdxs:
+            cmd = cmds[ndx]
+            if (cmd.GetCommandName() not in self.FusibleCmdNms or
+                self.myProg.GetAliasedFldNm(cmd) is not None):
+                continue
+
+            rsltNm = cmd.GetResultName()
+            if (rsltNm in keepFldNms or
+                self.__GetCmdParams(cmd,quiet=True)['OutFileName'] != 'NONE' or
+                len(consumerNdxs.get(rsltNm,[])) != 1):
+                continue
+
+            consumerNdx = consumerNdxs[rsltNm][0]
+            consumerNm = cmds[consumerNdx].GetCommandName()
+            if (consumerNdx in cmdNdxs and
+                consumerNm in self.FusibleCmdNms and
+                consumerNm != 'CVTTOFUZZY' and
+                self.myProg.GetAliasedFldNm(cmds[consumerNdx]) is None):
+                consumerNdxOf[ndx] = consumerNdx
+
+        # for ndx in cmdNdxs:
+
+        # cmdNdxs is in dependency order, so each chain is too
+        rootNdxs = []
+        for ndx in cmdNdxs:
+            if ndx in consumerNdxOf:
+                rootNdx = consumerNdxOf[ndx]
+                while rootNdx in consumerNdxOf:
+                    rootNdx = consumerNdxOf[rootNdx]
+                if rootNdx not in rootNdxs:
+                    rootNdxs.append(rootNdx)
+
+                self.fusedCmds.setdefault(cmds[rootNdx].GetResultName(),[]).append(cmds[ndx])
+                self.fusedMemberNms.add(cmds[ndx].GetResultName())
+
+        for rootNdx in rootNdxs:
+            self.fusedCmds[cmds[rootNdx].GetResultName()].append(cmds[rootNdx])
+
+    # def __PlanFusedCmds(self,cmdNdxs,keepFldNms):
+
+    def __IsFusedMember(self,cmd):
+        return not cmd.IsReadCmd() and cmd.GetResultName() in self.fusedMemberNms
+
+    def __RunFusedCmds(self,cmd,cmdParams):
+
+        # Runs the chain of commands fused into cmd
+
+        fusedCmds = []
+        for fusedCmd in self.fusedCmds[cmd.GetResultName()][:-1]:
+            fusedCmds.append((
+                fusedCmd.GetCommandName(),
+                self.__GetCmdParams(fusedCmd,quiet=True),
+                fusedCmd.GetResultName()
+                ))
+        fusedCmds.append((cmd.GetCommandName(),cmdParams,cmd.GetResultName()))
+
+        self.myCmdRunner.RunFusedCmds(fusedCmds,self.fuseBlockCellCnt)
+
+    # def __RunFusedCmds(self,cmd,cmdParams):
+
+    def __AddAliasFld(self,cmd,cmdParams):
+
+        aliasedFldNm = self.myProg.GetAliasedFldNm(cmd)
+
+        if self.verbose:
+            print('    alias of %s'%aliasedFldNm)
+
+        self._AddAliasFld(self.myCmdRunner,cmd,cmdParams,aliasedFldNm)
+
+        if aliasedFldNm in self.fldCacheKeys:
+            self.fldCacheKeys[cmd.GetResultName()] = self.fldCacheKeys[aliasedFldNm]
+
+    # def __AddAliasFld(self,cmd,cmdParams):
+
+    def __RunCmd(self,cmd):
+
+        if self.verbose:
+            print('  '+cmd.GetCommandString())
+
+        cmdParams = self.__GetCmdParams(cmd)
+
+        if self.myProg.GetAliasedFldNm(cmd) is not None:
+            self.__AddAliasFld(cmd,cmdParams)
+
+        elif self.__IsScenarioCmd(cmd):
+            self.__RunScenarioCmd(cmd,cmdParams)
+
+        elif cmd.IsReadCmd():
+            self._DispatchCmd(self.myCmdRunner,cmd,cmdParams)
+            if self.resultCache is not None:
+                self.__SetReadCacheKeys(cmd,cmdParams)
+
+        elif self.__IsFusedMember(cmd):
+            # run later, by the root of its chain
+            self.__SetCacheKey(cmd,cmdParams)
+
+        elif not self.__GetCachedFld(cmd,cmdParams):
+            if cmd.GetResultName() in self.fusedCmds:
+                self.__RunFusedCmds(cmd,cmdParams)
+            else:
+                self._DispatchCmd(self.myCmdRunner,cmd,cmdParams)
+            self.__PutCachedFld(cmd)
+
+    # def __RunCmd(self,cmd):
+
+    def __SubmitCmd(self,pool,cmd):
+
+        # Returns a future for running cmd. Results found in the cache
+        # get a future that is already done.
+
+        if self.verbose:
+            print('  '+cmd.GetCommandString())
+
+        cmdParams = self.__GetCmdParams(cmd)
+
+        if self.myProg.GetAliasedFldNm(cmd) is not None:
+            self.__AddAliasFld(cmd,cmdParams)
+            future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+
+        if self.__IsScenarioCmd(cmd):
+            if self.poolType == 'thread':
+                return pool.submit(self.__RunScenarioCmd,cmd,cmdParams)
+            else:
+                # Scenario commands are run here rather than shipping
+                # every scenario's inputs to a process.
+                self.__RunScenarioCmd(cmd,cmdParams)
+                future = concurrent.futures.Future()
+                future.set_result(None)
+                return future
+
+        if self.__IsFusedMember(cmd):
+            # run later, by the root of its chain
+            self.__SetCacheKey(cmd,cmdParams)
+            future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+
+        if self.__GetCachedFld(cmd,cmdParams):
+            future = concurrent.futures.Future()
+            future.set_result(None)
+            return future
+
+        if cmd.GetResultName() in self.fusedCmds:
+            if self.poolType == 'thread':
+                return pool.submit(self.__RunFusedCmds,cmd,cmdParams)
+            else:
+                # Fused chains are run here, as their inputs are spread
+                # over the chain.
+                self.__RunFusedCmds(cmd,cmdParams)
+                future = concurrent.futures.Future()
+                future.set_result(None)
+                return future
+
+        if self.poolType == 'thread':
+            # Threads share the cmdRunner and add their results to it
+            return pool.submit(self._DispatchCmd,self.myCmdRunner,cmd,cmdParams)
+        else:
+            # Processes get copies of the input fields and hand back
+            # the fields they create
+            inFlds = {}
+            inFldStats = {}
+            readMasks = {} # those of the fields read that the inputs come from
+            for fldNm in self.myProg.GetDependFieldNms(cmd):
+                inFlds[fldNm] = self.myCmdRunner.EEMSFlds[fldNm]
+                if fldNm in self.myCmdRunner.fldStats:
+                    inFldStats[fldNm] = self.myCmdRunner.fldStats[fldNm]
+                for srcFldNm in self.myCmdRunner.readSrcFldNms.get(fldNm,()):
+                    if srcFldNm in self.myCmdRunner.readMasks:
+                        readMasks[srcFldNm] = self.myCmdRunner.readMasks[srcFldNm]
+
+            return pool.submit(
+                _RunCmdInWorker,
+                type(self.myCmdRunner),
+                self.myCmdRunner.dtype,
+                self.myCmdRunner.kernelBackend,
+                self.myCmdRunner.broadcastFlds,
+                self.myCmdRunner.fuzzyFldNms,
+                self.myCmdRunner.invalidMask if self.myCmdRunner.sharedMask else False,
+                self.myCmdRunner.readSrcFldNms,
+                readMasks,
+                self.myCmdRunner.arrayShape,
+                cmd.GetCommandString(),
+                cmdParams,
+                inFlds,
+                inFldStats
+                )
+
+    # def __SubmitCmd(self,pool,cmd):
+
+    def __RunCmdsInParallel(self,cmdNdxs):
+
+        # Commands are run as soon as all the commands they depend on
+        # have finished, with up to workerCnt commands running at once.
+        # Commands outside cmdNdxs are taken to have been run already.
+
+        cmds = self.myProg.orderedCmds
+        dependNdxs = self.myProg.GetCmdDependencies()
+
+        dependentNdxs = {} # commands waiting on each command
+        waitCnts = {} # number of unfinished commands each command depends on
+        for ndx in cmdNdxs:
+            dependentNdxs[ndx] = []
+        for ndx in cmdNdxs:
+            waitCnts[ndx] = 0
+            for dependNdx in dependNdxs[ndx]:
+                if dependNdx in dependentNdxs:
+                    waitCnts[ndx] += 1
+                    dependentNdxs[dependNdx].append(ndx)
+
+        # READs set up cmdRunner state (e.g. dimensions and masks of
+        # input files), so they are run here, in order, before anything
+        # else is started.
+        for ndx in cmdNdxs:
+            if cmds[ndx].IsReadCmd():
+                self.__RunCmd(cmds[ndx])
+                self.__FreeDeadFlds(cmds[ndx])
+                for dependentNdx in dependentNdxs[ndx]:
+                    waitCnts[dependentNdx] -= 1
+
+        readyNdxs = []
+        for ndx in cmdNdxs:
+            if not cmds[ndx].IsReadCmd() and waitCnts[ndx] == 0:
+                readyNdxs.append(ndx)
+
+        if self.poolType == 'thread':
+            poolClass = concurrent.futures.ThreadPoolExecutor
+        else:
+            poolClass = concurrent.futures.ProcessPoolExecutor
+
+        with poolClass(max_workers=self.workerCnt) as pool:
+
+            runningNdxs = {} # command index for each running future
+
+            while len(readyNdxs) > 0 or len(runningNdxs) > 0:
+
+                for ndx in readyNdxs:
+                    runningNdxs[self.__SubmitCmd(pool,cmds[ndx])] = ndx
+                readyNdxs = []
+
+                doneFutures = concurrent.futures.wait(
+                    list(runningNdxs.keys()),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                    )[0]
+
+                for future in doneFutures:
+                    ndx = runningNdxs.pop(future)
+
+                    try:
+                        newFlds = future.result()
+                    except:
+                        for runningFuture in runningNdxs.keys():
+                            runningFuture.cancel()
+                        raise
+
+                    if newFlds is not None:
+                        for fldNm,fld in newFlds.items():
+                            self.myCmdRunner._AddFieldToEEMSFlds(fld['outFNm'],fldNm,fld['data'])
+
+                    self.__PutCachedFld(cmds[ndx])
+                    self.__FreeDeadFlds(cmds[ndx])
+
+                    for dependentNdx in dependentNdxs[ndx]:
+                        waitCnts[dependentNdx] -= 1
+                        if waitCnts[dependentNdx] == 0:
+                            readyNdxs.append(dependentNdx)
+
+                # for future in doneFutures:
+
+            # while len(readyNdxs) > 0 or len(runningNdxs) > 0:
+
+        # with poolClass(max_workers=self.workerCnt) as pool:
+
+    # def __RunCmdsInParallel(self,cmdNdxs):
+
+    def __RunCmds(self,cmdNdxs,keepFldNms=[]):
+
+        # Runs the commands at cmdNdxs (indices into orderedCmds, in
+        # order), either one at a time or in parallel.
+
+        self.__PlanFusedCmds(cmdNdxs,keepFldNms)
+
+        if self.freeIntermediateFlds:
+            self.__InitFldConsumerCnts(cmdNdxs,keepFldNms)
+
+        # With compact fields, the fields are compacted between the
+        # READs and the rest of the commands. With shared masks, the
+        # READs complete the mask before the rest of the commands.
+        if self.myCmdRunner.compact or self.myCmdRunner.sharedMask:
+            readNdxs = [ndx for ndx in cmdNdxs if self.myProg.orderedCmds[ndx].IsReadCmd()]
+            otherNdxs = [ndx for ndx in cmdNdxs if not self.myProg.orderedCmds[ndx].IsReadCmd()]
+            cmdNdxGroups = [readNdxs,otherNdxs]
+        else:
+            cmdNdxGroups = [cmdNdxs]
+
+        for groupNdxs in cmdNdxGroups:
+
+            if self.workerCnt > 1:
+                self.__RunCmdsInParallel(groupNdxs)
+
+            else:
+                for ndx in groupNdxs:
+                    self.__RunCmd(self.myProg.orderedCmds[ndx])
+                    self.__FreeDeadFlds(self.myProg.orderedCmds[ndx])
+
+            self.myCmdRunner.CompactFlds()
+
+        # for groupNdxs in cmdNdxGroups:
+
+    # def __RunCmds(self,cmdNdxs,keepFldNms=[]):
+
+    def __GetGlobalStatsInFldNm(self,cmd):
+
+        # The field whose statistics over the whole extent cmd needs,
+        # or None if cmd can be computed window by window.
+
+        cmdNm = cmd.GetCommandName()
+
+        if cmdNm == 'CVTTOFUZZY':
+            cmdParams = self.__GetCmdParams(cmd)
+            for paramNm in ['TrueThreshold','FalseThreshold']:
+                if cmdParams[paramNm] in [
+                    self.myCmdRunner.MinForFuzzyLimit,
+                    self.myCmdRunner.MaxForFuzzyLimit
+                    ]:
+                    return cmdParams['InFieldName']
+
+        elif cmdNm in ['SCORERANGEBENEFIT','SCORERANGECOST','MEANTOMID']:
+            return self.__GetCmdParams(cmd)['InFieldName']
+
+        return None
+
+    # def __GetGlobalStatsInFldNm(self,cmd):
+
+    def __GetTileWindows(self):
+
+        # Windows are (row slice, column slice) over the last two
+        # dimensions of the input fields. The shape is taken from the
+        # first field read or, with broadcast fields, is the shape the
+        # fields read broadcast to.
+
+        fullShape = None
+        for cmd in self.myProg.orderedCmds:
+            if cmd.IsReadCmd():
+                cmdParams = self.__GetCmdParams(cmd)
+                if cmd.GetCommandName() == 'READ':
+                    inFldNms = [cmdParams['InFieldName']]
+                else:
+                    inFldNms = cmdParams['InFieldNames']
+                for inFldNm in inFldNms:
+                    fldShape = self.myCmdRunner.GetFieldShape(cmdParams['InFileName'],inFldNm)
+                    if fullShape is None:
+                        fullShape = fldShape
+                    elif self.myCmdRunner.broadcastFlds:
+                        fullShape = np.broadcast_shapes(fullShape,fldShape)
+                if not self.myCmdRunner.broadcastFlds:
+                    break
+
+        if len(fullShape) < 2:
+            raise Exception(
+                '\n********************ERROR********************\n'+
+                'Tiled execution requires fields with at least 2 dimensions.\n'+
+                '  Field *%s* has shape %s.\n'%(inFldNm,fullShape))
+
+        windows = []
+        for rowStart in range(0,fullShape[-2],self.tileSize[0]):
+            for colStart in range(0,fullShape[-1],self.tileSize[1]):
+                windows.append((
+                    slice(rowStart,min(rowStart+self.tileSize[0],fullShape[-2])),
+                    slice(colStart,min(colStart+self.tileSize[1],fullShape[-1]))
+                    ))
+
+        return windows
+
+    # def __GetTileWindows(self):
+
+    def __GetAncestorNdxs(self,cmdNdxs):
+
+        # cmdNdxs together with every command they depend on, directly
+        # or indirectly, in orderedCmds order.
+
+        dependNdxs = self.myProg.GetCmdDependencies()
+        ancestorNdxs = set()
+        toVisitNdxs = list(cmdNdxs)
+        while len(toVisitNdxs) > 0:
+            ndx = toVisitNdxs.pop()
+            if ndx not in ancestorNdxs:
+                ancestorNdxs.add(ndx)
+                toVisitNdxs += dependNdxs[ndx]
+
+        return sorted(ancestorNdxs)
+
+    # def __GetAncestorNdxs(self,cmdNdxs):
+
+    def __GetRunNdxs(self):
+
+        # The commands to run: all of them or, with target fields, those
+        # the targets depend on. In orderedCmds order.
+
+        cmds = self.myProg.orderedCmds
+
+        if self.targetFldNms is None:
+            return list(range(len(cmds)))
+
+        cmdNdxs = {}
+        for ndx in range(len(cmds)):
+            cmdNdxs[id(cmds[ndx])] = ndx
+
+        targetNdxs = []
+        for fldNm in self.targetFldNms:
+            if fldNm not in self.myProg.allDefinedFieldNms:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Target field *%s* is not defined by the program.\n'%fldNm)
+            targetNdxs.append(cmdNdxs[id(self.myProg.allDefinedFieldNms[fldNm])])
+
+        return self.__GetAncestorNdxs(targetNdxs)
+
+    # def __GetRunNdxs(self):
+
+    def __GetKeepFldNms(self):
+        # Fields that must be left in the cmdRunner after a run
+        if self.targetFldNms is None:
+            return []
+        return list(self.targetFldNms)
+
+    def __RunStatsPass(self,windows,statFldNms,meanToMidFldNms):
+
+        # Runs the commands that produce statFldNms over every window,
+        # accumulating their statistics over the whole extent. These
+        # are handed to the cmdRunner for use by later passes.
+
+        defNdxs = {}
+        for ndx in range(len(self.myProg.orderedCmds)):
+            for fldNm in self.myProg.GetDefinedFieldNms(self.myProg.orderedCmds[ndx]):
+                defNdxs[fldNm] = ndx
+
+        cmdNdxs = self.__GetAncestorNdxs([defNdxs[fldNm] for fldNm in statFldNms])
+
+        # First pass: range, mean, and mean of non-zero values
+
+        stats = {}
+        mtmStats = {}
+        for fldNm in statFldNms:
+            stats[fldNm] = {'min':None,'max':None}
+            mtmStats[fldNm] = {}
+
+        for window in windows:
+            self.myCmdRunner.SetWindow(window)
+            self.__RunCmds(cmdNdxs,statFldNms)
+
+            for fldNm in statFldNms:
+                vals = np.ma.compressed(self.myCmdRunner._GetFldView(fldNm))
+                if len(vals) == 0:
+                    continue
+
+                if stats[fldNm]['min'] is None or vals.min() < stats[fldNm]['min']:
+                    stats[fldNm]['min'] = vals.min()
+                if stats[fldNm]['max'] is None or vals.max() > stats[fldNm]['max']:
+                    stats[fldNm]['max'] = vals.max()
+                for valBlock in self.myCmdRunner._GetFlatBlocks(vals):
+                    self.myCmdRunner._AddMeanToMidStats(mtmStats[fldNm],valBlock,['','nonZero'])
+
+        # for window in windows:
+
+        for fldNm in statFldNms:
+            fldStats = {'min':stats[fldNm]['min'],'max':stats[fldNm]['max']}
+            fldStats.update(self.myCmdRunner._GetMeanToMidMeans(mtmStats[fldNm]))
+            self.myCmdRunner.SetFldStats(fldNm,fldStats)
+
+        if len(meanToMidFldNms) == 0:
+            return
+
+        # Second pass: MEANTOMID needs the means of the values above and
+        # below the mean, which can only be taken once the mean is known.
+
+        meanVals = {}
+        for fldNm in meanToMidFldNms:
+            mtmStats[fldNm] = {}
+            fldStats = self.myCmdRunner.fldStats[fldNm]
+            meanVals[fldNm] = {}
+            for prefix,meanNm in [('','mean'),('nonZero','nonZeroMean')]:
+                if meanNm in fldStats:
+                    meanVals[fldNm][prefix] = fldStats[meanNm]
+
+        for window in windows:
+            self.myCmdRunner.SetWindow(window)
+            self.__RunCmds(cmdNdxs,meanToMidFldNms)
+
+            for fldNm in meanToMidFldNms:
+                for fldBlock in self.myCmdRunner._GetFlatBlocks(self.myCmdRunner._GetFldView(fldNm)):
+                    self.myCmdRunner._AddMeanToMidStats(
+                        mtmStats[fldNm],
+                        fldBlock,
+                        ['','nonZero'],
+                        meanVals[fldNm])
+
+        # for window in windows:
+
+        for fldNm in meanToMidFldNms:
+            self.myCmdRunner.fldStats[fldNm].update(
+                self.myCmdRunner._GetMeanToMidMeans(mtmStats[fldNm]))
+
+    # def __RunStatsPass(self,windows,statFldNms,meanToMidFldNms):
+
+    def __RunStatsPasses(self,windows,runNdxs):
+
+        # Commands of runNdxs that need statistics over the whole extent
+        # of their input field get them from passes over every window
+        # (None for the whole grid) of the commands that produce that
+        # field. Fields are not compacted in these passes, so that the
+        # statistics are over each field's own valid cells.
+
+        cmds = self.myProg.orderedCmds
+
+        statInFldNms = {} # input field needing global statistics, by command index
+        for ndx in runNdxs:
+            if self.myProg.GetAliasedFldNm(cmds[ndx]) is not None:
+                continue
+            inFldNm = self.__GetGlobalStatsInFldNm(cmds[ndx])
+            if inFldNm is not None:
+                statInFldNms[ndx] = inFldNm
+
+        unresolvedNdxs = set(statInFldNms.keys())
+        while len(unresolvedNdxs) > 0:
+
+            # The statistics of a command's input can be found once no
+            # command producing that input is itself waiting on statistics.
+
+            passNdxs = []
+            for ndx in sorted(unresolvedNdxs):
+                ancestorNdxs = self.__GetAncestorNdxs(self.myProg.GetCmdDependencies()[ndx])
+                if len(unresolvedNdxs.intersection(ancestorNdxs)) == 0:
+                    passNdxs.append(ndx)
+
+            statFldNms = []
+            meanToMidFldNms = []
+            for ndx in passNdxs:
+                if statInFldNms[ndx] not in statFldNms:
+                    statFldNms.append(statInFldNms[ndx])
+                if cmds[ndx].GetCommandName() == 'MEANTOMID' and statInFldNms[ndx] not in meanToMidFldNms:
+                    meanToMidFldNms.append(statInFldNms[ndx])
+
+            if self.verbose:
+                print('  Statistics pass for: %s'%', '.join(statFldNms))
+
+            compact = self.myCmdRunner.compact
+            self.myCmdRunner.SetCompact(False)
+            try:
+                self.__RunStatsPass(windows,statFldNms,meanToMidFldNms)
+            finally:
+                self.myCmdRunner.SetCompact(compact)
+            unresolvedNdxs.difference_update(passNdxs)
+
+        # while len(unresolvedNdxs) > 0:
+
+    # def __RunStatsPasses(self,windows,runNdxs):
+
+    def __RunProgramTiled(self):
+
+        # Runs the program one window at a time. Commands that need
+        # statistics over the whole extent of their input field first
+        # get them from statistics passes (see __RunStatsPasses()). A
+        # final pass runs the whole program and writes each window of
+        # the output fields.
+
+        windows = self.__GetTileWindows()
+        runNdxs = self.__GetRunNdxs()
+
+        self.__RunStatsPasses(windows,runNdxs)
+
+        if self.workerCnt > 1 and self.poolType == 'process':
+            self.__RunWindowsInProcesses(windows,runNdxs)
+
+        else:
+            for window in windows:
+                if self.verbose:
+                    print('  Window rows %d:%d, columns %d:%d'%(
+                        window[0].start,window[0].stop,window[1].start,window[1].stop))
+
+                self.myCmdRunner.SetWindow(window)
+                self.__RunCmds(runNdxs)
+                self.myCmdRunner._WriteWindowToFiles()
+
+        self.myCmdRunner.SetWindow(None)
+
+    # def __RunProgramTiled(self):
+
+    def __RunWindowsInProcesses(self,windows,runNdxs):
+
+        # Runs the windows of a tiled run on a pool of worker processes.
+        # The input fields are first staged window by window in
+        # memory-mapped buffers, which the workers attach to. Workers
+        # write their output windows to shared output buffers, and those
+        # are written to the output files here, again window by window.
+
+        cmds = self.myProg.orderedCmds
+        cmdList = []
+        for ndx in runNdxs:
+            cmdList.append((
+                cmds[ndx].GetCommandString(),
+                self.__GetCmdParams(cmds[ndx]),
+                self.myProg.GetAliasedFldNm(cmds[ndx])
+                ))
+
+        readNdxs = []
+        readFldNms = []
+        for ndx in runNdxs:
+            if cmds[ndx].IsReadCmd():
+                readNdxs.append(ndx)
+                readFldNms += self.myProg.GetDefinedFieldNms(cmds[ndx])
+
+        rowCnt = windows[-1][0].stop
+        colCnt = windows[-1][1].stop
+
+        bufferDir = tempfile.mkdtemp(prefix='EEMS')
+        try:
+            bufferRunner = EEMSBufferCmdRunner(bufferDir)
+            bufferRunner.SetDtype(self.myCmdRunner.dtype)
+            bufferRunner.SetFuzzyFlds(self.myCmdRunner.fuzzyFldNms)
+            bufferRunner.SetReadSrcFlds(self.myCmdRunner.readSrcFldNms)
+            bufferRunner.SetSharedMask(self.myCmdRunner.sharedMask)
+            bufferRunner.SetKernelBackend(self.myCmdRunner.kernelBackend)
+
+            if self.verbose: print('  Staging input fields')
+            for window in windows:
+                self.myCmdRunner.SetWindow(window)
+                self.__RunCmds(readNdxs,readFldNms)
+                bufferRunner.SetWindow(window)
+                for fldNm in readFldNms:
+                    bufferRunner.StoreInFld(fldNm,self.myCmdRunner._GetGridData(fldNm,True),rowCnt,colCnt)
+
+            # The first window is run here to find the types of the
+            # output fields, so their buffers can be made.
+
+            bufferRunner.fldStats.update(self.myCmdRunner.fldStats)
+            bufferRunner.SetWindow(windows[0])
+            for cmdStr,cmdParams,aliasedFldNm in cmdList:
+                if aliasedFldNm is not None:
+                    self._AddAliasFld(bufferRunner,EEMSCmd(cmdStr),cmdParams,aliasedFldNm)
+                else:
+                    self._DispatchCmd(bufferRunner,EEMSCmd(cmdStr),cmdParams)
+
+            for fldNm,fld in bufferRunner.EEMSFlds.items():
+                if fld['outFNm'] != 'NONE' and fldNm not in readFldNms:
+                    bufferRunner.AddOutBuffer(fldNm,fld['outFNm'],fld['data'],rowCnt,colCnt)
+            bufferRunner._WriteWindowToFiles()
+
+            # Each worker gets a share of the remaining windows
+
+            chunkCnt = min(len(windows)-1,self.workerCnt*4)
+            windowChunks = [windows[1+ndx::chunkCnt] for ndx in range(chunkCnt)]
+
+            if self.verbose: print('  Running %d windows on %d processes'%(len(windows),self.workerCnt))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workerCnt) as pool:
+                futures = []
+                for windowChunk in windowChunks:
+                    futures.append(pool.submit(
+                        _RunWindowsInWorker,
+                        bufferDir,
+                        bufferRunner.inBuffers,
+                        bufferRunner.outBuffers,
+                        self.myCmdRunner.dtype,
+                        self.myCmdRunner.kernelBackend,
+                        self.myCmdRunner.useBufferPool,
+                        self.myCmdRunner.sharedMask,
+                        self.myCmdRunner.fuzzyFldNms,
+                        self.myCmdRunner.readSrcFldNms,
+                        self.myCmdRunner.fldStats,
+                        cmdList,
+                        windowChunk
+                        ))
+                for future in futures:
+                    future.result()
+
+            # Reading the window again restores whatever the cmdRunner
+            # keeps from reading (e.g. masks) for writing the window.
+
+            if self.verbose: print('  Writing output fields')
+            for window in windows:
+                self.myCmdRunner.SetWindow(window)
+                self.__RunCmds(readNdxs,readFldNms)
+                bufferRunner.SetWindow(window)
+                for fldNm,buffer in bufferRunner.outBuffers.items():
+                    self.myCmdRunner._AddFieldToEEMSFlds(
+                        buffer['outFNm'],
+                        fldNm,
+                        bufferRunner._ReadBufferWindow(buffer)
+                        )
+                self.myCmdRunner._WriteWindowToFiles()
+
+        finally:
+            shutil.rmtree(bufferDir,ignore_errors=True)
+
+    # def __RunWindowsInProcesses(self,windows,runNdxs):
+
+    def __GetFldSigs(self,cmdNdxs):
+
+        # A signature for the field(s) defined by each command in
+        # cmdNdxs: a hash of the command, its parameters as they will be
+        # run, and the signatures of its input fields. A field's
+        # signature changes when anything upstream of it changes. READs
+        # include the modification time of their input file. As with
+        # cache keys, the output file is left out: it changes where a
+        # field is written, not its values.
+
+        fldSigs = {}
+
+        for cmd in self.myProg.orderedCmds:
+
+            cmdParams = self.__GetCmdParams(cmd,quiet=True)
+            sigParams = [paramItem for paramItem in sorted(cmdParams.items()) if paramItem[0] != 'OutFileName']
+            sigItems = [cmd.GetCommandName(),sigParams]
+
+            if cmd.IsReadCmd() and os.path.exists(cmdParams['InFileName']):
+                sigItems.append(os.path.getmtime(cmdParams['InFileName']))
+
+            for fldNm in self.myProg.GetDependFieldNms(cmd):
+                sigItems.append(fldSigs[fldNm])
+
+            cmdSig = hashlib.sha1(repr(sigItems).encode()).hexdigest()
+
+            for fldNm in self.myProg.GetDefinedFieldNms(cmd):
+                fldSigs[fldNm] = cmdSig
+
+        rtrnSigs = {}
+        for ndx in cmdNdxs:
+            for fldNm in self.myProg.GetDefinedFieldNms(self.myProg.orderedCmds[ndx]):
+                rtrnSigs[fldNm] = fldSigs[fldNm]
+
+        return rtrnSigs
+
+    # def __GetFldSigs(self,cmdNdxs):
+
+    def RunProgram(self):
+
+        if self.verbose: print('Running Commands:')
+
+        self.myCmdRunner.SetFuzzyFlds(self.myProg.GetFuzzyFldNms())
+        self.myCmdRunner.SetReadSrcFlds(self.myProg.GetReadSrcFldNms())
+
+        if self.tileSize is not None:
+            if self.scenarios is not None:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Scenarios cannot be run tiled.\n')
+
+            self.__RunProgramTiled()
+            self.fldSigs = None # fields are not kept between windows
+        else:
+            runNdxs = self.__GetRunNdxs()
+            if self.myCmdRunner.compact:
+                # Compacting drops cells valid in some fields, so the
+                # statistics over the whole grid come from a pass
+                # before it
+                self.__RunStatsPasses([None],runNdxs)
+                self.myCmdRunner.SetWindow(None)
+            self.__RunCmds(runNdxs,self.__GetKeepFldNms())
+            self.fldSigs = self.__GetFldSigs(runNdxs)
+
+        if self.scenarios is not None:
+            self.myCmdRunner.SplitScenarioFlds(list(self.scenarios.keys()))
+            self.fldSigs = None # split fields are not those of the program
 
         if self.verbose: print('  Finish()')
         self.myCmdRunner.Finish() # finish final tasks
 
     # def RunProgram(self):
+
+    def RerunProgram(self,EEMSProgFNm):
+
+        # Runs a new version of the program (typically the same .eem
+        # file after editing) using the fields left in the cmdRunner
+        # by the last run. Only commands whose parameters or inputs
+        # have changed are run, along with any unchanged commands
+        # whose fields they need, or that are now written, and that
+        # were dropped (see SetFreeIntermediateFlds()). Fields kept
+        # from the last run are written to their output files in the
+        # new program.
+        #
+        # If a READ has changed, or the last run was tiled, the whole
+        # program is run again, as it is with compact fields if a
+        # command to run needs statistics over the whole grid, or
+        # produces a field they are taken of. With target fields (see
+        # SetTargetFlds()) only the commands they need are considered.
+
+        self.myProg = EEMSProgram(EEMSProgFNm)
+        self.myProg.SetCrntCmdToFirst()
+        self.myProg.SetUniqueFlds(self.__GetScenarioFldNms())
+        self.myCmdRunner.SetFuzzyFlds(self.myProg.GetFuzzyFldNms())
+        self.myCmdRunner.SetReadSrcFlds(self.myProg.GetReadSrcFldNms())
+
+        cmds = self.myProg.orderedCmds
+        EEMSFlds = self.myCmdRunner.EEMSFlds
+
+        runNdxs = [] # commands to run
+        changedNdxs = [] # commands that differ from the last run
+        if self.fldSigs is not None:
+            neededNdxs = self.__GetRunNdxs()
+            fldSigs = self.__GetFldSigs(neededNdxs)
+
+            for ndx in neededNdxs:
+                for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                    if fldNm not in self.fldSigs or self.fldSigs[fldNm] != fldSigs[fldNm]:
+                        runNdxs.append(ndx)
+                        break
+            changedNdxs = list(runNdxs)
+
+            # Unchanged commands must be run again if fields they define
+            # are written or needed, and are gone. Working back from the
+            # end picks up chains of these.
+            dependNdxs = self.myProg.GetCmdDependencies()
+            runNdxSet = set(runNdxs)
+            for ndx in neededNdxs:
+                if self.__GetCmdParams(cmds[ndx],quiet=True).get('OutFileName','NONE') == 'NONE':
+                    continue
+                for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                    if fldNm not in EEMSFlds:
+                        runNdxSet.add(ndx)
+                        break
+            for ndx in range(len(cmds)-1,-1,-1):
+                if ndx not in runNdxSet:
+                    continue
+                for dependNdx in dependNdxs[ndx]:
+                    if dependNdx in runNdxSet:
+                        continue
+                    for fldNm in self.myProg.GetDefinedFieldNms(cmds[dependNdx]):
+                        if fldNm not in EEMSFlds:
+                            runNdxSet.add(dependNdx)
+                            break
+            runNdxs = sorted(runNdxSet)
+
+        # if self.fldSigs is not None:
+
+        # With compact fields, statistics over the whole grid are taken
+        # before compacting (see RunProgram()), which a partial run
+        # cannot do.
+        rerunAll = self.fldSigs is None or True in [cmds[ndx].IsReadCmd() for ndx in changedNdxs]
+        if self.myCmdRunner.compact:
+            for ndx in runNdxs:
+                if self.__GetGlobalStatsInFldNm(cmds[ndx]) is not None:
+                    rerunAll = True
+                for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                    if fldNm in self.myCmdRunner.fldStats:
+                        rerunAll = True
+
+        if rerunAll:
+            if self.verbose: print('Rerunning all commands')
+            self.myCmdRunner.SetWindow(None) # drops the fields of the last run
+            self.RunProgram()
+            return
+
+        if self.verbose: print('Rerunning %d of %d commands:'%(len(runNdxs),len(cmds)))
+
+        # Drop the fields that are to be recomputed or that are no
+        # longer in the program (or no longer needed for the targets).
+        for fldNm in list(EEMSFlds.keys()):
+            if fldNm not in fldSigs:
+                self.myCmdRunner.RemoveField(fldNm)
+        for ndx in runNdxs:
+            for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                if fldNm in EEMSFlds:
+                    self.myCmdRunner.RemoveField(fldNm)
+
+        # The fields kept are written where the new program writes them
+        for ndx in neededNdxs:
+            outFNm = self.__GetCmdParams(cmds[ndx],quiet=True).get('OutFileName','NONE')
+            for fldNm in self.myProg.GetDefinedFieldNms(cmds[ndx]):
+                if fldNm in EEMSFlds:
+                    EEMSFlds[fldNm]['outFNm'] = outFNm
+
+        self.__RunCmds(runNdxs,self.__GetKeepFldNms())
+        self.fldSigs = fldSigs
+
+        if self.verbose: print('  Finish()')
+        self.myCmdRunner.Finish() # finish final tasks
+
+    # def RerunProgram(self,EEMSProgFNm):
+
+    @staticmethod
+    def _AddAliasFld(cmdRunner,cmd,cmdParams,aliasedFldNm):
+
+        # Adds cmd's field, an alias of aliasedFldNm, sharing its data
+
+        fld = cmdRunner.EEMSFlds[aliasedFldNm]
+        if aliasedFldNm in cmdRunner.scenarioFldNms:
+            cmdRunner._AddScenarioFieldToEEMSFlds(cmdParams['OutFileName'],cmd.GetResultName(),fld['data'])
+        else:
+            cmdRunner._AddFieldToEEMSFlds(cmdParams['OutFileName'],cmd.GetResultName(),fld['data'])
+
+        # The alias shares the statistics of the field too
+        cmdRunner.fldStatCache[cmd.GetResultName()] = cmdRunner.fldStatCache.setdefault(aliasedFldNm,{})
+
+    # def _AddAliasFld(cmdRunner,cmd,cmdParams,aliasedFldNm):
+
+    @staticmethod
+    def _DispatchCmd(cmdRunner,cmd,cmdParams):
+
+        # Calls the cmdRunner method that implements cmd
+
+        cmdNm = cmd.GetCommandName()
+
+        if cmdNm == 'READ':
+            cmdRunner.Read(
+                cmdParams['InFileName'],
+                cmdParams['InFieldName'],
+                cmdParams['OutFileName'],
+                cmdParams['NewFieldName'],
+                )
+
+        elif cmdNm == 'READMULTI':
+            cmdRunner.ReadMulti(
+                cmdParams['InFileName'],
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmdParams['NewFieldNames'],
+                )
+
+        elif cmdNm == 'CVTTOFUZZY':
+            cmdRunner.CvtToFuzzy(
+                cmdParams['InFieldName'],
+                cmdParams['TrueThreshold'],
+                cmdParams['FalseThreshold'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'CVTTOFUZZYCURVE':
+            cmdRunner.CvtToFuzzyCurve(
+                cmdParams['InFieldName'],
+                cmdParams['RawValues'],
+                cmdParams['FuzzyValues'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'CVTTOFUZZYCAT':
+            cmdRunner.CvtToFuzzyCat(
+                cmdParams['InFieldName'],
+                cmdParams['RawValues'],
+                cmdParams['FuzzyValues'],
+                cmdParams['DefaultFuzzyValue'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'COPYFIELD':
+            cmdRunner.CopyField(
+                cmdParams['InFieldName'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'NOT':
+            cmdRunner.FuzzyNot(
+                cmdParams['InFieldName'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'OR':
+            cmdRunner.FuzzyOr(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'AND':
+            cmdRunner.FuzzyAnd(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'EMDSAND':
+            cmdRunner.FuzzyEMDSAnd(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'ORNEG':
+            cmdRunner.FuzzyOrNeg(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'XOR':
+            cmdRunner.FuzzyXOr(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'SUM':
+            cmdRunner.SumFlds(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'MIN':
+            cmdRunner.MinFlds(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'MAX':
+            cmdRunner.MaxFlds(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'MEAN':
+            cmdRunner.MeanFlds(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'UNION':
+            cmdRunner.FuzzyUnion(
+                cmdParams['InFieldNames'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'DIF':
+            cmdRunner.DifFlds(
+                cmdParams['StartingFieldName'],
+                cmdParams['ToSubtractFieldName'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'SELECTEDUNION':
+            cmdRunner.FuzzySelectedUnion(
+                cmdParams['InFieldNames'],
+                cmdParams['TruestOrFalsest'],
+                cmdParams['NumberToConsider'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'WTDUNION':
+            cmdRunner.FuzzyWeightedUnion(
+                cmdParams['InFieldNames'],
+                cmdParams['Weights'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'WTDEMDSAND':
+            cmdRunner.FuzzyEMDSWeightedAnd(
+                cmdParams['InFieldNames'],
+                cmdParams['Weights'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'WTDMEAN':
+            cmdRunner.WeightedMean(
+                cmdParams['InFieldNames'],
+                cmdParams['Weights'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'WTDSUM':
+            cmdRunner.WeightedSum(
+                cmdParams['InFieldNames'],
+                cmdParams['Weights'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+            
+        elif cmdNm == 'CALLEXTERN':
+            cmdRunner.CallExtern(
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'MEANTOMID':
+            cmdRunner.MeanToMid(
+                cmdParams['InFieldName'],
+                cmdParams['IgnoreZeros'],
+                cmdParams['FuzzyValues'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'SCORERANGEBENEFIT':
+            cmdRunner.ScoreRangeBenefit(
+                cmdParams['InFieldName'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+                )
+
+        elif cmdNm == 'SCORERANGECOST':
+            cmdRunner.ScoreRangeCost(
+                cmdParams['InFieldName'],
+                cmdParams['OutFileName'],
+                cmd.GetResultName()
+            )
+
+        else:
+            raise Exception(
+                'ERROR: Unable to interpret command:\n'+
+                '  %s'%cmd.GetCommandString()
+                )
+
+        # if cmdNm == 'READ'...elif...else:
+
+    # def _DispatchCmd(cmdRunner,cmd,cmdParams):
     
     def PrintCmdTree(self):
         print(self.myProg.GetCmdTreeAsString())
@@ -2650,6 +5935,70 @@ class EEMSInterpreter(object):
 # class EEMSInterpreter(object):
 ######################################################################
 
+def _RunCmdInWorker(cmdRunnerClass,dtype,kernelBackend,broadcastFlds,fuzzyFldNms,invalidMask,readSrcFldNms,readMasks,arrayShape,cmdStr,cmdParams,inFlds,inFldStats):
+    # Runs one command in a worker process for EEMSInterpreter.SetParallel().
+    # The command is run by a new cmdRunner holding only its input
+    # fields. The fields it creates are returned to the parent process.
+    # invalidMask is the parent's shared mask (None if it has no invalid
+    # cells), or False without shared masks. readMasks are the masks of
+    # the fields read that the input fields come from.
+
+    cmdRunner = cmdRunnerClass()
+    cmdRunner.SetDtype(dtype)
+    cmdRunner.SetKernelBackend(kernelBackend)
+    cmdRunner.SetBroadcastFlds(broadcastFlds)
+    cmdRunner.SetFuzzyFlds(fuzzyFldNms)
+    cmdRunner.SetReadSrcFlds(readSrcFldNms)
+    if invalidMask is not False:
+        cmdRunner.SetSharedMask(True)
+        cmdRunner.invalidMask = invalidMask
+        cmdRunner.readMasks = readMasks
+    cmdRunner.arrayShape = arrayShape
+    cmdRunner.EEMSFlds.update(inFlds)
+    cmdRunner.fldStats.update(inFldStats)
+
+    EEMSInterpreter._DispatchCmd(cmdRunner,EEMSCmd(cmdStr),cmdParams)
+
+    newFlds = {}
+    for fldNm,fld in cmdRunner.EEMSFlds.items():
+        if fldNm not in inFlds:
+            newFlds[fldNm] = fld
+
+    return newFlds
+
+# def _RunCmdInWorker(cmdRunnerClass,dtype,kernelBackend,broadcastFlds,fuzzyFldNms,invalidMask,readSrcFldNms,readMasks,arrayShape,cmdStr,cmdParams,inFlds,inFldStats):
+######################################################################
+
+def _RunWindowsInWorker(bufferDir,inBuffers,outBuffers,dtype,kernelBackend,useBufferPool,sharedMask,fuzzyFldNms,readSrcFldNms,fldStats,cmdList,windows):
+    # Runs the whole program over some windows of a tiled run in a
+    # worker process. Fields are read from and written to the shared
+    # buffers of an EEMSBufferCmdRunner.
+
+    cmdRunner = EEMSBufferCmdRunner(bufferDir,inBuffers,outBuffers)
+    cmdRunner.SetDtype(dtype)
+    cmdRunner.SetKernelBackend(kernelBackend)
+    cmdRunner.SetBufferPool(useBufferPool)
+    cmdRunner.SetSharedMask(sharedMask)
+    cmdRunner.SetFuzzyFlds(fuzzyFldNms)
+    cmdRunner.SetReadSrcFlds(readSrcFldNms)
+    cmdRunner.fldStats.update(fldStats)
+
+    cmds = []
+    for cmdStr,cmdParams,aliasedFldNm in cmdList:
+        cmds.append((EEMSCmd(cmdStr),cmdParams,aliasedFldNm))
+
+    for window in windows:
+        cmdRunner.SetWindow(window)
+        for cmd,cmdParams,aliasedFldNm in cmds:
+            if aliasedFldNm is not None:
+                EEMSInterpreter._AddAliasFld(cmdRunner,cmd,cmdParams,aliasedFldNm)
+            else:
+                EEMSInterpreter._DispatchCmd(cmdRunner,cmd,cmdParams)
+        cmdRunner._WriteWindowToFiles()
+
+# def _RunWindowsInWorker(bufferDir,inBuffers,outBuffers,dtype,kernelBackend,useBufferPool,sharedMask,fuzzyFldNms,readSrcFldNms,fldStats,cmdList,windows):
+######################################################################
+
 ######################################################################
 # EEMSUtils
 ######################################################################
@@ -0,0 +1,357 @@
+######################################################################
+# EEMS Kernels
+######################################################################
+# Loop-based kernels for the fuzzy operators of EEMSCmdRunnerBase,
+# compiled with Numba. See EEMSCmdRunnerBase.SetKernelBackend().
+#
+# The NumPy versions of these operators take several passes over the
+# fields, with temporaries the size of a field or a block. Here each
+# cell's value is computed in one pass, with the clamping to fuzzy
+# range, the masking and, for SELECTEDUNION and XOR, the selection
+# done along the way. The cells are split into blocks that are run in
+# parallel.
+#
+# The kernels give the same values as the NumPy versions: the steps
+# are done in the same order and in the same types, and the cells np.ma
+# arithmetic masks (e.g. results of a division that are not finite) are
+# masked.
+#
+# Each kernel is compiled twice. Started from the main thread, it runs
+# its blocks in parallel. Started from another thread (e.g. from a
+# thread pool, see EEMSInterpreter.SetParallel()), where commands are
+# already run in parallel, it runs them one after another. Only the
+# main thread then uses Numba's threading layer, so kernels can be
+# started from several threads at once whatever the layer.
+#
+# Arrays are flat (see EEMSCmdRunnerBase._GetKernelArrays()), and
+# inMasks go with inDatas. A mask of length 0 stands for no mask, so
+# outMask is empty when the result has no mask (see
+# EEMSCmdRunnerBase.SetSharedMask()). Lists of arrays are passed to the
+# compiled kernels as Numba typed lists (see GetArrayList()).
+#
+# This module needs Numba. EEMSBasePackage3 runs without it, using the
+# NumPy versions.
+#
+# File History
+#
+# 2026.10.16
+#
+# Added CvtToFuzzyCurve(), ReduceArrays(), SelectedMean() and XOr().
+######################################################################
+
+import threading
+import types as pytypes
+import numpy as np
+from numba import njit, prange, types, from_dtype
+from numba.typed import List
+
+# Cells per block. Blocks are run in parallel.
+BlockCellCnt = 4096
+
+# Reductions of ReduceArrays(), by the names EEMSCmdRunnerBase uses
+ReduceCodes = {'min':0,'max':1,'sum':2,'mean':3,'emdsand':4}
+
+def GetArrayList(arrs,dtype):
+    # arrs, flat arrays of dtype, as a typed list
+    arrList = List.empty_list(types.Array(from_dtype(np.dtype(dtype)),1,'C'))
+    for arr in arrs:
+        arrList.append(arr)
+    return arrList
+# def GetArrayList(arrs,dtype):
+
+def CompileKernel(pyFunc):
+    # The parallel and the serial version of kernel pyFunc. The serial
+    # one is compiled from a copy of pyFunc under another name, so that
+    # the two are cached apart.
+    serialFunc = pytypes.FunctionType(
+        pyFunc.__code__,pyFunc.__globals__,pyFunc.__name__+'Serial',pyFunc.__defaults__,pyFunc.__closure__)
+    serialFunc.__qualname__ = pyFunc.__qualname__+'Serial'
+    return njit(parallel=True,cache=True)(pyFunc),njit(cache=True)(serialFunc)
+# def CompileKernel(pyFunc):
+
+def GetKernel(kernels):
+    # The version of kernels, from CompileKernel(), for this thread
+    if threading.current_thread() is threading.main_thread():
+        return kernels[0]
+    return kernels[1]
+# def GetKernel(kernels):
+
+def _CvtToFuzzyCurve(inData,inMask,rawArr,segSlopes,segIntercepts,outData,outMask):
+    cellCnt = inData.shape[0]
+    pointCnt = rawArr.shape[0]
+    for blockNdx in prange((cellCnt + BlockCellCnt - 1) // BlockCellCnt):
+        blockEnd = min(cellCnt,(blockNdx + 1) * BlockCellCnt)
+        for cellNdx in range(blockNdx * BlockCellCnt,blockEnd):
+            x = np.float64(inData[cellNdx])
+            if np.isnan(x):
+                outData[cellNdx] = x
+            else:
+                # the segment: the number of raw values below x
+                lowNdx = 0
+                highNdx = pointCnt
+                while lowNdx < highNdx:
+                    midNdx = (lowNdx + highNdx) // 2
+                    if rawArr[midNdx] < x:
+                        lowNdx = midNdx + 1
+                    else:
+                        highNdx = midNdx
+                x = min(max(x,rawArr[0]),rawArr[pointCnt-1])
+                outData[cellNdx] = x * segSlopes[lowNdx] + segIntercepts[lowNdx]
+
+            if outData[cellNdx] > 1.0:
+                outData[cellNdx] = 1.0
+            elif outData[cellNdx] < -1.0:
+                outData[cellNdx] = -1.0
+
+            if outMask.shape[0] > 0:
+                outMask[cellNdx] = inMask.shape[0] > 0 and inMask[cellNdx]
+
+# def _CvtToFuzzyCurve(inData,inMask,rawArr,segSlopes,segIntercepts,outData,outMask):
+
+_CvtToFuzzyCurveKernels = CompileKernel(_CvtToFuzzyCurve)
+
+def CvtToFuzzyCurve(inData,inMask,rawArr,segSlopes,segIntercepts,outData,outMask):
+    # EEMSCmdRunnerBase._CvtToFuzzyCurveArray(): the line of each cell's
+    # segment is applied in float64, and the result clamped in the
+    # type of outData.
+    GetKernel(_CvtToFuzzyCurveKernels)(inData,inMask,rawArr,segSlopes,segIntercepts,outData,outMask)
+# def CvtToFuzzyCurve(inData,inMask,rawArr,segSlopes,segIntercepts,outData,outMask):
+
+def _ReduceArrays(reduceCode,inDatas,inMasks,weights,meanDivisor,consts,clampFuzzy,outData,outMask):
+    cellCnt = outData.shape[0]
+    inCnt = len(inDatas)
+    for blockNdx in prange((cellCnt + BlockCellCnt - 1) // BlockCellCnt):
+        blockStart = blockNdx * BlockCellCnt
+        blockEnd = min(cellCnt,blockStart + BlockCellCnt)
+        blockCellCnt = blockEnd - blockStart
+
+        # The block's min (max) and sum are kept apart for emdsand
+        minBlock = np.empty(blockCellCnt,dtype=outData.dtype)
+        sumBlock = np.empty(blockCellCnt,dtype=outData.dtype)
+
+        for inNdx in range(inCnt):
+            inData = inDatas[inNdx]
+
+            if reduceCode in (0,1,4):
+                if inNdx == 0:
+                    for ndx in range(blockCellCnt):
+                        minBlock[ndx] = inData[blockStart+ndx]
+                else:
+                    for ndx in range(blockCellCnt):
+                        # take the input unless the min (max) is
+                        # strictly less (greater), as NaNs are taken
+                        inVal = inData[blockStart+ndx]
+                        if reduceCode == 1:
+                            if not minBlock[ndx] > inVal:
+                                minBlock[ndx] = inVal
+                        elif not minBlock[ndx] < inVal:
+                            minBlock[ndx] = inVal
+
+            if reduceCode in (2,3,4):
+                if weights.shape[0] == 0:
+                    if inNdx == 0:
+                        for ndx in range(blockCellCnt):
+                            sumBlock[ndx] = inData[blockStart+ndx]
+                    else:
+                        for ndx in range(blockCellCnt):
+                            sumBlock[ndx] = sumBlock[ndx] + inData[blockStart+ndx]
+                else:
+                    weight = weights[inNdx]
+                    if inNdx == 0:
+                        for ndx in range(blockCellCnt):
+                            sumBlock[ndx] = inData[blockStart+ndx] * weight
+                    else:
+                        for ndx in range(blockCellCnt):
+                            sumBlock[ndx] = sumBlock[ndx] + inData[blockStart+ndx] * weight
+
+        # for inNdx in range(inCnt):
+
+        for ndx in range(blockCellCnt):
+            cellNdx = blockStart + ndx
+
+            # np.ma masks infinite means, and, for emdsand, the cells
+            # where (mean - min) * (min + 1) / 2 is not finite
+            isDomainMasked = False
+
+            if reduceCode in (3,4):
+                # the division in float64, as np.ma has it
+                sumBlock[ndx] = np.float64(sumBlock[ndx]) / meanDivisor
+                if reduceCode == 3:
+                    isDomainMasked = np.isinf(sumBlock[ndx])
+
+            if reduceCode == 4:
+                # min + (mean - min) * (min + 1) / 2
+                sumBlock[ndx] = (sumBlock[ndx] - minBlock[ndx]) * (minBlock[ndx] + consts[0])
+                sumBlock[ndx] = sumBlock[ndx] / consts[1]
+                isDomainMasked = not np.isfinite(sumBlock[ndx])
+                outData[cellNdx] = minBlock[ndx] + sumBlock[ndx]
+            elif reduceCode in (0,1):
+                outData[cellNdx] = minBlock[ndx]
+            else:
+                outData[cellNdx] = sumBlock[ndx]
+
+            if clampFuzzy:
+                if outData[cellNdx] > 1.0:
+                    outData[cellNdx] = 1.0
+                elif outData[cellNdx] < -1.0:
+                    outData[cellNdx] = -1.0
+
+            if outMask.shape[0] > 0:
+                isMasked = isDomainMasked
+                for inMask in inMasks:
+                    if inMask.shape[0] > 0 and inMask[cellNdx]:
+                        isMasked = True
+                        break
+                outMask[cellNdx] = isMasked
+
+        # for ndx in range(blockCellCnt):
+
+# def _ReduceArrays(reduceCode,inDatas,inMasks,weights,meanDivisor,consts,clampFuzzy,outData,outMask):
+
+_ReduceArraysKernels = CompileKernel(_ReduceArrays)
+
+def ReduceArrays(reduceNm,inDatas,inMasks,weights,meanDivisor,clampFuzzy,outData,outMask):
+    # EEMSCmdRunnerBase._ReduceArrays(). inDatas are of the type of
+    # outData, as are weights (empty for no weights).
+    consts = np.array([1,2],dtype=outData.dtype)
+    GetKernel(_ReduceArraysKernels)(
+        ReduceCodes[reduceNm],
+        GetArrayList(inDatas,outData.dtype),
+        GetArrayList(inMasks,bool),
+        weights,
+        meanDivisor,
+        consts,
+        clampFuzzy,
+        outData,
+        outMask
+        )
+# def ReduceArrays(reduceNm,inDatas,inMasks,weights,meanDivisor,clampFuzzy,outData,outMask):
+
+@njit(cache=True)
+def _IsAfter(val1,val2):
+    # val1 sorts after val2, NaNs last
+    if np.isnan(val2):
+        return False
+    return val1 > val2 or np.isnan(val1)
+
+@njit(cache=True)
+def _SortCell(cellVals,inDatas,inMasks,cellNdx):
+    # The cell's values from inDatas, masked ones as +inf, into
+    # cellVals sorted by insertion
+    for inNdx in range(len(inDatas)):
+        inMask = inMasks[inNdx]
+        if inMask.shape[0] > 0 and inMask[cellNdx]:
+            inVal = np.inf
+        else:
+            inVal = inDatas[inNdx][cellNdx]
+        sortNdx = inNdx
+        while sortNdx > 0 and _IsAfter(cellVals[sortNdx-1],inVal):
+            cellVals[sortNdx] = cellVals[sortNdx-1]
+            sortNdx -= 1
+        cellVals[sortNdx] = inVal
+
+def _SelectedMean(inDatas,inMasks,firstNdx,lastNdx,outData,outMask):
+    cellCnt = outData.shape[0]
+    for blockNdx in prange((cellCnt + BlockCellCnt - 1) // BlockCellCnt):
+        blockEnd = min(cellCnt,(blockNdx + 1) * BlockCellCnt)
+        cellVals = np.empty(len(inDatas),dtype=outData.dtype)
+        valSum = np.empty(1,dtype=outData.dtype) # the sum, in the type of outData
+        for cellNdx in range(blockNdx * BlockCellCnt,blockEnd):
+            _SortCell(cellVals,inDatas,inMasks,cellNdx)
+
+            # +inf is masked
+            valSum[0] = 0.0
+            valCnt = 0
+            for sortNdx in range(firstNdx,lastNdx+1):
+                if cellVals[sortNdx] != np.inf:
+                    valSum[0] += cellVals[sortNdx]
+                    valCnt += 1
+
+            # np.ma masks means that are not finite (e.g. of NaNs)
+            isMasked = valCnt == 0
+            if isMasked:
+                outData[cellNdx] = 0.0
+            else:
+                # the mean in float64, as np.ma has it
+                meanVal = np.float64(valSum[0]) / valCnt
+                isMasked = not np.isfinite(meanVal)
+                if meanVal > 1.0:
+                    meanVal = 1.0
+                elif meanVal < -1.0:
+                    meanVal = -1.0
+                outData[cellNdx] = meanVal
+
+            if outMask.shape[0] > 0:
+                outMask[cellNdx] = isMasked
+
+# def _SelectedMean(inDatas,inMasks,firstNdx,lastNdx,outData,outMask):
+
+_SelectedMeanKernels = CompileKernel(_SelectedMean)
+
+def SelectedMean(inDatas,inMasks,firstNdx,lastNdx,outData,outMask):
+    # EEMSCmdRunnerBase.FuzzySelectedUnion(): the mean of the values at
+    # sorted positions firstNdx to lastNdx of each cell, clamped.
+    GetKernel(_SelectedMeanKernels)(
+        GetArrayList(inDatas,outData.dtype),
+        GetArrayList(inMasks,bool),
+        firstNdx,
+        lastNdx,
+        outData,
+        outMask
+        )
+# def SelectedMean(inDatas,inMasks,firstNdx,lastNdx,outData,outMask):
+
+def _XOr(inDatas,inMasks,outData,outMask):
+    cellCnt = outData.shape[0]
+    inCnt = len(inDatas)
+    for blockNdx in prange((cellCnt + BlockCellCnt - 1) // BlockCellCnt):
+        blockEnd = min(cellCnt,(blockNdx + 1) * BlockCellCnt)
+        cellVals = np.empty(inCnt,dtype=outData.dtype)
+        for cellNdx in range(blockNdx * BlockCellCnt,blockEnd):
+            _SortCell(cellVals,inDatas,inMasks,cellNdx)
+            truest = cellVals[inCnt-1]
+            nextTruest = cellVals[inCnt-2]
+
+            # +inf is masked
+            isMasked = truest == np.inf or nextTruest == np.inf
+            if truest == -1.0:
+                xorVal = -1.0
+            else:
+                # Truest - (Truest - 2nd Truest) * (2nd Truest + 1) / (Truest + 1),
+                # in float64 but for the first difference, as np.ma has it.
+                # np.ma masks the quotient where it is not finite (e.g.
+                # of NaNs).
+                xorVal = np.float64(truest - nextTruest) * \
+                    (np.float64(nextTruest) + 1.0) / \
+                    (np.float64(truest) + 1.0)
+                if not np.isfinite(xorVal):
+                    isMasked = True
+                xorVal = np.float64(truest) - xorVal
+                if xorVal > 1.0:
+                    xorVal = 1.0
+                elif xorVal < -1.0:
+                    xorVal = -1.0
+
+            if isMasked:
+                outData[cellNdx] = 0.0
+            else:
+                outData[cellNdx] = xorVal
+
+            if outMask.shape[0] > 0:
+                outMask[cellNdx] = isMasked
+
+# def _XOr(inDatas,inMasks,outData,outMask):
+
+_XOrKernels = CompileKernel(_XOr)
+
+def XOr(inDatas,inMasks,outData,outMask):
+    # EEMSCmdRunnerBase.FuzzyXOr()
+    GetKernel(_XOrKernels)(
+        GetArrayList(inDatas,outData.dtype),
+        GetArrayList(inMasks,bool),
+        outData,
+        outMask
+        )
+# def XOr(inDatas,inMasks,outData,outMask):
+
+######################################################################
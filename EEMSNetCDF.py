@@ -8,8 +8,8 @@ import copy
 # import the classes needed to create a version of EEMS
 import re
 import numpy as np
-from EEMSBasePackage import EEMSCmdRunnerBase
-#from EEMSBasePackage import EEMSInterpreter
+from EEMSBasePackage3 import EEMSCmdRunnerBase
+#from EEMSBasePackage3 import EEMSInterpreter
 
 # Create the EEMSCmdRunner class, by overloading the
 # necessary methods from the EEMSCmdRunnerBase class.
@@ -24,6 +24,7 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
         super(EEMSCmdRunner,self).__init__()
         self.dimensions = None
         self.masterMask = None
+        self.outDSs = {} # output files open for tiled writing
 
     def _WriteFldsToFiles(self):
         # Create a map of files and fields
@@ -43,13 +44,13 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
 
                 for fldNm in outFldNms:
 
-                    fldData = self.EEMSFlds[fldNm]['data']
+                    fldData = self._GetGridData(fldNm)
 
                     outV = outDS.createVariable(
                         fldNm,
                         fldData.dtype,
-                        (self.dimensions.keys()),
-                        fill_value = self.GetFillValFromLU(fldData.dtype.char)
+                        tuple(self.dimensions.keys()),
+                        fill_value = self.GetFillValFromLU(fldData.dtype)
                         )
                     outV[:] = np.ma.masked_array(fldData, mask = self.masterMask)
 
@@ -61,14 +62,76 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
 
     # def _WriteFldsToFile(self):
 
+    def _WriteWindowToFiles(self):
+        # Tiled version of _WriteFldsToFiles(). Output files are created
+        # with the first window and kept open until Finish().
+
+        outFileMap = self._CreateOutFileMap()
+
+        for outFNm,outFldNms in outFileMap.items():
+
+            if outFNm == 'NONE': continue
+
+            if outFNm not in self.outDSs:
+                outDS = Dataset(outFNm,'w')
+                for dimNm,dimDict in self.dimensions.items():
+                    self.__DictToDimension(dimDict,outDS,dimNm)
+
+                for fldNm in outFldNms:
+                    fldData = self.EEMSFlds[fldNm]['data']
+                    outV = outDS.createVariable(
+                        fldNm,
+                        fldData.dtype,
+                        tuple(self.dimensions.keys()),
+                        fill_value = self.GetFillValFromLU(fldData.dtype)
+                        )
+                    setattr(outV,'long_name',fldNm)
+                    setattr(outV,'description','EEMS model result')
+
+                self.outDSs[outFNm] = outDS
+
+            # if outFNm not in self.outDSs:
+
+            for fldNm in outFldNms:
+                outV = self.outDSs[outFNm].variables[fldNm]
+                outV[self.__GetWindowNdx(outV)] = np.ma.masked_array(
+                    self._GetGridData(fldNm),
+                    mask = self.masterMask
+                    )
+
+        # for outFNm,outFldNms in outFileMap.items():
+
+    # def _WriteWindowToFiles(self):
+
+    def _GetValidMask(self):
+        # Cells not masked in any field read
+        if self.masterMask is None:
+            return None
+        return ~np.broadcast_to(self.masterMask,self.arrayShape)
+
+    def __GetWindowNdx(self,ncV):
+        # Index into a netCDF variable for the current window. Length 1
+        # dimensions, e.g. of a (y,1) broadcast field (see
+        # EEMSCmdRunnerBase.SetBroadcastFlds()), are taken whole.
+        if self.window is None:
+            return slice(None)
+        else:
+            gridShape = ncV.shape[-2:]
+            return (slice(None),) * (len(ncV.shape) - len(gridShape)) + tuple(
+                slice(None) if dimLen == 1 else dimSlice
+                for dimLen,dimSlice in zip(gridShape,self.window[2-len(gridShape):]))
+
     def GetFillValFromLU(self,dTypeNdx):
+        # dTypeNdx is a netCDF fill value name, a numpy type character
+        # or name, or a numpy dtype. For a numpy dtype the fill value is
+        # returned as that type, matching the field it is used with.
 
         DefaultFillValueLU = {
             'NC_FILL_BYTE':-127,
             'NC_FILL_UBYTE':255,
             'NC_FILL_CHAR':0,
             'NC_FILL_SHORT':-32767,
-            'NC_FILL_INT':-2147483647L,
+            'NC_FILL_INT':-2147483647,
             'NC_FILL_FLOAT':9.9692099683868690e+36,
             'NC_FILL_DOUBLE':9.9692099683868690e+36,
             'b':-127,
@@ -77,16 +140,19 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
             's':-32767,
             'f':9.9692099683868690e+36,
             'd':9.9692099683868690e+36,
-            'i':-2147483647L,
-            'l':-2147483647L,
+            'i':-2147483647,
+            'l':-2147483647,
             'int8':-127,
             'uint8':255,
             'int16':-32767,
             'float32':9.9692099683868690e+36,
             'float64':9.9692099683868690e+36,
-            'int32':-2147483647L
+            'int32':-2147483647
             }
 
+        if isinstance(dTypeNdx,np.dtype):
+            return dTypeNdx.type(DefaultFillValueLU[dTypeNdx.char])
+
         return DefaultFillValueLU[dTypeNdx]
 
     # def GetFillValFromLU(self,dTypeChar):
@@ -94,6 +160,23 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
 ########################################################################
 # Public methods
 ########################################################################
+    def GetFieldShape(self,inFileName,inFieldName):
+
+        with Dataset(inFileName,'r') as inDS:
+
+            if inFieldName not in inDS.variables:
+                raise Exception(
+                    '\n********************ERROR********************\n'+
+                    'Cannot read field *%s* from file %s.\n'%(inFieldName,inFileName))
+
+            return inDS.variables[inFieldName].shape
+
+    # def GetFieldShape(self,inFileName,inFieldName):
+
+    def SetWindow(self,window):
+        super(EEMSCmdRunner,self).SetWindow(window)
+        self.masterMask = None
+
     def ReadMulti(
         self,
         inFileName,
@@ -102,7 +185,7 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
         newFieldNames # substitute names for inFieldNames
         ):
 
-        if newFieldNames is not 'NONE':
+        if newFieldNames != 'NONE':
             inOutNames = dict(zip(inFieldNames,newFieldNames))
         else:
             inOutNames = dict(zip(inFieldNames,inFieldNames))
@@ -119,27 +202,33 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
                 inV = inDS.variables[inFldNm]
 
                 # Harvest the dimensions from the input. Will need these for output
-                # Assumption is that dimensions of all inputs are the same.
-                if self.dimensions is None:
-                    maskDims = []
+                # Assumption is that dimensions of all inputs are the same,
+                # or, with broadcast fields (see SetBroadcastFlds()), that
+                # those of the input with the most dimensions cover the rest.
+                if self.dimensions is None or len(inV.dimensions) > len(self.dimensions):
                     self.dimensions = OrderedDict()
                     for dimNm in inV.dimensions:
                         self.dimensions[dimNm] = self.__DimensionToDict(inDS.variables[dimNm])
-                        maskDims.append(self.dimensions[dimNm]['len'])
-                        
-                    self.masterMask = np.zeros(maskDims,dtype=bool)
                 # if self.dimesions is None:
 
-                if isinstance(inV[:],np.ma.masked_array):
-                    self.masterMask = np.ma.mask_or(self.masterMask,inV[:].mask)
-                    tmpMask = inV[:].mask
+                # Only the current window is read in a tiled run
+                inData = inV[self.__GetWindowNdx(inV)]
+
+                if self.masterMask is None:
+                    self.masterMask = np.zeros(inData.shape,dtype=bool)
+
+                if isinstance(inData,np.ma.masked_array):
+                    self.masterMask = np.ma.mask_or(self.masterMask,inData.mask)
+                    tmpMask = inData.mask
                 else:
                     tmpMask = False
 
+                # Floating point fields are read in as the dtype policy's
+                # type (see EEMSCmdRunnerBase.SetDtype())
                 self._AddFieldToEEMSFlds(
                     outFileName,
                     outFldNm,
-                    np.ma.masked_array(inV[:],mask=tmpMask,copy=True)
+                    np.ma.masked_array(inData,mask=tmpMask,dtype=self._GetFldDtype(inData.dtype),copy=True)
                     )
 
                 # if isinstance(inV[:],np.ma.masked_array):...else...
@@ -151,7 +240,13 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
     # def ReadMulti(...)
 
     def Finish(self):
-        self._WriteFldsToFiles()
+        if len(self.outDSs) > 0:
+            # tiled run, windows have already been written
+            for outDS in self.outDSs.values():
+                outDS.close()
+            self.outDSs = {}
+        else:
+            self._WriteFldsToFiles()
 
 ################################################################################
 
@@ -179,7 +274,7 @@ class EEMSCmdRunner(EEMSCmdRunnerBase):
             try:
                 setattr(dimV,attNm,attVal)
             except:
-                print 'attNm failed to copy: {}'.format(attNm)
+                print('attNm failed to copy: {}'.format(attNm))
 
         dimV[:] = dimDict['data']
 
@@ -1,8 +1,8 @@
-#! /opt/local/Library/Frameworks/Python.framework/Versions/2.7/bin/python
+#! /usr/bin/env python3
 # import modules needed
 
 from EEMSNetCDF import EEMSCmdRunner
-from EEMSBasePackage import EEMSInterpreter
+from EEMSBasePackage3 import EEMSInterpreter
 from sys import argv
 
 # ########################################################################
@@ -0,0 +1,601 @@
+######################################################################
+# Regression tests for EEMSBasePackage3
+######################################################################
+# Programs are run on an in-memory EEMSCmdRunner, with fields held in
+# a dictionary rather than read from files. Run with pytest.
+######################################################################
+
+import contextlib
+import io
+import os
+import re
+import numpy as np
+import pytest
+from EEMSBasePackage3 import EEMSCmdRunnerBase, EEMSInterpreter, EEMSProgram, EEMSResultCache
+
+def GetInFlds():
+    # Input fields with masked cells and NaN cells
+    rng = np.random.default_rng(0)
+    clim = np.ma.masked_array(rng.random((6,8)),mask=rng.random((6,8)) < 0.1)
+    clim[0,1] = np.nan
+    clim[3,4] = np.nan
+    elev = np.ma.masked_array(rng.random((6,8)) * 2000,mask=rng.random((6,8)) < 0.1)
+    return {'clim':clim,'elev':elev}
+# def GetInFlds():
+
+class MemCmdRunner(EEMSCmdRunnerBase):
+    # Reads fields from, and writes them to, dictionaries
+
+    def __init__(self,inFlds=None):
+        super(MemCmdRunner,self).__init__()
+        self.inFlds = inFlds if inFlds is not None else GetInFlds()
+        self.outFlds = {}
+
+    def GetFieldShape(self,inFileName,inFieldName):
+        return self.inFlds[inFieldName].shape
+
+    def ReadMulti(self,inFileName,inFieldNames,outFileName,newFieldNames):
+        if newFieldNames == 'NONE':
+            newFieldNames = inFieldNames
+        for inFldNm,newFldNm in zip(inFieldNames,newFieldNames):
+            inFld = self.inFlds[inFldNm]
+            if self.window is not None:
+                # length 1 dimensions are read whole, as EEMSNetCDF does
+                inFld = inFld[(Ellipsis,) + tuple(
+                    slice(None) if dimLen == 1 else dimSlice
+                    for dimLen,dimSlice in zip(inFld.shape[-2:],self.window))]
+            self._AddFieldToEEMSFlds(outFileName,newFldNm,inFld.copy())
+
+    def _WriteFldsToFiles(self):
+        for fldNm,fld in self.EEMSFlds.items():
+            if fld['outFNm'] != 'NONE':
+                self.outFlds[fldNm] = np.ma.array(self._GetGridData(fldNm))
+
+    def _WriteWindowToFiles(self):
+        gridShape = next(iter(self.inFlds.values())).shape[-2:]
+        for fldNm,fld in self.EEMSFlds.items():
+            if fld['outFNm'] != 'NONE':
+                fldData = self._GetGridData(fldNm)
+                if fldNm not in self.outFlds:
+                    self.outFlds[fldNm] = np.ma.masked_all(fldData.shape[:-2] + gridShape,dtype=fldData.dtype)
+                self.outFlds[fldNm][(Ellipsis,) + tuple(self.window)] = fldData
+
+    def Finish(self):
+        if self.window is None and len(self.outFlds) == 0:
+            self._WriteFldsToFiles()
+
+# class MemCmdRunner(EEMSCmdRunnerBase):
+
+def RunProgram(progStr,cmdRunner=None,**settings):
+    # The fields a program writes. settings are EEMSInterpreter
+    # settings, e.g. SharedMask=True for SetSharedMask(True).
+    if cmdRunner is None:
+        cmdRunner = MemCmdRunner()
+    myInterp = EEMSInterpreter(io.StringIO(progStr),cmdRunner)
+    for settingNm,settingVal in settings.items():
+        if isinstance(settingVal,tuple):
+            getattr(myInterp,'Set' + settingNm)(*settingVal)
+        else:
+            getattr(myInterp,'Set' + settingNm)(settingVal)
+    myInterp.RunProgram()
+    return cmdRunner.outFlds
+# def RunProgram(progStr,cmdRunner=None,**settings):
+
+def AssertSameFld(fldData1,fldData2):
+    # Same mask, and same values, NaNs included, in the unmasked cells
+    assert np.array_equal(np.ma.getmaskarray(fldData1),np.ma.getmaskarray(fldData2))
+    validMask = ~np.ma.getmaskarray(fldData1)
+    assert np.array_equal(
+        np.ma.getdata(fldData1)[validMask],
+        np.ma.getdata(fldData2)[validMask],
+        equal_nan=True)
+# def AssertSameFld(fldData1,fldData2):
+
+def AssertCloseFld(fldData1,fldData2):
+    # Same mask, and values equal but for rounding in the unmasked cells
+    assert np.array_equal(np.ma.getmaskarray(fldData1),np.ma.getmaskarray(fldData2))
+    validMask = ~np.ma.getmaskarray(fldData1)
+    assert np.allclose(
+        np.ma.getdata(fldData1)[validMask],
+        np.ma.getdata(fldData2)[validMask],
+        rtol=1e-12,atol=1e-12,equal_nan=True)
+# def AssertCloseFld(fldData1,fldData2):
+
+ReadProg = \
+    'READ(InFileName = in.nc, InFieldName = clim)\n' + \
+    'READ(InFileName = in.nc, InFieldName = elev)\n'
+
+def test_reordered_min_not_aliased():
+    # MIN and MAX depend on the order of their inputs at NaN cells, so
+    # the same inputs in another order are not the same command
+    outFlds = RunProgram(
+        ReadProg +
+        'm1 = MIN(InFieldNames = [clim, elev], OutFileName = out.nc)\n' +
+        'm2 = MIN(InFieldNames = [elev, clim], OutFileName = out.nc)\n' +
+        'x1 = MAX(InFieldNames = [clim, elev], OutFileName = out.nc)\n' +
+        'x2 = MAX(InFieldNames = [elev, clim], OutFileName = out.nc)\n')
+    aloneFlds = RunProgram(
+        ReadProg +
+        'm2 = MIN(InFieldNames = [elev, clim], OutFileName = out.nc)\n' +
+        'x2 = MAX(InFieldNames = [elev, clim], OutFileName = out.nc)\n')
+    AssertSameFld(outFlds['m2'],aloneFlds['m2'])
+    AssertSameFld(outFlds['x2'],aloneFlds['x2'])
+    assert np.isnan(np.ma.getdata(outFlds['m2'])[0,1]) != np.isnan(np.ma.getdata(outFlds['m1'])[0,1])
+# def test_reordered_min_not_aliased():
+
+def test_nonfinite_results_masked():
+    # Cells np.ma arithmetic masks, as its divisions give results that
+    # are not finite, stay masked
+    inFlds = GetInFlds()
+    inFlds['big'] = np.ma.masked_array(np.full((6,8),1e308),mask=np.ma.getmaskarray(inFlds['elev']))
+    inFlds['flat'] = np.ma.masked_array(np.ones((6,8)),mask=np.ma.getmaskarray(inFlds['elev']))
+    outFlds = RunProgram(
+        ReadProg +
+        'READ(InFileName = in.nc, InFieldName = big)\n' +
+        'READ(InFileName = in.nc, InFieldName = flat)\n' +
+        'fClim = CVTTOFUZZY(InFieldName = clim, TrueThreshold = 1, FalseThreshold = 0)\n' +
+        'fElev = CVTTOFUZZY(InFieldName = elev, TrueThreshold = 2000, FalseThreshold = 0)\n' +
+        'andFld = EMDSAND(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n' +
+        'meanFld = MEAN(InFieldNames = [big, big], OutFileName = out.nc)\n' +
+        'rangeFld = SCORERANGEBENEFIT(InFieldName = flat, OutFileName = out.nc)\n',
+        MemCmdRunner(inFlds))
+
+    # the NaN cells of clim
+    nanMask = np.isnan(np.ma.getdata(inFlds['clim']))
+    assert np.ma.getmaskarray(outFlds['andFld'])[nanMask].all()
+    assert not np.isnan(outFlds['andFld'].compressed()).any()
+
+    # the sum overflows
+    assert np.ma.getmaskarray(outFlds['meanFld']).all()
+
+    # a range of 0
+    assert np.ma.getmaskarray(outFlds['rangeFld']).all()
+# def test_nonfinite_results_masked():
+
+StatsProg = ReadProg + \
+    'fElev = CVTTOFUZZY(InFieldName = elev, TrueThreshold = 9999, FalseThreshold = -9999, OutFileName = out.nc)\n' + \
+    'rElev = SCORERANGECOST(InFieldName = elev, OutFileName = out.nc)\n' + \
+    'mElev = MEANTOMID(InFieldName = elev, IgnoreZeros = False, FuzzyValues = [-1, -0.5, 0, 0.5, 1], OutFileName = out.nc)\n' + \
+    'fClim = CVTTOFUZZY(InFieldName = clim, TrueThreshold = 1, FalseThreshold = 0)\n' + \
+    'andFld = EMDSAND(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n' + \
+    'fAnd = CVTTOFUZZY(InFieldName = andFld, TrueThreshold = 9999, FalseThreshold = -9999, OutFileName = out.nc)\n'
+
+def test_shared_mask_keeps_own_statistics():
+    # With shared masks, fields are written with the cells masked in
+    # any field read masked, but their values (which depend on their
+    # statistics) are those of a run with a mask per field
+    inFlds = GetInFlds()
+    invalidMask = np.ma.getmaskarray(inFlds['clim']) | np.ma.getmaskarray(inFlds['elev'])
+    outFlds = RunProgram(StatsProg)
+    for settings in [{},{'Parallel':(2,'thread')},{'Parallel':(2,'process')}]:
+        sharedFlds = RunProgram(StatsProg,SharedMask=True,**settings)
+        for fldNm,fldData in outFlds.items():
+            AssertSameFld(np.ma.masked_array(fldData,mask=np.ma.getmaskarray(fldData) | invalidMask),sharedFlds[fldNm])
+# def test_shared_mask_keeps_own_statistics():
+
+def test_shared_mask_tiled_matches_tiled():
+    # Shared masks give the same fields tiled as a tiled run without them
+    inFlds = GetInFlds()
+    invalidMask = np.ma.getmaskarray(inFlds['clim']) | np.ma.getmaskarray(inFlds['elev'])
+    outFlds = RunProgram(StatsProg,TileSize=(4,5))
+    sharedFlds = RunProgram(StatsProg,SharedMask=True,TileSize=(4,5))
+    for fldNm,fldData in outFlds.items():
+        AssertSameFld(np.ma.masked_array(fldData,mask=np.ma.getmaskarray(fldData) | invalidMask),sharedFlds[fldNm])
+# def test_shared_mask_tiled_matches_tiled():
+
+def test_compact_keeps_whole_grid_statistics():
+    # Compacting drops the cells masked in any field read, but the
+    # statistics commands use are still over each field's valid cells
+    inFlds = GetInFlds()
+    invalidMask = np.ma.getmaskarray(inFlds['clim']) | np.ma.getmaskarray(inFlds['elev'])
+    outFlds = RunProgram(StatsProg)
+    for settings in [{},{'SharedMask':True},{'Parallel':(2,'process')}]:
+        compactFlds = RunProgram(StatsProg,Compact=True,**settings)
+        for fldNm,fldData in outFlds.items():
+            AssertSameFld(np.ma.masked_array(fldData,mask=np.ma.getmaskarray(fldData) | invalidMask),compactFlds[fldNm])
+# def test_compact_keeps_whole_grid_statistics():
+
+def test_meantomid_tiled_matches_untiled():
+    # MEANTOMID sums its means a block or window at a time in float64,
+    # so the windows of a tiled run give the means of the whole field
+    # but for rounding
+    inFlds = GetInFlds()
+    invalidMask = np.ma.getmaskarray(inFlds['clim']) | np.ma.getmaskarray(inFlds['elev'])
+    outFlds = RunProgram(StatsProg)
+    AssertCloseFld(outFlds['mElev'],RunProgram(StatsProg,TileSize=(4,5))['mElev'])
+    for settings in [{'SharedMask':True},{'Compact':True}]:
+        untiledFlds = RunProgram(StatsProg,**settings)
+        tiledFlds = RunProgram(StatsProg,TileSize=(3,3),**settings)
+        AssertCloseFld(untiledFlds['mElev'],tiledFlds['mElev'])
+        AssertCloseFld(np.ma.masked_array(outFlds['mElev'],mask=np.ma.getmaskarray(outFlds['mElev']) | invalidMask),tiledFlds['mElev'])
+# def test_meantomid_tiled_matches_untiled():
+
+KernelProg = ReadProg + \
+    'fClim = CVTTOFUZZY(InFieldName = clim, TrueThreshold = 1, FalseThreshold = 0)\n' + \
+    'fElev = CVTTOFUZZY(InFieldName = elev, TrueThreshold = 2000, FalseThreshold = 0)\n' + \
+    'xorFld = XOR(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n' + \
+    'selFld = SELECTEDUNION(InFieldNames = [fClim, fElev], TruestOrFalsest = Truest, NumberToConsider = 2, OutFileName = out.nc)\n' + \
+    'andFld = EMDSAND(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n' + \
+    'meanFld = MEAN(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n'
+
+def test_numba_kernels_match_numpy():
+    # The compiled kernels give the fields, masks included, of the
+    # NumPy operators, also when started from a thread pool
+    pytest.importorskip('numba')
+    for settings in [{},{'SharedMask':True},{'Parallel':(2,'thread')}]:
+        outFlds = RunProgram(KernelProg,**settings)
+        kernelFlds = RunProgram(KernelProg,KernelBackend='numba',**settings)
+        for fldNm,fldData in outFlds.items():
+            AssertSameFld(fldData,kernelFlds[fldNm])
+# def test_numba_kernels_match_numpy():
+
+def test_broadcast_tiled_matches_untiled():
+    # A per-row (y,1) field is read whole along its column, so a tiled
+    # run gives the fields of an untiled one (but for rounding in the
+    # MEANTOMID means)
+    inFlds = GetInFlds()
+    inFlds['rowAttr'] = np.ma.masked_array(np.linspace(0,1,6).reshape((6,1)),mask=[[False]] * 5 + [[True]])
+    progStr = StatsProg + \
+        'READ(InFileName = in.nc, InFieldName = rowAttr)\n' + \
+        'fRow = CVTTOFUZZY(InFieldName = rowAttr, TrueThreshold = 1, FalseThreshold = 0, OutFileName = out.nc)\n' + \
+        'rowAnd = EMDSAND(InFieldNames = [fRow, fElev], OutFileName = out.nc)\n'
+    outFlds = RunProgram(progStr,MemCmdRunner(inFlds),BroadcastFlds=True)
+    tiledFlds = RunProgram(progStr,MemCmdRunner(inFlds),BroadcastFlds=True,TileSize=(4,5))
+    assert outFlds['rowAnd'].shape == (6,8)
+    for fldNm,fldData in outFlds.items():
+        AssertCloseFld(fldData,tiledFlds[fldNm])
+
+    # compacting keeps the whole grid statistics of broadcast fields too
+    invalidMask = np.ma.getmaskarray(inFlds['clim']) | np.ma.getmaskarray(inFlds['elev']) | \
+        np.ma.getmaskarray(inFlds['rowAttr'])
+    compactFlds = RunProgram(progStr,MemCmdRunner(inFlds),BroadcastFlds=True,Compact=True)
+    for fldNm,fldData in outFlds.items():
+        AssertSameFld(np.ma.masked_array(fldData,mask=np.ma.getmaskarray(fldData) | invalidMask),compactFlds[fldNm])
+# def test_broadcast_tiled_matches_untiled():
+
+class CountingCmdRunner(MemCmdRunner):
+    # Records the fields computed
+
+    def __init__(self,inFlds=None):
+        super(CountingCmdRunner,self).__init__(inFlds)
+        self.addedFldNms = []
+
+    def _AddFieldToEEMSFlds(self,outFNm,fldNm,fldArray):
+        self.addedFldNms.append(fldNm)
+        super(CountingCmdRunner,self)._AddFieldToEEMSFlds(outFNm,fldNm,fldArray)
+
+# class CountingCmdRunner(MemCmdRunner):
+
+def test_rerun_with_targets_keeps_unchanged_flds():
+    # Target fields change which fields are written, not their values,
+    # so a rerun after setting or clearing them computes only the
+    # fields that are missing
+    cmdRunner = CountingCmdRunner()
+    myInterp = EEMSInterpreter(io.StringIO(StatsProg),cmdRunner)
+    myInterp.RunProgram()
+
+    cmdRunner.addedFldNms = []
+    myInterp.SetTargetFlds(['fAnd'])
+    myInterp.RerunProgram(io.StringIO(StatsProg))
+    assert cmdRunner.addedFldNms == []
+    assert cmdRunner.EEMSFlds['fElev']['outFNm'] == 'NONE'
+    assert cmdRunner.EEMSFlds['fAnd']['outFNm'] == 'out.nc'
+
+    # rElev and mElev were dropped as not needed for fAnd
+    myInterp.SetTargetFlds(None)
+    myInterp.RerunProgram(io.StringIO(StatsProg))
+    assert sorted(cmdRunner.addedFldNms) == ['mElev','rElev']
+    assert cmdRunner.EEMSFlds['fElev']['outFNm'] == 'out.nc'
+# def test_rerun_with_targets_keeps_unchanged_flds():
+
+def test_cvttofuzzycat_default_out_of_range_checked():
+    # A DefaultFuzzyValue outside fuzzy range is not clamped, so fields
+    # using the result are still checked
+    inFlds = GetInFlds()
+    inFlds['cat'] = np.ma.masked_array(np.arange(48).reshape((6,8)) % 3)
+    progStr = \
+        'READ(InFileName = in.nc, InFieldName = cat)\n' + \
+        'c = CVTTOFUZZYCAT(InFieldName = cat, RawValues = [1, 2], FuzzyValues = [0.5, 1], DefaultFuzzyValue = 5)\n' + \
+        'n = NOT(InFieldName = c, OutFileName = out.nc)\n'
+    with pytest.raises(Exception,match='range outside of fuzzy limits'):
+        RunProgram(progStr,MemCmdRunner(inFlds))
+# def test_cvttofuzzycat_default_out_of_range_checked():
+
+def test_wtdemdsand_values():
+    # WTDEMDSAND is min + (weighted mean - min) * (min + 1) / 2, masked
+    # where any input is
+    fuzzyA = np.ma.masked_array([[-1.0,-0.5,0.0],[0.5,1.0,0.25]],mask=[[False,False,False],[False,False,True]])
+    fuzzyB = np.ma.masked_array([[1.0,0.5,-0.5],[0.5,-1.0,0.75]])
+    outFlds = RunProgram(
+        'READ(InFileName = in.nc, InFieldName = a)\n' +
+        'READ(InFileName = in.nc, InFieldName = b)\n' +
+        'w = WTDEMDSAND(InFieldNames = [a, b], Weights = [1, 3], OutFileName = out.nc)\n',
+        MemCmdRunner({'a':fuzzyA,'b':fuzzyB}))
+
+    minVals = np.minimum(fuzzyA.data,fuzzyB.data)
+    meanVals = (fuzzyA.data * 1 + fuzzyB.data * 3) / 4
+    expected = np.ma.masked_array(minVals + (meanVals - minVals) * (minVals + 1) / 2,mask=fuzzyA.mask)
+    # e.g. -0.5 and 0.5: -0.5 + (0.25 - -0.5) * 0.5 / 2
+    assert expected[0,1] == -0.3125
+    AssertSameFld(expected,outFlds['w'])
+# def test_wtdemdsand_values():
+
+def GetSelectFlds():
+    # Fuzzy fields with ties and masked cells
+    return {
+        'a':np.ma.masked_array([[0.5,0.2,-1.0,1.0],[0.3,0.3,0.0,0.0]],mask=[[0,0,0,0],[0,0,1,1]]),
+        'b':np.ma.masked_array([[0.5,-0.4,-1.0,0.0],[0.3,0.9,0.0,0.1]],mask=[[0,0,0,1],[0,0,1,0]]),
+        'c':np.ma.masked_array([[-0.2,0.2,-1.0,0.6],[0.3,0.0,0.0,-0.7]],mask=[[0,0,0,0],[0,1,1,0]])
+        }
+# def GetSelectFlds():
+
+def GetSortedStack(flds):
+    # The fields stacked and sorted cell by cell, masked values last, as
+    # SELECTEDUNION and XOR sorted them before partial selection
+    stackedArrs = np.ma.stack([flds[fldNm] for fldNm in ['a','b','c']])
+    stackedArrs.sort(axis=0,kind='heapsort')
+    return stackedArrs
+# def GetSortedStack(flds):
+
+def test_selectedunion_xor_match_full_sort():
+    # Partial selection gives the values of a full sort, ties and
+    # masked inputs included
+    outFlds = RunProgram(
+        'READ(InFileName = in.nc, InFieldName = a)\n' +
+        'READ(InFileName = in.nc, InFieldName = b)\n' +
+        'READ(InFileName = in.nc, InFieldName = c)\n' +
+        'truest = SELECTEDUNION(InFieldNames = [a, b, c], TruestOrFalsest = Truest, NumberToConsider = 2, OutFileName = out.nc)\n' +
+        'falsest = SELECTEDUNION(InFieldNames = [a, b, c], TruestOrFalsest = Falsest, NumberToConsider = 2, OutFileName = out.nc)\n' +
+        'xorFld = XOR(InFieldNames = [a, b, c], OutFileName = out.nc)\n',
+        MemCmdRunner(GetSelectFlds()))
+
+    stackedArrs = GetSortedStack(GetSelectFlds())
+    AssertSameFld(np.ma.clip(stackedArrs[1:].mean(axis=0),-1,1),outFlds['truest'])
+    AssertSameFld(np.ma.clip(stackedArrs[:2].mean(axis=0),-1,1),outFlds['falsest'])
+    xorData = np.ma.where(
+        stackedArrs[-1] != -1,
+        stackedArrs[-1] - (stackedArrs[-1] - stackedArrs[-2]) * (stackedArrs[-2] + 1) / (stackedArrs[-1] + 1),
+        -1)
+    AssertSameFld(np.ma.clip(xorData,-1,1),outFlds['xorFld'])
+
+    # tied inputs, and masked ones, which sort last
+    assert outFlds['truest'][0,0] == 0.5 and abs(outFlds['falsest'][0,0] - 0.15) < 1e-15
+    assert outFlds['truest'][0,3] == 1.0 and outFlds['falsest'][0,3] == 0.8
+    assert outFlds['xorFld'][0,0] == 0.5 and outFlds['xorFld'][0,2] == -1.0
+    assert outFlds['truest'][1,2] is np.ma.masked and outFlds['xorFld'][0,3] is np.ma.masked
+# def test_selectedunion_xor_match_full_sort():
+
+def GetCurveFld():
+    # Values below, at, between and above the breakpoints 0, 10 and 20,
+    # a NaN and a masked cell
+    return np.ma.masked_array(
+        [[-5.0,0.0,5.0,10.0],[15.0,20.0,25.0,np.nan],[10.0,2.5,0.0,30.0]],
+        mask=[[0,0,0,0],[0,0,0,0],[0,0,1,0]])
+# def GetCurveFld():
+
+def test_cvttofuzzycurve_matches_segment_loop():
+    # The one-pass curve gives the values of applying each segment's
+    # line in turn, at breakpoints and NaNs too
+    rawVals = [0.0,10.0,20.0]
+    fuzzyVals = [-1.0,0.5,1.0]
+    outFlds = RunProgram(
+        'READ(InFileName = in.nc, InFieldName = x)\n' +
+        'c = CVTTOFUZZYCURVE(InFieldName = x, RawValues = [0, 10, 20], FuzzyValues = [-1, 0.5, 1], OutFileName = out.nc)\n',
+        MemCmdRunner({'x':GetCurveFld()}))
+
+    inData = GetCurveFld()
+    curveData = np.ma.where(inData != inData,np.nan,-9999)
+    curveData = np.ma.where(inData <= rawVals[0],fuzzyVals[0],curveData)
+    for ndx in range(1,len(rawVals)):
+        m = (fuzzyVals[ndx] - fuzzyVals[ndx-1]) / (rawVals[ndx] - rawVals[ndx-1])
+        b = fuzzyVals[ndx-1] - m * rawVals[ndx-1]
+        curveData = np.ma.where(inData <= rawVals[ndx-1],curveData,np.ma.where(inData <= rawVals[ndx],inData * m + b,curveData))
+    curveData = np.ma.where(inData > rawVals[-1],fuzzyVals[-1],curveData)
+    AssertSameFld(np.ma.clip(curveData,-1,1),outFlds['c'])
+
+    assert np.allclose(outFlds['c'][:2].filled(np.nan),[[-1.0,-1.0,-0.25,0.5],[0.75,1.0,1.0,np.nan]],equal_nan=True)
+    assert outFlds['c'][2,2] is np.ma.masked
+# def test_cvttofuzzycurve_matches_segment_loop():
+
+def test_cvttofuzzycat_matches_category_loop():
+    # The table (integer fields) and search (float fields) lookups give
+    # the values of matching each raw value in turn: a non-integer raw
+    # value matches no integer, other cells get the default, and NaNs
+    # stay NaN
+    intCats = np.ma.masked_array([[1,2,3],[7,1,2]],mask=[[0,0,0],[0,0,1]])
+    floatCats = np.ma.masked_array([[1.0,2.5,3.0],[np.nan,2.4999,2.0]],mask=[[0,0,0],[0,0,1]])
+    outFlds = RunProgram(
+        'READ(InFileName = in.nc, InFieldName = intCats)\n' +
+        'READ(InFileName = in.nc, InFieldName = floatCats)\n' +
+        'intFuzzy = CVTTOFUZZYCAT(InFieldName = intCats, RawValues = [1, 2, 2.5], FuzzyValues = [0.5, 1, -1], DefaultFuzzyValue = -0.5, OutFileName = out.nc)\n' +
+        'floatFuzzy = CVTTOFUZZYCAT(InFieldName = floatCats, RawValues = [1, 2, 2.5], FuzzyValues = [0.5, 1, -1], DefaultFuzzyValue = -0.5, OutFileName = out.nc)\n',
+        MemCmdRunner({'intCats':intCats,'floatCats':floatCats}))
+
+    for inData,fldNm in [(intCats,'intFuzzy'),(floatCats,'floatFuzzy')]:
+        catData = np.ma.where(inData != inData,np.nan,-0.5)
+        for rawVal,fuzzyVal in zip([1,2,2.5],[0.5,1,-1]):
+            catData = np.ma.where(inData == rawVal,fuzzyVal,catData)
+        AssertSameFld(catData,outFlds[fldNm])
+
+    assert outFlds['intFuzzy'].tolist() == [[0.5,1.0,-0.5],[-0.5,0.5,None]]
+    assert outFlds['floatFuzzy'][0].tolist() == [0.5,-1.0,-0.5]
+    assert np.isnan(outFlds['floatFuzzy'][1,0]) and outFlds['floatFuzzy'][1,1] == -0.5
+# def test_cvttofuzzycat_matches_category_loop():
+
+def test_sum_mean_accumulate_in_float64():
+    # SUM and MEAN fold their inputs into float64, as the old pairwise
+    # folds from a float64 np.ma.zeros did, so integer inputs beyond
+    # float32's precision are summed exactly
+    bigInts = np.ma.masked_array(np.full((2,3),2**24 + 1,dtype=np.int32),mask=[[0,0,0],[0,1,0]])
+    smallInts = np.ma.masked_array(np.arange(6,dtype=np.int32).reshape((2,3)))
+    floats = np.ma.masked_array([[0.1,0.2,0.3],[1e-9,0.5,np.nan]])
+    inFlds = {'bigInts':bigInts,'smallInts':smallInts,'floats':floats}
+    outFlds = RunProgram(
+        'READ(InFileName = in.nc, InFieldName = bigInts)\n' +
+        'READ(InFileName = in.nc, InFieldName = smallInts)\n' +
+        'READ(InFileName = in.nc, InFieldName = floats)\n' +
+        's = SUM(InFieldNames = [bigInts, smallInts, floats], OutFileName = out.nc)\n' +
+        'm = MEAN(InFieldNames = [bigInts, smallInts, floats], OutFileName = out.nc)\n',
+        MemCmdRunner(inFlds))
+
+    sumData = np.ma.zeros((2,3))
+    for fldNm in ['bigInts','smallInts','floats']:
+        sumData += inFlds[fldNm]
+    meanData = sumData.copy()
+    meanData /= 3
+    assert outFlds['s'].dtype == np.float64 and outFlds['m'].dtype == np.float64
+    AssertSameFld(sumData,outFlds['s'])
+    AssertSameFld(meanData,outFlds['m'])
+    assert outFlds['s'][0,1] == 2**24 + 1 + 1 + 0.2
+# def test_sum_mean_accumulate_in_float64():
+
+def RunCachedProgram(progStr,cacheDir,maxBytes=10**8):
+    # The fields a program writes with a result cache, and the fields
+    # found in the cache
+    cmdRunner = MemCmdRunner()
+    myInterp = EEMSInterpreter(io.StringIO(progStr),cmdRunner,verbose=True)
+    myInterp.SetResultCache(cacheDir,maxBytes)
+    verboseOut = io.StringIO()
+    with contextlib.redirect_stdout(verboseOut):
+        myInterp.RunProgram()
+    cachedFldNms = re.findall(r'found (\S+) in result cache',verboseOut.getvalue())
+    return cmdRunner.outFlds,sorted(cachedFldNms)
+# def RunCachedProgram(progStr,cacheDir,maxBytes=10**8):
+
+def test_result_cache_hits_and_misses(tmp_path):
+    # Results are found in the cache when nothing upstream of them has
+    # changed: not their parameters, nor the input file
+    inFNm = tmp_path / 'in.nc'
+    inFNm.write_bytes(b'')
+    cacheDir = str(tmp_path / 'cache')
+    progStr = StatsProg.replace('in.nc',str(inFNm))
+    computedFldNms = ['andFld','fAnd','fClim','fElev','mElev','rElev']
+
+    outFlds,cachedFldNms = RunCachedProgram(progStr,cacheDir)
+    assert cachedFldNms == []
+
+    cachedFlds,cachedFldNms = RunCachedProgram(progStr,cacheDir)
+    assert cachedFldNms == computedFldNms
+    for fldNm,fldData in outFlds.items():
+        AssertSameFld(fldData,cachedFlds[fldNm])
+
+    # a changed parameter misses for its field and those downstream
+    changedProgStr = progStr.replace('TrueThreshold = 1,','TrueThreshold = 0.8,')
+    assert changedProgStr != progStr
+    changedFlds,cachedFldNms = RunCachedProgram(changedProgStr,cacheDir)
+    assert cachedFldNms == ['fElev','mElev','rElev']
+    assert not np.array_equal(changedFlds['andFld'].filled(0),outFlds['andFld'].filled(0))
+
+    # a changed input file misses for every field
+    os.utime(inFNm,(os.path.getmtime(inFNm) + 10,) * 2)
+    outFlds,cachedFldNms = RunCachedProgram(progStr,cacheDir)
+    assert cachedFldNms == []
+# def test_result_cache_hits_and_misses(tmp_path):
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    # Once the cache holds more than maxBytes, the results used least
+    # recently are dropped
+    cacheDir = str(tmp_path)
+    fldData = np.ma.masked_array(np.zeros((100,100)))
+    resultCache = EEMSResultCache(cacheDir,10**8)
+    resultCache.Put('a',fldData)
+    fSize = os.path.getsize(os.path.join(cacheDir,'a.npz'))
+
+    resultCache = EEMSResultCache(cacheDir,2 * fSize)
+    resultCache.Put('b',fldData)
+    os.utime(os.path.join(cacheDir,'a.npz'),(1000,1000))
+    os.utime(os.path.join(cacheDir,'b.npz'),(2000,2000))
+    assert resultCache.Get('a') is not None # a is now the most recently used
+    resultCache.Put('c',fldData)
+
+    assert resultCache.Has('a') and resultCache.Has('c')
+    assert not resultCache.Has('b')
+    assert resultCache.Get('b') is None
+# def test_result_cache_evicts_least_recently_used(tmp_path):
+
+class CmdCountingCmdRunner(MemCmdRunner):
+    # Counts the commands run, by all the cmdRunners of the class (e.g.
+    # the scratch cmdRunners of scenario runs)
+    cmdCnts = {}
+
+    def ScoreRangeBenefit(self,*args):
+        CmdCountingCmdRunner.cmdCnts['SCORERANGEBENEFIT'] = CmdCountingCmdRunner.cmdCnts.get('SCORERANGEBENEFIT',0) + 1
+        super(CmdCountingCmdRunner,self).ScoreRangeBenefit(*args)
+
+    def CvtToFuzzy(self,*args):
+        CmdCountingCmdRunner.cmdCnts['CVTTOFUZZY'] = CmdCountingCmdRunner.cmdCnts.get('CVTTOFUZZY',0) + 1
+        super(CmdCountingCmdRunner,self).CvtToFuzzy(*args)
+
+    def FuzzyWeightedUnion(self,*args):
+        CmdCountingCmdRunner.cmdCnts['WTDUNION'] = CmdCountingCmdRunner.cmdCnts.get('WTDUNION',0) + 1
+        super(CmdCountingCmdRunner,self).FuzzyWeightedUnion(*args)
+
+# class CmdCountingCmdRunner(MemCmdRunner):
+
+ScenarioProg = ReadProg + \
+    'rElev = SCORERANGEBENEFIT(InFieldName = elev, OutFileName = out.nc)\n' + \
+    'fClim = CVTTOFUZZY(InFieldName = clim, TrueThreshold = 1, FalseThreshold = 0, OutFileName = out.nc)\n' + \
+    'u = WTDUNION(InFieldNames = [fClim, rElev], Weights = [1, 1], OutFileName = out.nc)\n'
+
+def test_scenarios_match_single_runs():
+    # Each scenario's fields are those of a run of the program with its
+    # parameters, and fields upstream of the varied commands are
+    # computed once for all the scenarios
+    CmdCountingCmdRunner.cmdCnts = {}
+    outFlds = RunProgram(
+        ScenarioProg,
+        CmdCountingCmdRunner(),
+        Scenarios={'strict':{'fClim':{'TrueThreshold':0.8}},'heavy':{'u':{'Weights':[1.0,3.0]}}})
+    assert sorted(outFlds) == ['fClim_heavy','fClim_strict','rElev','u_heavy','u_strict']
+    assert CmdCountingCmdRunner.cmdCnts == {'SCORERANGEBENEFIT':1,'CVTTOFUZZY':2,'WTDUNION':2}
+
+    strictFlds = RunProgram(ScenarioProg,OverrideParam=('TrueThreshold',0.8))
+    heavyFlds = RunProgram(ScenarioProg,OverrideParam=('Weights',[1.0,3.0]))
+    for fldNm in ['fClim','u']:
+        AssertSameFld(strictFlds[fldNm],outFlds[fldNm + '_strict'])
+        AssertSameFld(heavyFlds[fldNm],outFlds[fldNm + '_heavy'])
+    AssertSameFld(strictFlds['rElev'],outFlds['rElev'])
+    assert not np.array_equal(strictFlds['u'].filled(0),heavyFlds['u'].filled(0))
+# def test_scenarios_match_single_runs():
+
+def test_commands_ordered_by_dependencies():
+    # Commands given out of order are run after the commands defining
+    # the fields they use
+    myProg = EEMSProgram(io.StringIO(
+        'u = UNION(InFieldNames = [fClim, fElev], OutFileName = out.nc)\n' +
+        'n = NOT(InFieldName = u, OutFileName = out.nc)\n' +
+        'fElev = CVTTOFUZZY(InFieldName = elev, TrueThreshold = 2000, FalseThreshold = 0)\n' +
+        'fClim = CVTTOFUZZY(InFieldName = clim, TrueThreshold = 1, FalseThreshold = 0)\n' +
+        ReadProg))
+    definedFldNms = set()
+    for cmd in myProg.orderedCmds:
+        assert set(myProg.GetDependFieldNms(cmd)) <= definedFldNms
+        definedFldNms.update(myProg.GetDefinedFieldNms(cmd))
+    assert len(myProg.orderedCmds) == 6
+# def test_commands_ordered_by_dependencies():
+
+def test_cyclic_and_undefined_fields_raise():
+    # The messages of the original ordering: a dependency cycle names
+    # the commands in it, or depending on it, in program order, and a
+    # field defined by no command is named with its command
+    with pytest.raises(Exception) as excInfo:
+        EEMSProgram(io.StringIO(
+            ReadProg +
+            'a = NOT(InFieldName = b)\n' +
+            'b = NOT(InFieldName = a)\n' +
+            'c = NOT(InFieldName = b)\n'))
+    assert str(excInfo.value) == \
+        '\n********************ERROR********************\n' + \
+        'Circular logic in the dependencies for this subset of commands:' + \
+        '  a = NOT(InFieldName = b)\n' + \
+        '  b = NOT(InFieldName = a)\n' + \
+        '  c = NOT(InFieldName = b)\n'
+
+    with pytest.raises(Exception) as excInfo:
+        EEMSProgram(io.StringIO(ReadProg + 'n = NOT(InFieldName = zz)\n'))
+    assert str(excInfo.value) == \
+        '\n********************ERROR********************\n' + \
+        'Command depends on undefined field *zz*\n' + \
+        'Full command with error:\n' + \
+        '  n = NOT(InFieldName = zz)\n'
+# def test_cyclic_and_undefined_fields_raise():